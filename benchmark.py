@@ -0,0 +1,389 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+
+from core_blockchain import Block, Blockchain, private_key, public_key
+from validation import ChainValidator
+from verification import SignatureVerifier
+
+SAMPLE_CHAIN = 'sample_chain.json'
+CHAIN_DIFFICULTY = 1  # Difficulty of generated chains, low so generating them is quick
+
+
+class Result:
+    __slots__ = ('name', 'value', 'unit', 'higher_is_better', 'params')
+
+    def __init__(self, name, value, unit, higher_is_better=True, params=None):
+        """
+        Initialize a benchmark measurement.
+
+        Args:
+            name (str): Unique name, including the parameters that change the workload.
+            value (float): Measured value.
+            unit (str): Unit of the value, e.g. 'ops/s' or 's'.
+            higher_is_better (bool): Direction in which the value improves.
+            params (dict): Workload parameters.
+        """
+        self.name = name
+        self.value = value
+        self.unit = unit
+        self.higher_is_better = higher_is_better
+        self.params = params or {}
+
+    def to_dict(self):
+        return {'name': self.name, 'value': self.value, 'unit': self.unit,
+                'higher_is_better': self.higher_is_better, 'params': self.params}
+
+
+def measure(function, repeat=5, number=1):
+    """
+    Time a function, keeping the fastest of several runs to reduce noise.
+
+    Args:
+        function (callable): Code to time, called without arguments.
+        repeat (int): Number of timed runs.
+        number (int): Calls per run.
+
+    Returns:
+        float: Best duration of one call in seconds.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def load_sample_transactions(path=SAMPLE_CHAIN):
+    """
+    Collect the shape of the blocks of the sample chain: miner and signed transaction messages.
+
+    Returns:
+        list: (miner, list of messages) per mined block of the sample chain.
+    """
+    with open(path) as file:
+        blocks = json.load(file)['blockchain']
+    return [(str(block['miner']), [transaction['message'] for transaction in block['transactions']
+                                   if 'message' in transaction])
+            for block in blocks[1:]]
+
+
+class Workload:
+    def __init__(self, seed=0, sample_path=SAMPLE_CHAIN):
+        """
+        Initialize the data the benchmarks run on, generated deterministically from the sample chain.
+
+        Args:
+            seed (int): Seed of the random choices made while generating data.
+            sample_path (str): /chain export the generated blocks are modelled on.
+        """
+        self.random = random.Random(seed)
+        self.signer = Blockchain()
+        self.sample = load_sample_transactions(sample_path)
+        self._chains = {}  # length -> list of block dictionaries
+
+    def transaction(self, template=None):
+        """
+        Sign a fresh copy of a sample transaction message.
+
+        Returns:
+            dict: Signed transaction.
+        """
+        if template is None:
+            template = self.random.choice([message for _, messages in self.sample for message in messages])
+        msg = {
+            'transaction_id': str(uuid.UUID(int=self.random.getrandbits(128), version=4)),
+            'transaction_timestamp': template['transaction_timestamp'],
+            'from_addr': public_key,
+            'to_addr': template['to_addr'],
+            'amount': template['amount'],
+            'fee': template['fee'],
+        }
+        return {'message': msg, 'signature': self.signer.generate_signature(private_key, msg).hex()}
+
+    def chain(self, length):
+        """
+        Generate a valid chain of the given number of blocks after genesis, cycling through the sample blocks.
+
+        Returns:
+            list: Block dictionaries, genesis first.
+        """
+        if length not in self._chains:
+            blockchain = Blockchain()
+            blockchain.zeros_difficulty = CHAIN_DIFFICULTY
+            for height in range(length):
+                miner, messages = self.sample[height % len(self.sample)]
+                for message in messages:
+                    blockchain.mempool.add(self.transaction(message))
+                if not messages:
+                    blockchain.mempool.add(self.transaction())
+                block = blockchain.mine(miner)
+                blockchain.add_block(block)
+            self._chains[length] = [block.to_dict() for block in blockchain.chain]
+            blockchain.mining_engine.shutdown()
+        return self._chains[length]
+
+
+def bench_block_hash(workload, sizes):
+    block = Block.from_dict(workload.chain(1)[1])
+
+    def rehash():
+        block.nonce += 1  # Changing the nonce drops the memoized hash
+        return block.hash
+
+    count = 20000 if sizes == 'full' else 5000
+    seconds = measure(lambda: [rehash() for _ in range(count)], repeat=3)
+    yield Result('block_hash', count / seconds, 'hashes/s', params={'transactions': len(block.transactions)})
+
+
+def bench_mine(workload, sizes):
+    difficulties = (2, 3, 4, 5) if sizes == 'full' else (2, 3, 4)
+    trials = 10 if sizes == 'full' else 5
+    for difficulty in difficulties:
+        blockchain = Blockchain()
+        blockchain.zeros_difficulty = difficulty
+        durations = []
+        hashes = 0
+        for _ in range(trials):
+            blockchain.mempool.add(workload.transaction())
+            started = time.perf_counter()
+            block = blockchain.mine('benchmark')
+            durations.append(time.perf_counter() - started)
+            hashes += blockchain.mining_engine.last_hashes
+            blockchain.add_block(block)
+        blockchain.mining_engine.shutdown()
+        params = {'difficulty': difficulty, 'trials': trials}
+        yield Result(f'mine_time_to_solve[d={difficulty}]', statistics.median(durations), 's',
+                     higher_is_better=False, params=params)
+        yield Result(f'mine_hash_rate[d={difficulty}]', hashes / sum(durations), 'hashes/s', params=params)
+
+
+def bench_signatures(workload, sizes):
+    count = 1000 if sizes == 'full' else 200
+    signer = workload.signer
+    msg = workload.transaction()['message']
+    seconds = measure(lambda: signer.generate_signature(private_key, msg), repeat=3, number=count // 10)
+    yield Result('generate_signature', 1 / seconds, 'ops/s')
+
+    transactions = [workload.transaction() for _ in range(count)]
+    blockchain = Blockchain()
+
+    def verify_cold():
+        blockchain.verifier = SignatureVerifier()
+        for transaction in transactions:
+            blockchain.is_valid_transaction(transaction)
+
+    seconds = measure(verify_cold, repeat=3)
+    yield Result('is_valid_transaction[cold]', count / seconds, 'ops/s', params={'transactions': count})
+    seconds = measure(lambda: [blockchain.is_valid_transaction(transaction) for transaction in transactions], repeat=3)
+    yield Result('is_valid_transaction[cached]', count / seconds, 'ops/s', params={'transactions': count})
+
+
+def bench_ingest(workload, sizes):
+    count = 1000 if sizes == 'full' else 200
+    transactions = [workload.transaction() for _ in range(count)]
+
+    def ingest_single():
+        # What /add_transaction followed by the signature check of the block template costs per transaction
+        blockchain = Blockchain()
+        for transaction in transactions:
+            if blockchain.is_valid_transaction(transaction):
+                blockchain.mempool.add(transaction)
+
+    def ingest_batch():
+        blockchain = Blockchain()
+        for start in range(0, count, 100):
+            blockchain.add_transactions(transactions[start:start + 100])
+
+    for name, function in (('single', ingest_single), ('batch', ingest_batch)):
+        seconds = measure(function, repeat=3)
+        yield Result(f'ingest[{name}]', count / seconds, 'tx/s', params={'transactions': count})
+
+
+def bench_validation(workload, sizes):
+    lengths = (100, 1000) if sizes == 'full' else (50, 200)
+    for length in lengths:
+        block_dicts = workload.chain(length)
+
+        def validate():
+            # A fresh verifier and validator so neither the signature cache nor the checkpoint skip work
+            blockchain = Blockchain()
+            blockchain.zeros_difficulty = CHAIN_DIFFICULTY
+            blockchain.chain = [Block.from_dict(block) for block in block_dicts]
+            started = time.perf_counter()
+            assert blockchain.is_valid_chain()
+            return time.perf_counter() - started
+
+        seconds = min(validate() for _ in range(3))
+        yield Result(f'is_valid_chain[n={length}]', length / seconds, 'blocks/s', params={'blocks': length})
+
+        def temp_chain():
+            verifier = SignatureVerifier()
+            blockchain = Blockchain(verifier=verifier, validator=ChainValidator(verifier))
+            blockchain.zeros_difficulty = CHAIN_DIFFICULTY
+            temp_blockchain = blockchain.create_temp_chain(block_dicts)
+            assert len(temp_blockchain.chain) == len(block_dicts)
+
+        seconds = measure(temp_chain, repeat=3)
+        yield Result(f'create_temp_chain[n={length}]', length / seconds, 'blocks/s', params={'blocks': length})
+
+
+def bench_chain_memory(workload, sizes):
+    lengths = (1000,) if sizes == 'full' else (200,)
+    for length in lengths:
+        raw = json.dumps(workload.chain(length))
+        for name, compact in (('dicts', False), ('packed', True)):
+            gc.collect()
+            tracemalloc.start()
+            blocks = [Block.from_dict(block) for block in json.loads(raw)]
+            for block in blocks:
+                block.hash
+                if compact:
+                    block.compact()
+            gc.collect()
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            yield Result(f'chain_memory[{name},n={length}]', size / len(blocks), 'bytes/block', higher_is_better=False,
+                         params={'blocks': len(blocks)})
+
+
+def bench_chain_serialization(workload, sizes):
+    import main
+
+    lengths = (100, 1000) if sizes == 'full' else (50, 200)
+    client = main.app.test_client()
+    saved = main.blockchain
+    try:
+        for length in lengths:
+            blockchain = Blockchain()
+            blockchain.chain = [Block.from_dict(block) for block in workload.chain(length)]
+            main.blockchain = blockchain
+            for chain_format in ('json', 'ndjson'):
+                size = len(client.get('/chain', query_string={'format': chain_format}).data)
+                seconds = measure(lambda: client.get('/chain', query_string={'format': chain_format}).data, repeat=5)
+                yield Result(f'chain_serialization[{chain_format},n={length}]', seconds, 's', higher_is_better=False,
+                             params={'blocks': length, 'format': chain_format, 'bytes': size})
+    finally:
+        main.blockchain = saved
+
+
+BENCHMARKS = {
+    'block_hash': bench_block_hash,
+    'mine': bench_mine,
+    'signatures': bench_signatures,
+    'ingest': bench_ingest,
+    'validation': bench_validation,
+    'chain_memory': bench_chain_memory,
+    'chain_serialization': bench_chain_serialization,
+}
+
+
+def environment():
+    """
+    Describe the machine and code version the results were measured on.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'commit': commit, 'timestamp': datetime.now().isoformat()}
+
+
+def run(names, sizes='quick', seed=0):
+    """
+    Run benchmarks.
+
+    Args:
+        names (list): Benchmark names, see BENCHMARKS.
+        sizes (str): 'quick' or 'full' workload sizes.
+        seed (int): Seed of the generated data.
+
+    Returns:
+        dict: Environment, parameters and results.
+    """
+    workload = Workload(seed)
+    results = []
+    for name in names:
+        for result in BENCHMARKS[name](workload, sizes):
+            print(f"{result.name:45} {result.value:14.4f} {result.unit}", file=sys.stderr)
+            results.append(result.to_dict())
+    return {'environment': environment(), 'sizes': sizes, 'seed': seed, 'results': results}
+
+
+def compare(report, baseline, tolerance=0.1):
+    """
+    Compare results against a baseline report.
+
+    Args:
+        report (dict): Report from run.
+        baseline (dict): Earlier report from run.
+        tolerance (float): Relative change allowed before a result counts as a regression.
+
+    Returns:
+        list: One dict per result present in both reports, with the relative 'change'
+        (positive is better) and a 'regression' flag.
+    """
+    previous = {result['name']: result for result in baseline['results']}
+    comparisons = []
+    for result in report['results']:
+        base = previous.get(result['name'])
+        if base is None or not base['value']:
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        if not result['higher_is_better']:
+            change = -change
+        comparisons.append({'name': result['name'], 'baseline': base['value'], 'value': result['value'],
+                            'unit': result['unit'], 'change': change, 'regression': change < -tolerance})
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mining, signatures, chain validation, chain memory and /chain serialization")
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--full', action='store_true', help="larger workloads, slower but less noisy")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated transactions and chains")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--baseline', help="JSON report to compare against, exits with 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="relative slowdown tolerated by --baseline")
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    report = run(args.benchmarks or list(BENCHMARKS), 'full' if args.full else 'quick', args.seed)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('sizes') != report['sizes']:
+            print(f"Warning: baseline was measured with {baseline.get('sizes')} sizes", file=sys.stderr)
+        comparisons = compare(report, baseline, args.tolerance)
+        for comparison in comparisons:
+            flag = 'REGRESSION' if comparison['regression'] else ''
+            print(f"{comparison['name']:45} {comparison['baseline']:14.4f} -> {comparison['value']:14.4f} "
+                  f"{comparison['unit']:10} {comparison['change']:+8.1%} {flag}", file=sys.stderr)
+        if any(comparison['regression'] for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
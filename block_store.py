@@ -0,0 +1,310 @@
+from collections import OrderedDict
+import json
+import mmap
+import os
+import struct
+import threading
+
+INDEX_MAGIC = b'BIDX'
+INDEX_HEADER = struct.Struct('<4sIQ')  # magic, version, number of blocks
+INDEX_ENTRY = struct.Struct('<QI32s')  # data file offset, record length, block hash
+INDEX_GROWTH = 4096  # Index entries added to the file whenever it is full
+RECORD_LENGTH = struct.Struct('<I')
+
+
+class BlockStore:
+    def __init__(self, directory, sync_interval=16):
+        """
+        Open or create an append-only block store.
+
+        Blocks are appended as length-prefixed JSON records to 'blocks.dat'.
+        'blocks.idx' is a memory-mapped array of fixed-size entries (offset,
+        length, hash) so a block is located by height with one lookup. The
+        hash -> height map is rebuilt from the index on open, without reading
+        any block.
+
+        Args:
+            directory (str): Directory holding the data and index files.
+            sync_interval (int): Number of appended blocks between fsync calls.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sync_interval = max(1, sync_interval)
+        self._lock = threading.RLock()
+        self._unsynced = 0
+        self._data_fd = os.open(os.path.join(directory, 'blocks.dat'), os.O_RDWR | os.O_CREAT, 0o644)
+        self._index_file = open(os.path.join(directory, 'blocks.idx'), 'a+b')
+        if os.fstat(self._index_file.fileno()).st_size < INDEX_HEADER.size:
+            self._index_file.truncate(INDEX_HEADER.size + INDEX_GROWTH * INDEX_ENTRY.size)
+            self._index = mmap.mmap(self._index_file.fileno(), 0)
+            INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, 1, 0)
+        else:
+            self._index = mmap.mmap(self._index_file.fileno(), 0)
+            magic, _, _ = INDEX_HEADER.unpack_from(self._index, 0)
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{directory} does not contain a block index")
+        self._count = self._recover()
+        self._heights = {}  # block hash (bytes) -> height
+        for height in range(self._count):
+            self._heights[self._entry(height)[2]] = height
+
+    def _recover(self):
+        """
+        Drop index entries and trailing data left behind by an interrupted append.
+
+        Returns:
+            int: Number of complete blocks in the store.
+        """
+        count = INDEX_HEADER.unpack_from(self._index, 0)[2]
+        data_size = os.fstat(self._data_fd).st_size
+        while count > 0:
+            offset, length, _ = self._entry(count - 1)
+            if offset + RECORD_LENGTH.size + length <= data_size:
+                break
+            count -= 1
+        end = 0
+        if count > 0:
+            offset, length, _ = self._entry(count - 1)
+            end = offset + RECORD_LENGTH.size + length
+        if end != data_size:
+            os.ftruncate(self._data_fd, end)
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, 1, count)
+        self._data_size = end
+        return count
+
+    def _entry(self, height):
+        return INDEX_ENTRY.unpack_from(self._index, INDEX_HEADER.size + height * INDEX_ENTRY.size)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, block_dict, block_hash):
+        """
+        Append a block after the current tip.
+
+        Args:
+            block_dict (dict): Dictionary representation of the block.
+            block_hash (str): Hexadecimal hash of the block.
+        """
+        payload = json.dumps(block_dict, separators=(',', ':')).encode()
+        record = RECORD_LENGTH.pack(len(payload)) + payload
+        hash_bytes = bytes.fromhex(block_hash)
+        with self._lock:
+            offset = self._data_size
+            os.pwrite(self._data_fd, record, offset)
+            self._data_size += len(record)
+            position = INDEX_HEADER.size + self._count * INDEX_ENTRY.size
+            if position + INDEX_ENTRY.size > len(self._index):
+                self._index.flush()
+                self._index_file.truncate(position + INDEX_GROWTH * INDEX_ENTRY.size)
+                # Readers do not take the lock and may still be using the old map,
+                # it is left open and released once they drop it
+                self._index = mmap.mmap(self._index_file.fileno(), 0)
+            INDEX_ENTRY.pack_into(self._index, position, offset, len(payload), hash_bytes)
+            self._heights[hash_bytes] = self._count
+            self._count += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_interval:
+                self.flush()
+            else:
+                # The count only covers blocks whose data has been written
+                INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, 1, self._count)
+
+    def flush(self):
+        """
+        Write the appended blocks and their index entries to disk.
+        """
+        with self._lock:
+            os.fsync(self._data_fd)
+            INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, 1, self._count)
+            self._index.flush()
+            self._unsynced = 0
+
+    def truncate(self, height):
+        """
+        Remove the blocks from the given height on, e.g. before applying a reorganization.
+
+        Args:
+            height (int): Number of blocks to keep.
+        """
+        with self._lock:
+            if height >= self._count:
+                return
+            for removed in range(height, self._count):
+                self._heights.pop(self._entry(removed)[2], None)
+            end = self._entry(height)[0]
+            self._count = height
+            INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, 1, height)
+            self._index.flush()
+            os.ftruncate(self._data_fd, end)
+            self._data_size = end
+            os.fsync(self._data_fd)
+            self._unsynced = 0
+
+    def get(self, height):
+        """
+        Read the block at a height.
+
+        Args:
+            height (int): Index of the block.
+
+        Returns:
+            dict: Dictionary representation of the block.
+        """
+        return json.loads(self.get_raw(height))
+
+    def get_raw(self, height):
+        """
+        Read the serialized JSON of the block at a height.
+
+        Args:
+            height (int): Index of the block.
+
+        Returns:
+            bytes: JSON encoded block.
+        """
+        if not 0 <= height < self._count:
+            raise IndexError(f"no block at height {height}")
+        offset, length, _ = self._entry(height)
+        return os.pread(self._data_fd, length, offset + RECORD_LENGTH.size)
+
+    def get_hash(self, height):
+        """
+        Get the hash of the block at a height from the index.
+
+        Args:
+            height (int): Index of the block.
+
+        Returns:
+            str: Hexadecimal hash of the block.
+        """
+        if not 0 <= height < self._count:
+            raise IndexError(f"no block at height {height}")
+        return self._entry(height)[2].hex()
+
+    def height_of(self, block_hash):
+        """
+        Get the height of a stored block from its hash.
+
+        Args:
+            block_hash (str): Hexadecimal hash of the block.
+
+        Returns:
+            int or None: Index of the block, None if it is not stored.
+        """
+        try:
+            return self._heights.get(bytes.fromhex(block_hash))
+        except (TypeError, ValueError):
+            return None
+
+    def close(self):
+        """
+        Flush and close the data and index files.
+        """
+        with self._lock:
+            self.flush()
+            self._index.close()
+            self._index_file.close()
+            os.close(self._data_fd)
+
+
+class StoredChain:
+    def __init__(self, store, block_factory, cache_size=1024):
+        """
+        Initialize a list-like view of the blocks held by a BlockStore.
+
+        Only recently used blocks are kept in memory, older ones are read back
+        from the store when they are accessed.
+
+        Args:
+            store (BlockStore): Store holding the blocks.
+            block_factory (callable): Builds a block from its dictionary and stored hash.
+            cache_size (int): Number of decoded blocks kept in memory.
+        """
+        self.store = store
+        self.block_factory = block_factory
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # height -> Block
+
+    def __len__(self):
+        return len(self.store)
+
+    def __bool__(self):
+        return len(self.store) > 0
+
+    def _remember(self, height, block):
+        """
+        Cache a decoded block, evicting the least recently used ones beyond cache_size.
+        """
+        self._cache[height] = block
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _load(self, height):
+        block = self._cache.get(height)
+        if block is None:
+            block = self.block_factory(self.store.get(height), self.store.get_hash(height))
+            self._remember(height, block)
+        else:
+            self._cache.move_to_end(height)
+        return block
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._load(height) for height in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('chain index out of range')
+        return self._load(item)
+
+    def __iter__(self):
+        for height in range(len(self)):
+            yield self._load(height)
+
+    def __delitem__(self, item):
+        if not isinstance(item, slice) or item.stop is not None or item.step not in (None, 1):
+            raise TypeError('only the chain suffix can be deleted')
+        start = item.indices(len(self))[0]
+        for height in [height for height in self._cache if height >= start]:
+            del self._cache[height]
+        self.store.truncate(start)
+
+    def raw(self, height):
+        """
+        Get the stored JSON of a block without decoding it.
+
+        Args:
+            height (int): Index of the block.
+
+        Returns:
+            bytes: JSON encoded block.
+        """
+        return self.store.get_raw(height)
+
+    def append(self, block):
+        """
+        Append a block to the store.
+
+        Args:
+            block (Block): Block extending the current tip.
+        """
+        height = len(self.store)
+        self.store.append(block.to_dict(), block.hash)
+        self._remember(height, block)
+
+    def extend(self, blocks):
+        for block in blocks:
+            self.append(block)
+
+    def index_of_hash(self, block_hash):
+        """
+        Get the height of a block from its hash.
+
+        Args:
+            block_hash (str): Hexadecimal hash of the block.
+
+        Returns:
+            int or None: Index of the block, None if it is not in the chain.
+        """
+        return self.store.height_of(block_hash)
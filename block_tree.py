@@ -0,0 +1,126 @@
+from collections import OrderedDict
+
+
+class BlockTree:
+    def __init__(self, max_orphans=256, max_fork_depth=100):
+        """
+        Initialize the blocks known off the main chain.
+
+        Side blocks have a known parent and are kept with their cumulative
+        work, so a competing branch can be adopted without downloading it
+        again. Orphans are blocks whose parent has not arrived yet; they wait
+        in a bounded buffer until it does.
+
+        Args:
+            max_orphans (int): Number of orphans buffered, the oldest are dropped first.
+            max_fork_depth (int): Side blocks this far below the tip are forgotten.
+        """
+        self.max_orphans = max_orphans
+        self.max_fork_depth = max_fork_depth
+        self.side_blocks = {}  # block hash -> (Block, cumulative work)
+        self.orphans = OrderedDict()  # block hash -> Block, oldest first
+        self._orphans_by_parent = {}  # parent hash -> set of orphan hashes
+
+    def __contains__(self, block_hash):
+        return block_hash in self.side_blocks or block_hash in self.orphans
+
+    def add_side_block(self, block, work):
+        """
+        Remember a block off the main chain whose ancestors are all known.
+
+        Args:
+            block (Block): Validated block.
+            work (int): Cumulative work of the chain ending with the block.
+        """
+        self.side_blocks[block.hash] = (block, work)
+
+    def get_side_block(self, block_hash):
+        """
+        Get a side block and its cumulative work.
+
+        Returns:
+            tuple or None: (Block, work), None if the block is not a side block.
+        """
+        return self.side_blocks.get(block_hash)
+
+    def branch(self, tip_hash, height_of):
+        """
+        Walk back from a side block to the main chain.
+
+        Args:
+            tip_hash (str): Hash of the side block ending the branch.
+            height_of (callable): Returns the main chain height of a hash, or None.
+
+        Returns:
+            tuple: Height of the fork point and the side blocks after it, oldest first.
+            The height is None if part of the branch was pruned.
+        """
+        blocks = []
+        block_hash = tip_hash
+        while True:
+            height = height_of(block_hash)
+            if height is not None:
+                blocks.reverse()
+                return height, blocks
+            entry = self.side_blocks.get(block_hash)
+            if entry is None:
+                return None, []
+            block = entry[0]
+            blocks.append(block)
+            block_hash = block.prev_hash
+
+    def remove_side_block(self, block_hash):
+        self.side_blocks.pop(block_hash, None)
+
+    def add_orphan(self, block):
+        """
+        Buffer a block until its parent arrives, dropping the oldest orphan when full.
+
+        Args:
+            block (Block): Block with an unknown parent.
+        """
+        block_hash = block.hash
+        if block_hash in self.orphans:
+            return
+        self.orphans[block_hash] = block
+        self._orphans_by_parent.setdefault(block.prev_hash, set()).add(block_hash)
+        while len(self.orphans) > self.max_orphans:
+            self._remove_orphan(next(iter(self.orphans)))
+
+    def _remove_orphan(self, block_hash):
+        block = self.orphans.pop(block_hash)
+        siblings = self._orphans_by_parent.get(block.prev_hash)
+        if siblings is not None:
+            siblings.discard(block_hash)
+            if not siblings:
+                del self._orphans_by_parent[block.prev_hash]
+        return block
+
+    def pop_orphans(self, parent_hash):
+        """
+        Remove and return the orphans waiting for a block.
+
+        Args:
+            parent_hash (str): Hash of the block that just arrived.
+
+        Returns:
+            list: Orphans whose parent is the block.
+        """
+        return [self._remove_orphan(block_hash) for block_hash in list(self._orphans_by_parent.get(parent_hash, ()))]
+
+    def prune(self, tip_height):
+        """
+        Forget side blocks and orphans too far below the tip to ever win a fork.
+
+        Args:
+            tip_height (int): Height of the main chain tip.
+        """
+        min_height = tip_height - self.max_fork_depth
+        for block_hash in [block_hash for block_hash, (block, _) in self.side_blocks.items()
+                           if block.index < min_height]:
+            del self.side_blocks[block_hash]
+        for block_hash in [block_hash for block_hash, block in self.orphans.items() if block.index < min_height]:
+            self._remove_orphan(block_hash)
+
+    def stats(self):
+        return {'side_blocks': len(self.side_blocks), 'orphans': len(self.orphans)}
@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import requests
+
+from metrics import Counter, Histogram
+
+BROADCAST_LATENCY = Histogram('broadcast_latency_seconds', 'Latency of successful posts to peers', ('peer',))
+BROADCAST_FAILURES = Counter('broadcast_failures', 'Posts to peers that failed after every retry', ('peer',))
+BROADCAST_RETRIES = Counter('broadcast_retries', 'Posts to peers retried after a transient error', ('peer',))
+
+
+class PeerStats:
+    __slots__ = ('requests', 'failures', 'retries', 'total_latency', 'last_latency', 'last_error')
+
+    def __init__(self):
+        """
+        Initialize the delivery statistics of a peer.
+        """
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.total_latency = 0.0
+        self.last_latency = 0.0
+        self.last_error = None
+
+    def to_dict(self):
+        """
+        Get the statistics as a dictionary.
+
+        Returns:
+            dict: Request and failure counts and latencies in seconds.
+        """
+        delivered = self.requests - self.failures
+        return {
+            'requests': self.requests,
+            'failures': self.failures,
+            'retries': self.retries,
+            'average_latency': self.total_latency / delivered if delivered else None,
+            'last_latency': self.last_latency,
+            'last_error': self.last_error,
+        }
+
+
+class Broadcaster:
+    def __init__(self, max_workers=64, timeout=5, retries=2, backoff=0.2):
+        """
+        Initialize a broadcaster that posts to peers concurrently over keep-alive sessions.
+
+        Args:
+            max_workers (int): Number of peers contacted at the same time.
+            timeout (float): Seconds to wait for each peer's response.
+            retries (int): Number of retries after a connection error, timeout or server error.
+            backoff (float): Delay before the first retry in seconds, doubled for every further retry.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.peer_stats = {}  # peer URL -> PeerStats
+        self._sessions = {}  # peer URL -> requests.Session
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def session(self, peer):
+        """
+        Get the persistent session used for a peer.
+
+        Args:
+            peer (str): Peer URL.
+
+        Returns:
+            requests.Session: Session reusing its connections to the peer.
+        """
+        with self._lock:
+            if peer not in self._sessions:
+                self._sessions[peer] = requests.Session()
+                self.peer_stats[peer] = PeerStats()
+            return self._sessions[peer]
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='broadcast')
+            return self._executor
+
+    def post(self, peer, path, payload):
+        """
+        Post a JSON payload to a peer, retrying with exponential backoff on transient errors.
+
+        Args:
+            peer (str): Peer URL.
+            path (str): Endpoint path relative to the peer URL.
+            payload (dict): JSON body.
+
+        Returns:
+            int or None: Response status code, None if the peer could not be reached.
+        """
+        session = self.session(peer)
+        stats = self.peer_stats[peer]
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                response = session.post(peer + path, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code < 500:
+                    latency = time.perf_counter() - started
+                    with self._lock:
+                        stats.requests += 1
+                        stats.total_latency += latency
+                        stats.last_latency = latency
+                    BROADCAST_LATENCY.labels(peer).observe(latency)
+                    return response.status_code
+                error = f"HTTP {response.status_code}"
+            if attempt < self.retries:
+                with self._lock:
+                    stats.retries += 1
+                BROADCAST_RETRIES.labels(peer).inc()
+                time.sleep(delay)
+                delay *= 2
+        with self._lock:
+            stats.requests += 1
+            stats.failures += 1
+            stats.last_error = error
+        BROADCAST_FAILURES.labels(peer).inc()
+        return None
+
+    def broadcast(self, peers, path, payload):
+        """
+        Post a JSON payload to all peers concurrently and wait for every delivery.
+
+        Args:
+            peers (list): List of peer URLs.
+            path (str): Endpoint path relative to the peer URLs.
+            payload (dict): JSON body.
+
+        Returns:
+            dict: Peer URL -> response status code, None for unreachable peers.
+        """
+        executor = self._get_executor()
+        futures = {peer: executor.submit(self.post, peer, path, payload) for peer in peers}
+        return {peer: future.result() for peer, future in futures.items()}
+
+    def stats(self):
+        """
+        Get the delivery statistics of every contacted peer.
+
+        Returns:
+            dict: Peer URL -> statistics dictionary.
+        """
+        with self._lock:
+            return {peer: stats.to_dict() for peer, stats in self.peer_stats.items()}
+
+    def close(self):
+        """
+        Stop the worker threads and close the peer sessions.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for session in self._sessions.values():
+            session.close()
+        self._sessions.clear()
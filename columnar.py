@@ -0,0 +1,252 @@
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+import struct
+import threading
+import uuid
+
+MESSAGE_FIELDS = ('transaction_id', 'transaction_timestamp', 'from_addr', 'to_addr', 'amount', 'fee')
+TRANSACTION_FIELDS = ('message', 'signature')
+COINBASE_FIELDS = MESSAGE_FIELDS + ('signature',)
+SIGNATURE_LENGTH = 64  # Bytes of a raw SECP256k1 signature (r and s)
+# Id, timestamp, receiver, amount and signature of a coinbase transaction
+COINBASE_RECORD = struct.Struct(f'<16sqId{SIGNATURE_LENGTH}s')
+# Column widths in bytes of a signed transaction: id, timestamp, sender and receiver,
+# amount and fee mantissas, amount and fee exponents, signature
+COLUMNS = ((16, '16s'), (8, 'q'), (8, '2I'), (16, '2q'), (2, '2b'), (SIGNATURE_LENGTH, f'{SIGNATURE_LENGTH}s'))
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+INT64_RANGE = range(-2 ** 63, 2 ** 63)
+INT8_RANGE = range(-128, 128)
+
+
+class StringTable:
+    def __init__(self):
+        """
+        Initialize a table numbering distinct strings, so repeated addresses are stored once.
+        """
+        self.strings = []
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def index(self, string):
+        """
+        Get the number of a string, adding it to the table if needed.
+
+        Args:
+            string (str): String to look up.
+
+        Returns:
+            int: Position of the string in the table.
+        """
+        position = self._indexes.get(string)
+        if position is None:
+            with self._lock:
+                position = self._indexes.get(string)
+                if position is None:
+                    position = self._indexes[string] = len(self.strings)
+                    self.strings.append(string)
+        return position
+
+
+# Shared by every chain of the process, addresses recur across blocks and nodes
+ADDRESSES = StringTable()
+
+
+def _pack_timestamp(value):
+    """
+    Get the microseconds since the epoch of a str(datetime) timestamp, None if it does not round-trip.
+    """
+    try:
+        microseconds = (datetime.fromisoformat(value) - EPOCH) // MICROSECOND
+    except (TypeError, ValueError):
+        return None
+    if microseconds not in INT64_RANGE or _unpack_timestamp(microseconds) != value:
+        return None
+    return microseconds
+
+
+def _unpack_timestamp(microseconds):
+    return str(EPOCH + microseconds * MICROSECOND)
+
+
+def _pack_number(value):
+    """
+    Split a decimal string into a 64-bit mantissa and an 8-bit exponent, None if it does not round-trip.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        sign, digits, exponent = Decimal(value).as_tuple()
+    except InvalidOperation:
+        return None
+    if not isinstance(exponent, int) or exponent not in INT8_RANGE:
+        return None
+    mantissa = int(''.join(map(str, digits))) * (-1 if sign else 1)
+    if mantissa not in INT64_RANGE or _unpack_number(mantissa, exponent) != value:
+        return None
+    return mantissa, exponent
+
+
+def _unpack_number(mantissa, exponent):
+    return str(Decimal(mantissa).scaleb(exponent))
+
+
+def _pack_id_and_signature(transaction_id, signature):
+    """
+    Convert a UUID string and a hex signature to bytes, None if either does not round-trip.
+    """
+    try:
+        id_bytes = uuid.UUID(transaction_id).bytes
+        signature_bytes = bytes.fromhex(signature)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if str(uuid.UUID(bytes=id_bytes)) != transaction_id:
+        return None
+    if len(signature_bytes) != SIGNATURE_LENGTH or signature_bytes.hex() != signature:
+        return None
+    return id_bytes, signature_bytes
+
+
+def _pack_signed(transaction):
+    """
+    Convert a signed transaction into its column values.
+
+    Returns:
+        tuple: One value per column, see COLUMNS, None if the transaction does not have
+        the usual shape and must be kept as is.
+    """
+    if not isinstance(transaction, dict) or tuple(transaction) != TRANSACTION_FIELDS:
+        return None
+    message = transaction['message']
+    if not isinstance(message, dict) or tuple(message) != MESSAGE_FIELDS:
+        return None
+    if not isinstance(message['from_addr'], str) or not isinstance(message['to_addr'], str):
+        return None
+    binary = _pack_id_and_signature(message['transaction_id'], transaction['signature'])
+    timestamp = _pack_timestamp(message['transaction_timestamp'])
+    amount = _pack_number(message['amount'])
+    fee = _pack_number(message['fee'])
+    if binary is None or timestamp is None or amount is None or fee is None:
+        return None
+    addresses = (ADDRESSES.index(message['from_addr']), ADDRESSES.index(message['to_addr']))
+    return (binary[0],), (timestamp,), addresses, (amount[0], fee[0]), (amount[1], fee[1]), (binary[1],)
+
+
+def _pack_coinbase(transaction):
+    """
+    Convert a coinbase transaction into a COINBASE_RECORD, None if it does not have the usual shape.
+    """
+    if not isinstance(transaction, dict) or tuple(transaction) != COINBASE_FIELDS:
+        return None
+    if transaction['from_addr'] is not None or not isinstance(transaction['to_addr'], str):
+        return None
+    if type(transaction['amount']) is not float or type(transaction['fee']) is not int or transaction['fee'] != 0:
+        return None
+    binary = _pack_id_and_signature(transaction['transaction_id'], transaction['signature'])
+    timestamp = _pack_timestamp(transaction['transaction_timestamp'])
+    if binary is None or timestamp is None:
+        return None
+    return COINBASE_RECORD.pack(binary[0], timestamp, ADDRESSES.index(transaction['to_addr']),
+                                transaction['amount'], binary[1])
+
+
+class PackedTransactions(Sequence):
+    __slots__ = ('_count', '_packed', '_coinbase', '_columns', '_unpacked_positions', '_unpacked')
+
+    def __init__(self, transactions):
+        """
+        Pack the transactions of a confirmed block into typed columns.
+
+        Signed transactions are stored column by column in one buffer: 16-byte
+        ids, integer timestamps, numbers of the shared address table,
+        mantissa/exponent amounts and fees, and binary signatures. A leading
+        coinbase transaction gets a fixed record. Transactions of any other
+        shape are kept as dictionaries. Dictionaries are rebuilt on access,
+        identical to the packed ones, so hashes and signatures still match.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+        """
+        self._count = len(transactions)
+        self._coinbase = _pack_coinbase(transactions[0]) if transactions else None
+        self._unpacked_positions = ()  # Sorted positions of the transactions kept as dictionaries
+        self._unpacked = ()  # Those transactions, in the same order
+        columns = [[] for _ in COLUMNS]
+        unpacked = []
+        for position in range(1 if self._coinbase is not None else 0, self._count):
+            values = _pack_signed(transactions[position])
+            if values is None:
+                unpacked.append((position, transactions[position]))
+                continue
+            for column, value in zip(columns, values):
+                column.append(value)
+        if unpacked:
+            self._unpacked_positions = tuple(position for position, _ in unpacked)
+            self._unpacked = tuple(transaction for _, transaction in unpacked)
+        self._packed = len(columns[0])
+        self._columns = b''.join(struct.pack('<' + code, *value)
+                                 for (_, code), column in zip(COLUMNS, columns) for value in column)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._get(i) for i in range(*position.indices(self._count))]
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError('transaction index out of range')
+        return self._get(position)
+
+    def __iter__(self):
+        for position in range(self._count):
+            yield self._get(position)
+
+    def __eq__(self, other):
+        if isinstance(other, (PackedTransactions, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f'PackedTransactions({self._count} transactions, {len(self._unpacked)} unpacked)'
+
+    def _get(self, position):
+        if position == 0 and self._coinbase is not None:
+            return self._get_coinbase()
+        unpacked = bisect_left(self._unpacked_positions, position)
+        if unpacked < len(self._unpacked_positions) and self._unpacked_positions[unpacked] == position:
+            return self._unpacked[unpacked]
+        slot = position - unpacked - (1 if self._coinbase is not None else 0)
+        values = []
+        offset = 0
+        for width, code in COLUMNS:
+            values.append(struct.unpack_from('<' + code, self._columns, offset + slot * width))
+            offset += width * self._packed
+        (id_bytes,), (timestamp,), (sender, receiver), (amount, fee), (amount_exponent, fee_exponent), (signature,) = values
+        message = {
+            'transaction_id': str(uuid.UUID(bytes=id_bytes)),
+            'transaction_timestamp': _unpack_timestamp(timestamp),
+            'from_addr': ADDRESSES.strings[sender],
+            'to_addr': ADDRESSES.strings[receiver],
+            'amount': _unpack_number(amount, amount_exponent),
+            'fee': _unpack_number(fee, fee_exponent),
+        }
+        return {'message': message, 'signature': signature.hex()}
+
+    def _get_coinbase(self):
+        id_bytes, timestamp, receiver, amount, signature = COINBASE_RECORD.unpack(self._coinbase)
+        return {
+            'transaction_id': str(uuid.UUID(bytes=id_bytes)),
+            'transaction_timestamp': _unpack_timestamp(timestamp),
+            'from_addr': None,
+            'to_addr': ADDRESSES.strings[receiver],
+            'amount': amount,
+            'fee': 0,
+            'signature': signature.hex(),
+        }
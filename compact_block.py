@@ -0,0 +1,154 @@
+from hashlib import sha256
+
+import requests
+
+from mempool import transaction_key
+
+SHORT_ID_LENGTH = 16  # Hex digits of a short transaction id (8 bytes)
+REQUEST_TIMEOUT = 10  # Seconds to wait for a peer's response
+# Fields of a compact block header, see Block.header()
+HEADER_FIELDS = ('index', 'block_timestamp', 'prev_hash', 'merkle_root', 'miner', 'nonce', 'hash', 'transaction_count')
+
+
+def short_transaction_id(block_hash, transaction):
+    """
+    Derive the short id of a transaction announced in a block.
+
+    Ids are salted with the block hash, so transactions crafted to collide in
+    one block do not collide in the next.
+
+    Args:
+        block_hash (str): Hash of the announced block.
+        transaction (dict): Transaction dictionary.
+
+    Returns:
+        str: Hexadecimal short id.
+    """
+    return sha256((block_hash + str(transaction_key(transaction))).encode()).hexdigest()[:SHORT_ID_LENGTH]
+
+
+def make_compact_block(block):
+    """
+    Describe a block by its header and the short ids of its transactions.
+
+    The coinbase transaction is sent in full since peers cannot have it in
+    their mempool.
+
+    Args:
+        block (Block): Block to announce.
+
+    Returns:
+        dict: 'header', 'short_ids' and 'prefilled' ({'index', 'transaction'} dictionaries).
+    """
+    block_hash = block.hash
+    prefilled = []
+    short_ids = []
+    for position, transaction in enumerate(block.transactions):
+        if 'message' not in transaction:
+            prefilled.append({'index': position, 'transaction': transaction})
+        else:
+            short_ids.append(short_transaction_id(block_hash, transaction))
+    return {'header': block.header(), 'short_ids': short_ids, 'prefilled': prefilled}
+
+
+def is_well_formed(compact_block):
+    """
+    Check the shape of a compact block received from a peer before rebuilding it.
+
+    The header must have every header field, and the prefilled transactions
+    distinct positions within the block, leaving one position per short id.
+
+    Args:
+        compact_block (dict): Compact block, see make_compact_block.
+
+    Returns:
+        bool: True if the compact block can be rebuilt, False otherwise.
+    """
+    if not isinstance(compact_block, dict):
+        return False
+    header, short_ids, prefilled = (compact_block.get(key) for key in ('header', 'short_ids', 'prefilled'))
+    if not isinstance(header, dict) or not all(field in header for field in HEADER_FIELDS):
+        return False
+    if not isinstance(header['hash'], str) or type(header['transaction_count']) is not int:
+        return False
+    if not isinstance(short_ids, list) or not all(isinstance(short_id, str) for short_id in short_ids):
+        return False
+    if not isinstance(prefilled, list):
+        return False
+    positions = set()
+    for entry in prefilled:
+        if not isinstance(entry, dict) or not isinstance(entry.get('transaction'), dict):
+            return False
+        position = entry.get('index')
+        if type(position) is not int or not 0 <= position < header['transaction_count'] or position in positions:
+            return False
+        positions.add(position)
+    return len(short_ids) + len(positions) == header['transaction_count']
+
+
+def reconstruct_transactions(compact_block, mempool):
+    """
+    Fill in the transactions of a compact block from the mempool.
+
+    Args:
+        compact_block (dict): Compact block, see make_compact_block.
+        mempool (Mempool): Unconfirmed transactions of the receiving node.
+
+    Returns:
+        tuple: The transactions of the block in order, None where missing,
+        and the positions of the missing ones.
+    """
+    header = compact_block['header']
+    transactions = [None] * header['transaction_count']
+    for prefilled in compact_block['prefilled']:
+        transactions[prefilled['index']] = prefilled['transaction']
+    available = {short_transaction_id(header['hash'], transaction): transaction
+                 for transaction in mempool.transactions()}
+    short_ids = iter(compact_block['short_ids'])
+    missing = []
+    for position in range(len(transactions)):
+        if transactions[position] is not None:
+            continue
+        transaction = available.get(next(short_ids, None))
+        if transaction is None:
+            missing.append(position)
+        transactions[position] = transaction
+    return transactions, missing
+
+
+def fetch_block_transactions(peer, block_hash, positions, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Download some transactions of a block from the peer that announced it.
+
+    Args:
+        peer (str): Peer URL.
+        block_hash (str): Hash of the block.
+        positions (list): Positions of the transactions in the block.
+        timeout (float): Seconds to wait for the response.
+        transport: Object with the get/post interface of requests.
+
+    Returns:
+        list: Transaction dictionaries, in the order of positions.
+    """
+    response = transport.post(peer + 'block_transactions', json={'hash': block_hash, 'indexes': positions},
+                              timeout=timeout)
+    response.raise_for_status()
+    return response.json()['transactions']
+
+
+def fetch_block(peer, block_hash, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Download a full block from a peer.
+
+    Args:
+        peer (str): Peer URL.
+        block_hash (str): Hash of the block.
+        timeout (float): Seconds to wait for the response.
+        transport: Object with the get/post interface of requests.
+
+    Returns:
+        dict: Dictionary representation of the block.
+    """
+    response = transport.get(peer + 'block/' + block_hash, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
@@ -0,0 +1,130 @@
+from collections import deque
+import json
+import os
+
+from mempool import transaction_key
+
+
+class ConfirmedTransactions:
+    def __init__(self, window=1000):
+        """
+        Initialize an index of the ids of the signed transactions in the most recent blocks.
+
+        Only the last `window` blocks are covered, so the index does not grow
+        with the chain; a transaction confirmed deeper than that is no longer
+        recognized as confirmed.
+
+        Args:
+            window (int): Number of blocks below and including the tip whose transaction ids are kept.
+        """
+        self.window = max(1, int(window))
+        self.ids = set()  # Transaction ids of the covered blocks
+        self._blocks = deque()  # (height, transaction ids) of the covered blocks, oldest first
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def apply_block(self, block):
+        """
+        Add the signed transactions of a block appended to the chain, forgetting the blocks leaving the window.
+
+        Args:
+            block (Block): Block extending the last applied block.
+        """
+        ids = [transaction_key(transaction) for transaction in block.transactions[1:]]
+        self._blocks.append((block.index, ids))
+        self.ids.update(ids)
+        while self._blocks and self._blocks[0][0] <= block.index - self.window:
+            self.ids.difference_update(self._blocks.popleft()[1])
+
+    def undo_block(self, block):
+        """
+        Forget the transactions of a block removed from the tip of the chain.
+
+        Args:
+            block (Block): Last applied block.
+        """
+        while self._blocks and self._blocks[-1][0] >= block.index:
+            self.ids.difference_update(self._blocks.pop()[1])
+
+    def ids_above(self, height):
+        """
+        Get the transaction ids of the covered blocks above a height.
+
+        Args:
+            height (int): Index of a main chain block.
+
+        Returns:
+            set: Transaction ids.
+        """
+        ids = set()
+        for block_height, block_ids in reversed(self._blocks):
+            if block_height <= height:
+                break
+            ids.update(block_ids)
+        return ids
+
+    def rebuild(self, blocks):
+        """
+        Recompute the index from the last blocks of a chain.
+
+        Args:
+            blocks (list): Consecutive blocks ending with the tip, at least the last `window` ones if available.
+        """
+        self.clear()
+        for block in blocks:
+            self.apply_block(block)
+
+    def clear(self):
+        """
+        Forget every transaction, e.g. when the chain is replaced by a snapshot.
+        """
+        self.ids.clear()
+        self._blocks.clear()
+
+    def save(self, path, tip_hash):
+        """
+        Write the index next to a block store so a restart does not read the blocks again.
+
+        Args:
+            path (str): File to write.
+            tip_hash (str): Hash of the block the index was computed at.
+        """
+        state = {'tip_hash': tip_hash, 'window': self.window, 'blocks': list(self._blocks)}
+        with open(path + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, tip_hash, window):
+        """
+        Read an index written by save if it matches the chain tip.
+
+        Args:
+            path (str): File to read.
+            tip_hash (str): Hash of the current chain tip.
+            window (int): Number of blocks to cover, see __init__.
+
+        Returns:
+            ConfirmedTransactions or None: Restored index, None if the file is missing, stale
+            or covers fewer blocks than the window.
+        """
+        try:
+            with open(path) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if state.get('tip_hash') != tip_hash or state.get('window', 0) < window:
+            return None
+        confirmed = cls(window)
+        for height, ids in state['blocks']:
+            confirmed._blocks.append((height, ids))
+            confirmed.ids.update(ids)
+        if confirmed._blocks:
+            tip_height = confirmed._blocks[-1][0]
+            while confirmed._blocks[0][0] <= tip_height - confirmed.window:
+                confirmed.ids.difference_update(confirmed._blocks.popleft()[1])
+        return confirmed
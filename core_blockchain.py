@@ -1,16 +1,69 @@
 from hashlib import sha256
 from datetime import datetime
-from ecdsa import SigningKey, SECP256k1, VerifyingKey
-import json, uuid
+import json, logging, os, threading, time, uuid
 import requests
-from flask import request
+from flask import has_request_context, request
+from mining import MiningEngine
+from mempool import Mempool, transaction_key
+from verification import SignatureVerifier, load_signing_key
+from sync import fetch_tip, sync_with_peer
+from broadcast import Broadcaster
+from block_store import StoredChain
+from block_tree import BlockTree
+from ledger import Ledger
+from confirmed import ConfirmedTransactions
+from validation import ChainValidator, is_valid_nonce
+from merkle import MerkleTree, transaction_hash
+from columnar import PackedTransactions
+from compact_block import (make_compact_block, is_well_formed, reconstruct_transactions, fetch_block_transactions,
+                           fetch_block)
+from snapshot import SNAPSHOT_CONFIRMATIONS, SNAPSHOT_VERSION, make_snapshot, snapshot_commitment
+from metrics import Counter, Histogram
+
+log = logging.getLogger(__name__)
+
+BLOCK_PROCESS_SECONDS = Histogram('block_process_seconds', 'Duration of process_block by outcome', ('status',))
+CONSENSUS_SECONDS = Histogram('consensus_seconds', 'Duration of consensus rounds')
+SIGN_SECONDS = Histogram('signature_sign_seconds', 'Duration of generate_signature')
+REORGANIZATIONS = Counter('chain_reorganizations', 'Switches of the main chain to another branch')
 
 # Dummy private and public keys for demonstration purpose
 private_key = 'fc67e176ef44abc9f2539e4bdbf4fa314f0682bbc7260228fac32f78e4beecfe'
 public_key = '0d29d6ef8347672c57f75438a3fefda5dfbd9e9becd6233b7d9a015d2a1827e6607707f4f7dfebf59c20f460f33543110001155140c2d9606a582d5cdda57a12'
 
 
+# Block fields that make up the nonce-independent part of the hashed block header
+PREFIX_FIELDS = frozenset(('index', 'block_timestamp', 'transactions', 'prev_hash', 'miner'))
+
+
+def header_prefix(index, block_timestamp, prev_hash, merkle_root, miner):
+    """
+    Serialize the nonce-independent header fields that are hashed with the nonce.
+
+    The transactions only enter the header through their Merkle root, so the
+    header has the same size whatever the number of transactions. The fields
+    are encoded as a JSON array, so no two headers serialize alike, and the
+    nonce digits appended after the closing bracket cannot be confused with
+    the miner; only integer nonces are valid, see is_valid_nonce.
+
+    Returns:
+        str: Serialized header without the trailing nonce.
+    """
+    return json.dumps([index, block_timestamp, prev_hash, merkle_root, miner], separators=(',', ':'))
+
+
+# Name of the ledger file saved next to a persistent block store
+LEDGER_FILE = 'ledger.json'
+# Name of the file keeping the recently confirmed transaction ids, saved next to the ledger
+CONFIRMED_FILE = 'confirmed.json'
+# Name of the file keeping the ledger of an imported snapshot, the base for rebuilding the ledger
+SNAPSHOT_LEDGER_FILE = 'snapshot_ledger.json'
+
+
 class Block:
+    __slots__ = ('index', 'block_timestamp', 'transactions', 'prev_hash', 'miner', 'nonce',
+                 '_merkle', '_merkle_root', '_prefix', '_midstate', '_hash')
+
     def __init__(self, index, block_timestamp, transactions, prev_hash, miner, nonce=0):
         """
         Initialize a block with its attributes.
@@ -30,26 +83,322 @@ class Block:
         self.miner = miner
         self.nonce = nonce
 
+    def __setattr__(self, name, value):
+        """
+        Set an attribute and drop the cached hash state that depends on it.
+
+        Mutating the transactions list in place is not detected, use
+        add_transaction/replace_transaction or call invalidate_hash() afterwards.
+        """
+        object.__setattr__(self, name, value)
+        if name == 'transactions':
+            object.__setattr__(self, '_merkle', None)
+        if name in PREFIX_FIELDS:
+            self._invalidate_header()
+        elif name == 'nonce':
+            object.__setattr__(self, '_hash', None)
+
+    def remember_hash(self, block_hash):
+        """
+        Memoize a hash of this block computed elsewhere, e.g. by a validation worker.
+
+        Args:
+            block_hash (str): Hash of the block in its current state.
+        """
+        object.__setattr__(self, '_hash', block_hash)
+
+    def invalidate_hash(self):
+        """
+        Drop the cached Merkle tree, serialized prefix, midstate and digest.
+        """
+        object.__setattr__(self, '_merkle', None)
+        self._invalidate_header()
+
+    def _invalidate_header(self):
+        object.__setattr__(self, '_merkle_root', None)
+        object.__setattr__(self, '_prefix', None)
+        object.__setattr__(self, '_midstate', None)
+        object.__setattr__(self, '_hash', None)
+
+    def add_transaction(self, transaction):
+        """
+        Append a transaction, rehashing only one Merkle path.
+
+        Args:
+            transaction (dict): Transaction to include in the block.
+        """
+        self.transactions.append(transaction)
+        if self._merkle is not None:
+            self._merkle.append(transaction_hash(transaction))
+        self._invalidate_header()
+
+    def replace_transaction(self, position, transaction):
+        """
+        Replace a transaction, rehashing only one Merkle path.
+
+        Args:
+            position (int): Index of the transaction in the block.
+            transaction (dict): New transaction.
+        """
+        self.transactions[position] = transaction
+        if self._merkle is not None:
+            self._merkle.replace(position, transaction_hash(transaction))
+        self._invalidate_header()
+
+    @property
+    def merkle_root(self):
+        """
+        Get the Merkle root of the transactions, hashing each transaction only once.
+
+        Returns:
+            str: Hexadecimal Merkle root.
+        """
+        if self._merkle_root is None:
+            if self._merkle is None:
+                object.__setattr__(self, '_merkle', MerkleTree.from_transactions(self.transactions))
+            object.__setattr__(self, '_merkle_root', self._merkle.root)
+        return self._merkle_root
+
+    def compact(self):
+        """
+        Pack the transactions of a confirmed block into columns and drop the caches only needed while mining.
+
+        The hash and Merkle root stay memoized. The Merkle tree, header prefix
+        and midstate are rebuilt if ever needed again, and the transactions
+        are decoded back into dictionaries when accessed.
+
+        Returns:
+            Block: This block.
+        """
+        if not isinstance(self.transactions, PackedTransactions):
+            # Memoize the root and the hash before the tree they derive from is dropped
+            self.merkle_root
+            self.hash
+            object.__setattr__(self, 'transactions', PackedTransactions(self.transactions))
+            object.__setattr__(self, '_merkle', None)
+            object.__setattr__(self, '_prefix', None)
+            object.__setattr__(self, '_midstate', None)
+        return self
+
+    @classmethod
+    def from_dict(cls, block_data, block_hash=None):
+        """
+        Create a block from its dictionary representation.
+
+        Args:
+            block_data (dict): Dictionary with the block attributes.
+            block_hash (str): Trusted hash of the block, e.g. read from the local block store.
+                It is recomputed on first access when omitted.
+
+        Returns:
+            Block: Block built from the dictionary.
+        """
+        if block_hash is not None and 'merkle_root' in block_data:
+            # Header-only block of a snapshot, only trusted when read back from the local store
+            return PrunedBlock.from_header(dict(block_data, hash=block_hash))
+        block = cls(block_data['index'], block_data['block_timestamp'], block_data['transactions'],
+                    block_data['prev_hash'], block_data['miner'], block_data['nonce'])
+        if block_hash is not None:
+            block.remember_hash(block_hash)
+        return block
+
+    def to_dict(self):
+        """
+        Get the dictionary representation of the block.
+
+        Returns:
+            dict: Block attributes keyed by name.
+        """
+        return {
+            'index': self.index,
+            'block_timestamp': self.block_timestamp,
+            'transactions': list(self.transactions),
+            'prev_hash': self.prev_hash,
+            'miner': self.miner,
+            'nonce': self.nonce,
+        }
+
+    def header(self):
+        """
+        Get the block fields without the transactions, plus the block hash.
+
+        Returns:
+            dict: Header of the block.
+        """
+        return {
+            'index': self.index,
+            'block_timestamp': self.block_timestamp,
+            'prev_hash': self.prev_hash,
+            'merkle_root': self.merkle_root,
+            'miner': self.miner,
+            'nonce': self.nonce,
+            'hash': self.hash,
+            'transaction_count': len(self.transactions),
+        }
+
+    @staticmethod
+    def hash_header(header):
+        """
+        Calculate a block hash from a header alone, see header().
+
+        Args:
+            header (dict): Block header.
+
+        Returns:
+            str: Hash of the block the header belongs to.
+        """
+        prefix = header_prefix(header['index'], header['block_timestamp'], header['prev_hash'],
+                               header['merkle_root'], header['miner'])
+        return sha256((prefix + str(header['nonce'])).encode()).hexdigest()
+
     @property 
     def hash(self):
         """
-        Calculate the hash of the block using SHA-256.
+        Calculate the hash of the block header using SHA-256.
+
+        The digest is memoized until a field changes, and the hash state of
+        the nonce-independent prefix is reused when only the nonce changes.
+
+        Returns:
+            str: Hash of the block.
+        """
+        if self._hash is None:
+            if self._midstate is None:
+                object.__setattr__(self, '_midstate', sha256(self.hash_prefix().encode()))
+            h = self._midstate.copy()
+            h.update(str(self.nonce).encode())
+            object.__setattr__(self, '_hash', h.hexdigest())
+        return self._hash
+
+    def compute_hash(self):
+        """
+        Recompute the hash from the block fields, ignoring the memoized digest, Merkle root and prefix.
+
+        Used by validation, since a memoized hash may come from the block store rather than the fields.
 
         Returns:
             str: Hash of the block.
         """
-        block_string = str(self.index) + str(self.block_timestamp) + str(self.transactions) + str(self.prev_hash) + str(self.miner) + str(self.nonce)
-        return sha256(block_string.encode()).hexdigest()
+        prefix = header_prefix(self.index, self.block_timestamp, self.prev_hash,
+                               MerkleTree.from_transactions(self.transactions).root, self.miner)
+        return sha256((prefix + str(self.nonce)).encode()).hexdigest()
+
+    def hash_prefix(self):
+        """
+        Build the part of the hashed block header that does not depend on the nonce.
+
+        Returns:
+            str: Serialized header fields without the trailing nonce.
+        """
+        if self._prefix is None:
+            prefix = header_prefix(self.index, self.block_timestamp, self.prev_hash, self.merkle_root, self.miner)
+            object.__setattr__(self, '_prefix', prefix)
+        return self._prefix
+
+
+class PrunedBlock(Block):
+    __slots__ = ('transaction_count',)
+
+    def __init__(self, index, block_timestamp, prev_hash, miner, nonce, merkle_root, transaction_count):
+        """
+        Initialize a block of the history below an imported snapshot, known by its header only.
+
+        The Merkle root stands in for the transactions, which are not kept,
+        so the block hashes like the full block.
+
+        Args:
+            merkle_root (str): Merkle root of the transactions of the full block.
+            transaction_count (int): Number of transactions of the full block.
+        """
+        object.__setattr__(self, 'transaction_count', transaction_count)
+        super().__init__(index, block_timestamp, [], prev_hash, miner, nonce)
+        object.__setattr__(self, '_merkle_root', merkle_root)
+
+    @property
+    def merkle_root(self):
+        return self._merkle_root
+
+    def compact(self):
+        return self
+
+    def compute_hash(self):
+        # Only the header is known, the Merkle root stands for the transactions
+        return Block.hash_header(self.header())
+
+    @classmethod
+    def from_header(cls, header):
+        """
+        Create a header-only block from a header whose hash was checked, see Block.header().
+
+        Args:
+            header (dict): Block header.
+
+        Returns:
+            PrunedBlock: Block with the header's hash memoized.
+        """
+        block = cls(header['index'], header['block_timestamp'], header['prev_hash'], header['miner'],
+                    header['nonce'], header['merkle_root'], header['transaction_count'])
+        block.remember_hash(header['hash'])
+        return block
+
+    def to_dict(self):
+        block_dict = super().to_dict()
+        block_dict['merkle_root'] = self._merkle_root
+        block_dict['transaction_count'] = self.transaction_count
+        return block_dict
+
+    def header(self):
+        header = super().header()
+        header['transaction_count'] = self.transaction_count
+        return header
+
 
 class Blockchain:
-    def __init__(self):
+    def __init__(self, mining_workers=1, mining_batch_size=100000, max_block_transactions=500,
+                 mempool_max_count=10000, mempool_max_bytes=32 * 1024 * 1024, verify_workers=1, verifier=None,
+                 broadcaster=None, validate_workers=1, validator=None, max_orphans=256, max_fork_depth=100,
+                 confirmed_window=1000):
         """
         Initialize the blockchain with its attributes.
+
+        Args:
+            mining_workers (int): Number of processes used to search for a proof of work.
+            mining_batch_size (int): Number of nonces handed to a mining process at a time.
+            max_block_transactions (int): Maximum number of mempool transactions included in a mined block.
+            mempool_max_count (int): Maximum number of unconfirmed transactions held.
+            mempool_max_bytes (int): Maximum approximate size of the unconfirmed transactions held.
+            verify_workers (int): Number of processes used to verify transaction signatures in batches.
+            verifier (SignatureVerifier): Verifier to share with another chain, overrides verify_workers.
+            broadcaster (Broadcaster): Broadcaster used to announce blocks and transactions to peers.
+            validate_workers (int): Number of processes hashing blocks when validating chains.
+            validator (ChainValidator): Validator to share with another chain, overrides validate_workers.
+            max_orphans (int): Number of blocks with an unknown parent buffered until the parent arrives.
+            max_fork_depth (int): Depth below the tip after which competing branches are forgotten.
+            confirmed_window (int): Number of recent blocks whose transaction ids are remembered,
+                so their transactions cannot be confirmed again.
         """
         self.zeros_difficulty = 4  # Number of leading zeros required for proof of work
-        self.unconfirmed_transactions = []  # List to store unconfirmed transactions
+        # Ids of the signed transactions of the recent blocks, see _append_block
+        self.confirmed = ConfirmedTransactions(max(confirmed_window, max_fork_depth))
+        # Unconfirmed transactions by id
+        self.mempool = Mempool(mempool_max_count, mempool_max_bytes, confirmed=self.confirmed)
+        self.max_block_transactions = max_block_transactions
+        self.verifier = verifier if verifier is not None else SignatureVerifier(verify_workers)
+        self.broadcaster = broadcaster if broadcaster is not None else Broadcaster()
+        self.transport = requests  # Used for requests to peers, anything with the get/post interface of requests
+        self.validator = validator if validator is not None else ChainValidator(self.verifier, validate_workers)
         self.chain = []  # List to store blocks in the blockchain
+        self._heights = {}  # Block hash -> index, for chains kept in memory, see _keeps_heights
+        self.block_tree = BlockTree(max_orphans, max_fork_depth)  # Side branches and orphans
+        # How announced compact blocks were reconstructed
+        self.relay_stats = {'compact_blocks': 0, 'transactions_from_mempool': 0, 'transactions_fetched': 0,
+                            'full_blocks_fetched': 0}
+        self.ledger = Ledger()  # Balances and miner statistics, updated block by block
+        self.snapshot_height = 0  # Blocks up to this height are header-only, see import_snapshot
+        self.block_store = None  # Persistent store, see attach_block_store
+        self.lock = threading.RLock()  # Guards changes to the chain and the state derived from it
         self.mining_reward = 3.125  # Define a fixed mining reward
+        self.mining_engine = MiningEngine(mining_workers, mining_batch_size)  # Pool is started on first mine
         self.genesis_block()  # Create the genesis block
 
     def genesis_block(self):
@@ -58,6 +407,111 @@ class Blockchain:
         """
         g_block = Block(0, str(0), [], 0, 'genesis_miner', 0)
         self.chain.append(g_block)
+        self._heights[g_block.hash] = 0
+        self.ledger.apply_block(g_block)
+        self.mining_engine.set_tip(g_block.hash)
+
+    def attach_block_store(self, block_store):
+        """
+        Keep the chain in a persistent block store instead of memory.
+
+        A store that already holds blocks replaces the current chain, e.g. when
+        a node restarts. An empty store is filled with the current chain.
+
+        Args:
+            block_store (BlockStore): Store holding the chain.
+        """
+        stored_chain = StoredChain(block_store, Block.from_dict)
+        if not stored_chain:
+            stored_chain.extend(self.chain)
+            block_store.flush()
+        self.chain = stored_chain
+        self._heights = {}  # The store indexes the hashes itself
+        self.block_store = block_store
+        self.snapshot_height = self._pruned_height()
+        # Reuse the ledger saved at shutdown unless the chain moved on without it
+        ledger = Ledger.load(os.path.join(block_store.directory, LEDGER_FILE), self.last_block.hash)
+        if ledger is None:
+            ledger = self._rebuild_ledger()
+        self.ledger = ledger
+        self.mining_engine.set_tip(self.last_block.hash)
+        window = self.confirmed.window
+        confirmed = ConfirmedTransactions.load(os.path.join(block_store.directory, CONFIRMED_FILE),
+                                               self.last_block.hash, window)
+        if confirmed is None:
+            confirmed = ConfirmedTransactions(window)
+            confirmed.rebuild(self.chain[max(self.snapshot_height + 1, len(self.chain) - window):])
+        self.confirmed = self.mempool.confirmed = confirmed
+
+    def _pruned_height(self):
+        """
+        Find the last header-only block of the chain, they form a prefix after genesis.
+
+        Returns:
+            int: Its index, 0 if the chain holds every block.
+        """
+        low, high = 0, len(self.chain) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if isinstance(self.chain[middle], PrunedBlock):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def _rebuild_ledger(self):
+        """
+        Recompute the ledger from the chain, starting from the imported snapshot's ledger if there is one.
+
+        Returns:
+            Ledger: Ledger at the chain tip.
+        """
+        if not self.snapshot_height:
+            ledger = Ledger()
+            ledger.rebuild(self.chain)
+            return ledger
+        path = os.path.join(self.block_store.directory, SNAPSHOT_LEDGER_FILE)
+        ledger = Ledger.load(path, self.chain[self.snapshot_height].hash)
+        if ledger is None:
+            raise ValueError(f"{path} is missing or does not match the snapshot the chain was imported from")
+        for block in self.chain[self.snapshot_height + 1:]:
+            ledger.apply_block(block)
+        return ledger
+
+    def close(self):
+        """
+        Save the ledger and close the block store, if the chain is persistent.
+        """
+        with self.lock:
+            if self.block_store is not None:
+                self.ledger.save(os.path.join(self.block_store.directory, LEDGER_FILE), self.last_block.hash)
+                self.confirmed.save(os.path.join(self.block_store.directory, CONFIRMED_FILE), self.last_block.hash)
+                self.block_store.close()
+                self.block_store = None
+
+    def iter_block_json(self, start, stop):
+        """
+        Serialize the blocks with indices in [start, stop) one at a time as compact JSON.
+
+        Blocks of a persistent chain are read as stored, without decoding them.
+
+        Args:
+            start (int): First index to serialize.
+            stop (int): Index after the last one to serialize.
+
+        Yields:
+            bytes: JSON encoded block.
+        """
+        raw = getattr(self.chain, 'raw', None)
+        for height in range(start, stop):
+            try:
+                if raw is not None:
+                    yield raw(height)
+                else:
+                    yield json.dumps(self.chain[height].to_dict(), separators=(',', ':')).encode()
+            except IndexError:
+                # The chain was reorganized to a shorter one while streaming
+                return
 
     @property 
     def last_block(self):
@@ -72,6 +526,73 @@ class Blockchain:
         else:
             return False
     
+    def _keeps_heights(self):
+        """
+        Check whether block hashes are indexed in _heights, persistent chains index them themselves.
+        """
+        return not hasattr(self.chain, 'index_of_hash')
+
+    def height_of(self, block_hash):
+        """
+        Get the index of a main chain block from its hash.
+
+        Args:
+            block_hash (str): Hexadecimal hash of the block.
+
+        Returns:
+            int or None: Index of the block, None if it is not in the main chain.
+        """
+        index_of_hash = getattr(self.chain, 'index_of_hash', None)
+        if index_of_hash is not None:
+            return index_of_hash(block_hash)
+        return self._heights.get(block_hash)
+
+    def get_block(self, block_hash):
+        """
+        Get a block of the main chain or of a side branch from its hash.
+
+        Args:
+            block_hash (str): Hexadecimal hash of the block.
+
+        Returns:
+            Block or None: The block, None if it is unknown.
+        """
+        height = self.height_of(block_hash)
+        if height is not None:
+            return self.chain[height]
+        entry = self.block_tree.get_side_block(block_hash)
+        return entry[0] if entry is not None else None
+
+    def block_work(self, block):
+        """
+        Get the expected number of hashes needed to find a block.
+
+        Args:
+            block (Block): Block meeting the proof of work requirement.
+
+        Returns:
+            int: Work of the block, 0 for the genesis block.
+        """
+        return 16 ** self.zeros_difficulty if block.index > 0 else 0
+
+    def work_at(self, height):
+        """
+        Get the cumulative work of the main chain up to a height.
+
+        The difficulty is fixed, so every block after genesis adds the same work.
+
+        Args:
+            height (int): Index of a main chain block.
+
+        Returns:
+            int: Sum of the work of the blocks up to the height.
+        """
+        return height * 16 ** self.zeros_difficulty
+
+    @property
+    def chain_work(self):
+        return self.work_at(len(self.chain) - 1)
+
     def add_block(self, block):
         """
         Add a block to the blockchain if it is valid.
@@ -80,59 +601,322 @@ class Blockchain:
             block (Block): Block to be added to the blockchain.
 
         Returns:
-            bool: True if the block was added successfully, False otherwise.
+            bool: True if the block is now part of the main chain, False otherwise.
         """
-        if self.last_block and self.last_block.hash == block.prev_hash:
-            if self.is_valid_proof(block):
-                self.chain.append(block)
-                return True
-        return False
+        return self.process_block(block) in ('extended', 'reorganized')
+
+    def process_block(self, block):
+        """
+        Add a block to the main chain, a side branch or the orphan pool.
+
+        A block extending the tip is appended. A block extending another known
+        block starts or grows a side branch, which becomes the main chain if it
+        has more cumulative work; only the blocks after the fork point are
+        undone and applied. A block whose parent is unknown waits in the orphan
+        pool and is connected, with its descendants, when the parent arrives.
+
+        Args:
+            block (Block): Block received from a peer or mined locally.
+
+        Returns:
+            str: 'extended', 'reorganized', 'side_branch', 'orphan', 'duplicate' or 'invalid'.
+        """
+        started = time.perf_counter()
+        status = self._process_block(block)
+        BLOCK_PROCESS_SECONDS.labels(status).observe(time.perf_counter() - started)
+        return status
+
+    def _process_block(self, block):
+        with self.lock:
+            block_hash = block.hash
+            if self.height_of(block_hash) is not None or block_hash in self.block_tree:
+                return 'duplicate'
+            if not self.is_valid_proof(block):
+                return 'invalid'
+            if self.height_of(block.prev_hash) is None and self.block_tree.get_side_block(block.prev_hash) is None:
+                self.block_tree.add_orphan(block)
+                return 'orphan'
+
+            status = self._connect_block(block)
+            if status != 'invalid':
+                # Connect the orphans waiting for this block, and theirs in turn
+                pending = self.block_tree.pop_orphans(block_hash)
+                while pending:
+                    orphan = pending.pop()
+                    orphan_status = self._connect_block(orphan)
+                    if orphan_status == 'invalid':
+                        continue
+                    if orphan_status == 'reorganized' or status not in ('extended', 'reorganized'):
+                        status = orphan_status
+                    pending.extend(self.block_tree.pop_orphans(orphan.hash))
+            return status
+
+    def add_compact_block(self, compact_block, peer):
+        """
+        Rebuild an announced compact block from the mempool and add it like process_block.
+
+        Only the transactions missing from the mempool are downloaded from the
+        announcing peer. If the rebuilt block does not match the announced hash,
+        e.g. because of a short id collision, the full block is downloaded.
+
+        Args:
+            compact_block (dict): Compact block, see compact_block.make_compact_block.
+            peer (str): URL of the announcing peer.
+
+        Returns:
+            str: Status returned by process_block, 'invalid' for a malformed compact block,
+            or 'incomplete' if the block could not be rebuilt.
+        """
+        if not is_well_formed(compact_block):
+            return 'invalid'
+        header = compact_block['header']
+        block_hash = header['hash']
+        with self.lock:
+            if self.height_of(block_hash) is not None or block_hash in self.block_tree:
+                return 'duplicate'
+        # Reject bad proofs of work before spending any effort on the transactions
+        if Block.hash_header(header) != block_hash or not block_hash.startswith('0' * self.zeros_difficulty):
+            return 'invalid'
+
+        transactions, missing = reconstruct_transactions(compact_block, self.mempool)
+        try:
+            if missing:
+                for position, transaction in zip(missing, fetch_block_transactions(peer, block_hash, missing, transport=self.transport)):
+                    transactions[position] = transaction
+            block = Block(header['index'], header['block_timestamp'], transactions, header['prev_hash'],
+                          header['miner'], header['nonce'])
+            if block.hash != block_hash:
+                block = Block.from_dict(fetch_block(peer, block_hash, transport=self.transport))
+                self.relay_stats['full_blocks_fetched'] += 1
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            log.warning("Error rebuilding compact block %s from peer %s: %s", block_hash, peer, e)
+            return 'incomplete'
+        self.relay_stats['compact_blocks'] += 1
+        self.relay_stats['transactions_from_mempool'] += len(compact_block['short_ids']) - len(missing)
+        self.relay_stats['transactions_fetched'] += len(missing)
+        return self.process_block(block)
+
+    def _connect_block(self, block):
+        """
+        Validate a block whose parent is known and add it to the main chain or a side branch.
+
+        Returns:
+            str: 'extended', 'reorganized', 'side_branch' or 'invalid'.
+        """
+        parent_height = self.height_of(block.prev_hash)
+        if parent_height is not None:
+            parent_index, parent_work = parent_height, self.work_at(parent_height)
+        else:
+            parent, parent_work = self.block_tree.get_side_block(block.prev_hash)
+            parent_index = parent.index
+        # A branch forking this deep is never switched to, see BlockTree.prune
+        if parent_index + 1 < len(self.chain) - 1 - self.block_tree.max_fork_depth or parent_index < self.snapshot_height:
+            return 'invalid'
+        if block.index != parent_index + 1 or not self.is_valid_block_transactions(block):
+            return 'invalid'
+        if parent_height is not None and self._reconfirmed([block], parent_height) is not None:
+            return 'invalid'
+        if parent_height == len(self.chain) - 1:
+            self._append_block(block)
+            self.block_tree.prune(block.index)
+            return 'extended'
+        work = parent_work + self.block_work(block)
+        self.block_tree.add_side_block(block, work)
+        if work > self.chain_work and self._reorganize(block.hash):
+            return 'reorganized'
+        # The branch is dropped from its first block confirming a transaction again
+        return 'side_branch' if block.hash in self.block_tree else 'invalid'
+
+    def _reconfirmed(self, blocks, fork_index):
+        """
+        Find the first block that would confirm a transaction twice if it followed the block at fork_index.
+
+        Only the transactions of the blocks covered by the confirmed index are
+        checked, not the ones below an imported snapshot or older ones.
+
+        Args:
+            blocks (list): Blocks following the block at fork_index, in chain order.
+            fork_index (int): Index of the main chain block they extend.
+
+        Returns:
+            int or None: Position of that block in blocks, None if every transaction is new.
+        """
+        disconnected = self.confirmed.ids_above(fork_index)
+        seen = set()
+        for position, block in enumerate(blocks):
+            for transaction in block.transactions[1:]:
+                key = transaction_key(transaction)
+                if key in seen or (key in self.confirmed and key not in disconnected):
+                    return position
+                seen.add(key)
+        return None
+
+    def _reorganize(self, tip_hash):
+        """
+        Switch the main chain to the side branch ending with tip_hash.
+
+        The blocks after the fork point become a side branch themselves, so a
+        later block can switch back to them.
+
+        Returns:
+            bool: True if the chain was switched, False if the branch is incomplete or invalid.
+        """
+        fork_index, branch = self.block_tree.branch(tip_hash, self.height_of)
+        if fork_index is None or fork_index < self.snapshot_height:
+            return False
+        reconfirmed = self._reconfirmed(branch, fork_index)
+        if reconfirmed is not None:
+            for block in branch[reconfirmed:]:
+                self.block_tree.remove_side_block(block.hash)
+            log.info("Dropped side branch block %s confirming a transaction again", branch[reconfirmed].hash)
+            return False
+        self._switch_branch(fork_index, branch)
+        return True
+
+    def _switch_branch(self, fork_index, blocks):
+        """
+        Replace the blocks after fork_index with validated blocks extending it.
+
+        The replaced blocks become a side branch, so a later block can switch
+        back to them, and their transactions not confirmed by the new blocks
+        return to the mempool. Used by block-by-block reorganizations and by
+        suffixes synced from peers alike.
+
+        Args:
+            fork_index (int): Index of the common ancestor.
+            blocks (list): Validated blocks following the ancestor, in chain order.
+        """
+        for block in blocks:
+            self.block_tree.remove_side_block(block.hash)
+        disconnected = self._truncate(fork_index + 1)
+        for height, block in enumerate(disconnected, start=fork_index + 1):
+            self.block_tree.add_side_block(block, self.work_at(height))
+        for block in blocks:
+            self._append_block(block)
+        self._restore_transactions(disconnected, blocks)
+        self.mining_engine.cancel()
+        self.block_tree.prune(self.last_block.index)
+        if disconnected:
+            REORGANIZATIONS.inc()
+            log.info("Reorganized to %s at height %d, %d block(s) replaced from height %d",
+                     self.last_block.hash, self.last_block.index, len(disconnected), fork_index + 1)
+
+    def _truncate(self, height):
+        """
+        Remove the blocks from the given height on and undo their effect on the ledger.
+
+        Returns:
+            list: The removed blocks, in chain order.
+        """
+        removed = self.chain[height:]
+        keeps_heights = self._keeps_heights()
+        for block in reversed(removed):
+            self.ledger.undo_block(block)
+            if keeps_heights:
+                self._heights.pop(block.hash, None)
+            self.confirmed.undo_block(block)
+        del self.chain[height:]
+        return removed
+
+    def _restore_transactions(self, disconnected, connected):
+        """
+        Return the signed transactions of disconnected blocks to the mempool unless the new blocks confirm them.
+        """
+        confirmed = {transaction_key(transaction) for block in connected for transaction in block.transactions}
+        for block in disconnected:
+            for transaction in block.transactions:
+                if 'message' in transaction and transaction_key(transaction) not in confirmed:
+                    self.mempool.add(transaction)
+
+    def _append_block(self, block):
+        """
+        Append a validated block and update the state derived from the chain.
+        """
+        # Update the ledger first, the chain must not hold a block the ledger lacks
+        self.ledger.apply_block(block)
+        try:
+            self.chain.append(block)
+        except Exception:
+            self.ledger.undo_block(block)
+            raise
+        if self._keeps_heights():
+            self._heights[block.hash] = block.index
+        self.confirmed.apply_block(block)
+        self.mempool.remove_transactions(block.transactions)
+        # The tip moved, stop mining a block on the previous one
+        self.mining_engine.set_tip(block.hash)
+        # Confirmed blocks are rarely read again, keep them packed
+        block.compact()
+
+    def create_block_template(self, miner):
+        """
+        Build a block on the current tip with a coinbase transaction and the highest-fee valid transactions.
+
+        Args:
+            miner (str): The identifier of the miner.
+
+        Returns:
+            Block or False: Block with nonce 0, False if there are no unconfirmed transactions.
+        """
+        with self.lock:
+            if not len(self.mempool):
+                return False
+
+            selected_transactions = []
+            candidates = self.mempool.select(self.max_block_transactions)
+            for transaction, valid in zip(candidates, self.verifier.verify_many(candidates)):
+                if valid:
+                    selected_transactions.append(transaction)
+                else:
+                    self.mempool.remove_transactions([transaction])
+
+            # Add a coinbase transaction to reward the miner
+            coinbase_transaction = {
+                'transaction_id': str(uuid.uuid4()),
+                'transaction_timestamp': str(datetime.now()),
+                'from_addr': None,
+                'to_addr': miner,
+                'amount': self.mining_reward,
+                'fee': 0
+            }
+            coinbase_transaction_signature = self.generate_signature(private_key, coinbase_transaction).hex()
+            coinbase_transaction['signature'] = coinbase_transaction_signature
+
+            # Include the coinbase transaction at the beginning of the list of transactions
+            transactions_to_include = [coinbase_transaction] + selected_transactions
+
+            return Block(index=self.last_block.index + 1, block_timestamp=str(datetime.now()),
+                         transactions=transactions_to_include, prev_hash=self.last_block.hash, miner=miner)
 
     def mine(self, miner):
         """
-        Mine a new block by adding all unconfirmed transactions and finding a valid proof of work.
+        Mine a new block with the highest-fee unconfirmed transactions and find a valid proof of work.
+
+        The chain is not locked during the proof of work search, so blocks from
+        peers can be added meanwhile and interrupt it.
 
         Args:
             miner (str): The identifier of the miner.
 
         Returns:
-            Block or False: The mined block if successful, False if there are no unconfirmed transactions.
+            Block or False: The mined block if successful, False if there are no unconfirmed transactions
+            or mining was cancelled because a block for the same height was accepted.
         """
-        if not self.unconfirmed_transactions:
+        new_block = self.create_block_template(miner)
+        if not new_block:
             return False
-        
-        
-        
-        for transaction in self.unconfirmed_transactions:
-            if not self.is_valid_transaction(transaction): 
-                self.unconfirmed_transactions.remove(transaction)
-        
-        # Add a coinbase transaction to reward the miner
-        coinbase_transaction = {
-            'transaction_id': str(uuid.uuid4()),
-            'transaction_timestamp': str(datetime.now()),
-            'from_addr': None,
-            'to_addr': miner,
-            'amount': self.mining_reward,
-            'fee': 0
-        }
-        coinbase_transaction_signature = self.generate_signature(private_key, coinbase_transaction).hex()
-        coinbase_transaction['signature'] = coinbase_transaction_signature
-        
-        # Include the coinbase transaction at the beginning of the list of transactions
-        transactions_to_include = [coinbase_transaction] + self.unconfirmed_transactions[:]
-
-        new_block = Block(index=self.last_block.index + 1, block_timestamp=str(datetime.now()),
-                          transactions=transactions_to_include, prev_hash=self.last_block.hash, miner=miner)
-
-        hash_val = new_block.hash
-        print("started mining", hash_val)
-        while not hash_val.startswith('0' * self.zeros_difficulty):
-            new_block.nonce += 1
-            hash_val = new_block.hash
-        
-        print("finished mining", new_block.nonce, hash_val)
-        self.unconfirmed_transactions = []
+
+        log.debug("Started mining block %d", new_block.index)
+        nonce, hash_val = self.mining_engine.mine(new_block.hash_prefix(), self.zeros_difficulty, height=new_block.index,
+                                                  tip=new_block.prev_hash)
+        if nonce is None:
+            log.info("Mining of block %d cancelled", new_block.index)
+            return False
+        new_block.nonce = nonce
+
+        log.info("Mined block %d with nonce %d: %s at %.0f H/s", new_block.index, new_block.nonce, hash_val,
+                 self.mining_engine.hash_rate)
+        self.mempool.remove_transactions(new_block.transactions[1:])
         return new_block
     
         # else:
@@ -163,21 +947,26 @@ class Blockchain:
         Returns:
             bool: True if the block hash meets the proof of work requirement, False otherwise.
         """
-        return block.hash.startswith('0' * self.zeros_difficulty)
+        return is_valid_nonce(block.nonce) and block.hash.startswith('0' * self.zeros_difficulty)
 
     def is_valid_chain(self):
         """
         Validate the entire blockchain except for the genesis block.
 
+        Proof of work, linkage and transaction signatures are checked. Only the
+        linkage is checked up to the validator's checkpoint, if the chain contains it.
+
         Returns:
             bool: True if the blockchain is valid, False otherwise.
         """
-        for i in range(1, len(self.chain)):
-            if not self.is_valid_proof(self.chain[i]):
-                return False
-            if self.chain[i].prev_hash != self.chain[i - 1].hash:
-                return False
-        return True
+        blocks = self.chain[1:]
+        if self.validator.validate_chain(self.chain[0].hash, blocks, self.zeros_difficulty) != len(blocks):
+            return False
+        # The blocks up to an imported snapshot are header-only
+        blocks = blocks[self.snapshot_height:]
+        if not all(self.is_valid_block_structure(block) for block in blocks):
+            return False
+        return self._reconfirmed(blocks, self.snapshot_height) is None
 
     def is_valid_transaction(self, transaction_dict):
         """
@@ -189,14 +978,70 @@ class Blockchain:
         Returns:
             bool: True if the transaction is valid, False otherwise.
         """
-        signature = transaction_dict['signature']
-        signature = bytes.fromhex(signature)  # Convert hex string back to bytes
-        public_key = transaction_dict['message']['from_addr']
-        public_key = VerifyingKey.from_string(bytes.fromhex(public_key), curve=SECP256k1)  # Get public key in bytes
-        msg = json.dumps(transaction_dict['message']).encode()  # Convert message back to bytes
-        if public_key.verify(signature, msg):
-            return True
-        return False
+        return self.verifier.verify(transaction_dict)
+
+    def add_transactions(self, transactions, is_known=None):
+        """
+        Verify a batch of transactions and add the valid ones to the mempool.
+
+        Signatures are checked with one verify_many call, which can use the
+        verification workers, and the mempool lock is taken once per batch.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+            is_known (callable): Takes a transaction id and returns True for transactions to skip,
+                e.g. ones already seen through gossip.
+
+        Returns:
+            tuple: Transactions added, and the number rejected for a malformed body or invalid signature.
+        """
+        valid = [transaction for transaction, ok in zip(transactions, self.verifier.verify_many(transactions)) if ok]
+        invalid = len(transactions) - len(valid)
+        if is_known is not None:
+            valid = [transaction for transaction in valid if not is_known(transaction_key(transaction))]
+        added = [transaction for transaction, ok in zip(valid, self.mempool.add_many(valid)) if ok]
+        return added, invalid
+
+    def is_valid_block_structure(self, block):
+        """
+        Check that a block holds one coinbase transaction followed by signed transactions.
+
+        The coinbase comes first and pays exactly the mining reward without a
+        fee. Signatures are not verified here.
+
+        Args:
+            block (Block): Block whose transactions are checked.
+
+        Returns:
+            bool: True if the transactions are well formed, False otherwise.
+        """
+        transactions = block.transactions
+        if not isinstance(transactions, (list, PackedTransactions)) or not transactions:
+            return False
+        if not all(isinstance(transaction, dict) for transaction in transactions):
+            return False
+        coinbase = transactions[0]
+        if 'message' in coinbase or coinbase.get('from_addr') is not None:
+            return False
+        if coinbase.get('amount') != self.mining_reward or coinbase.get('fee') != 0:
+            return False
+        return all(isinstance(transaction.get('message'), dict) for transaction in transactions[1:])
+
+    def is_valid_block_transactions(self, block):
+        """
+        Check the structure of a block and verify the signatures of its signed transactions in one batch.
+
+        The coinbase transaction carries no 'message' and is not verified.
+
+        Args:
+            block (Block): Block whose transactions are verified.
+
+        Returns:
+            bool: True if the block is well formed and every signed transaction is valid, False otherwise.
+        """
+        if not self.is_valid_block_structure(block):
+            return False
+        return all(self.verifier.verify_many(block.transactions[1:]))
 
     def create_temp_chain(self, blockchain_list):
         """
@@ -208,53 +1053,304 @@ class Blockchain:
         Returns:
             Blockchain: Temporary Blockchain object created from the list of blocks.
         """
-        temp_blockchain = Blockchain()
-        for block in blockchain_list[1:]:
-            temp_block = Block(block['index'], block['block_timestamp'], block['transactions'], block['prev_hash'], block['miner'], block['nonce'])
-            temp_blockchain.add_block(temp_block)
+        temp_blockchain = Blockchain(verifier=self.verifier, validator=self.validator)
+        temp_blockchain.zeros_difficulty = self.zeros_difficulty
+        blocks = [Block.from_dict(block) for block in blockchain_list[1:]]
+        # Like add_block, keep the blocks up to the first invalid one
+        valid = self.validator.validate_chain(temp_blockchain.last_block.hash, blocks, temp_blockchain.zeros_difficulty)
+        valid = next((position for position, block in enumerate(blocks[:valid])
+                      if not self.is_valid_block_structure(block)), valid)
+        reconfirmed = temp_blockchain._reconfirmed(blocks[:valid], 0)
+        if reconfirmed is not None:
+            valid = reconfirmed
+        for block in blocks[:valid]:
+            temp_blockchain._append_block(block)
         return temp_blockchain
 
     def consensus(self, peers):
         """
         Find the longest valid chain among all peers and switch to it if necessary.
 
+        Only the peers' tips are polled; the longest candidate is then synced
+        from the common ancestor on, so only the divergent blocks are downloaded
+        and validated.
+
         Args:
             peers (list): List of peer URLs.
 
         Returns:
             bool: True if the chain was updated, False otherwise.
         """
-        longest_chain = self.chain
+        with CONSENSUS_SECONDS.time():
+            return self._consensus(peers)
+
+    def _consensus(self, peers):
+        candidates = []
+        self_url = request.host_url if has_request_context() else None
         for peer in peers:
-            if peer != request.host_url:
-                response = requests.get(peer + 'chain')
-                chain = response.json()['blockchain']
-                temp_blockchain = self.create_temp_chain(chain)
-                if len(temp_blockchain.chain) > len(longest_chain) and temp_blockchain.is_valid_chain(): 
-                    longest_chain = temp_blockchain.chain
-        
-        if longest_chain != self.chain:
-            self.chain = longest_chain
-            return True
+            if peer != self_url:
+                try:
+                    chain_length = fetch_tip(peer, transport=self.transport)['chain_length']
+                    ahead = chain_length > len(self.chain)
+                except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+                    log.warning("Error fetching chain tip from peer %s: %s", peer, e)
+                    continue
+                if ahead:
+                    candidates.append((chain_length, peer))
+
+        for chain_length, peer in sorted(candidates, reverse=True):
+            if chain_length <= len(self.chain):
+                break
+            if sync_with_peer(self, peer):
+                return True
         return False
 
-    def announce_block(self, peers, block_obj):
+    def block_locator(self):
+        """
+        List block hashes from the tip back to genesis, dense near the tip and exponentially sparser below.
+
+        Returns:
+            list: Block hashes, newest first, always ending with the genesis hash.
+        """
+        locator = []
+        step = 1
+        i = len(self.chain) - 1
+        while i > 0:
+            locator.append(self.chain[i].hash)
+            if len(locator) >= 10:
+                step *= 2
+            i -= step
+        locator.append(self.chain[0].hash)
+        return locator
+
+    def find_fork_point(self, locator):
+        """
+        Find the highest block of this chain whose hash appears in a peer's block locator.
+
+        Args:
+            locator (list): Block hashes sent by a peer.
+
+        Returns:
+            int: Index of the common ancestor, -1 if there is none.
+        """
+        heights = [self.height_of(block_hash) for block_hash in locator]
+        return max((height for height in heights if height is not None), default=-1)
+
+    def is_valid_header_chain(self, fork_index, headers):
+        """
+        Check that headers extend the block at fork_index with consecutive, linked, proof-carrying hashes.
+
+        Each hash is recomputed from its header; validate_suffix checks the
+        Merkle roots against the transactions once the bodies are downloaded.
+
+        Args:
+            fork_index (int): Index of the common ancestor.
+            headers (list): Header dictionaries following the ancestor.
+
+        Returns:
+            bool: True if the headers form a valid extension, False otherwise.
+        """
+        prev_hash = self.chain[fork_index].hash
+        for offset, header in enumerate(headers, start=1):
+            if header['index'] != fork_index + offset or header['prev_hash'] != prev_hash:
+                return False
+            if not is_valid_nonce(header['nonce']):
+                return False
+            if Block.hash_header(header) != header['hash']:
+                return False
+            if not header['hash'].startswith('0' * self.zeros_difficulty):
+                return False
+            prev_hash = header['hash']
+        return True
+
+    def validate_suffix(self, fork_index, blockchain_list):
+        """
+        Validate blocks received from a peer that extend the block at fork_index.
+
+        Args:
+            fork_index (int): Index of the common ancestor.
+            blockchain_list (list): Block dictionaries following the ancestor.
+
+        Returns:
+            list or None: The blocks if they are valid, None otherwise.
+        """
+        blocks = [Block.from_dict(block) for block in blockchain_list]
+        valid = self.validator.validate_extension(self.chain[fork_index].hash, blocks, self.zeros_difficulty)
+        if valid != len(blocks) or not all(self.is_valid_block_structure(block) for block in blocks):
+            return None
+        return blocks
+
+    def replace_suffix(self, fork_index, fork_hash, blocks):
+        """
+        Replace the blocks after fork_index with a validated suffix if that gives the chain more work.
+
+        Args:
+            fork_index (int): Index of the common ancestor.
+            fork_hash (str): Hash of the common ancestor when the suffix was requested.
+            blocks (list): Validated blocks following the ancestor.
+
+        Returns:
+            bool: True if the chain was updated, False otherwise.
+        """
+        with self.lock:
+            if fork_index >= len(self.chain) or self.chain[fork_index].hash != fork_hash:
+                return False
+            if fork_index < self.snapshot_height:
+                # The ledger cannot be undone below an imported snapshot
+                return False
+            work = self.work_at(fork_index) + sum(self.block_work(block) for block in blocks)
+            if work <= self.chain_work or self._reconfirmed(blocks, fork_index) is not None:
+                return False
+            self._switch_branch(fork_index, blocks)
+            return True
+
+    def _snapshot_state(self, height):
+        """
+        Get the block at a height and the ledger state there, by undoing the blocks above it.
+
+        Only the blocks above the height are read under the lock, so blocks
+        keep being added while a snapshot's headers are built.
+
+        Returns:
+            tuple: Block at the height and the ledger state, or None if the height
+            is above the tip or below the chain's own snapshot.
+        """
+        with self.lock:
+            tip_height = len(self.chain) - 1
+            if height is None:
+                height = max(self.snapshot_height, tip_height - SNAPSHOT_CONFIRMATIONS)
+            if not self.snapshot_height <= height <= tip_height:
+                return None
+            ledger = Ledger.from_dict(self.ledger.to_dict())
+            for block in reversed(self.chain[height + 1:]):
+                ledger.undo_block(block)
+            return self.chain[height], ledger.to_dict()
+
+    def export_snapshot(self, height=None):
+        """
+        Export the headers up to a height and the ledger state there, for a new node to start from.
+
+        Args:
+            height (int): Index of the snapshot tip, SNAPSHOT_CONFIRMATIONS below the tip by default.
+
+        Returns:
+            dict or None: Snapshot, see snapshot.make_snapshot, None if the height is not available.
+        """
+        state = self._snapshot_state(height)
+        if state is None:
+            return None
+        tip, ledger_state = state
+        try:
+            headers = [self.chain[height].header() for height in range(tip.index + 1)]
+        except IndexError:
+            # The chain was reorganized to a shorter one meanwhile
+            return None
+        # A reorganization below the tip while reading would break the linkage
+        if headers[-1]['hash'] != tip.hash or any(header['prev_hash'] != parent['hash']
+                                                  for parent, header in zip(headers, headers[1:])):
+            return None
+        return make_snapshot(headers, ledger_state)
+
+    def snapshot_commitment(self, height=None):
+        """
+        Get the commitment of the snapshot at a height without building its headers.
+
+        Returns:
+            dict or None: 'height', 'tip_hash' and 'commitment', None if the height is not available.
+        """
+        state = self._snapshot_state(height)
+        if state is None:
+            return None
+        tip, ledger_state = state
+        return {'height': tip.index, 'tip_hash': tip.hash,
+                'commitment': snapshot_commitment(tip.index, tip.hash, ledger_state)}
+
+    def import_snapshot(self, snapshot, trusted_commitment=None):
+        """
+        Replace the chain with the header-only prefix and the ledger of a snapshot.
+
+        Only the headers (linkage and proof of work from this chain's genesis)
+        and the commitment are verified, the blocks below the snapshot are
+        neither downloaded nor replayed. Blocks after it are synced as usual.
+
+        Args:
+            snapshot (dict): Snapshot, see snapshot.make_snapshot.
+            trusted_commitment (str): Commitment the snapshot must match, obtained out of band.
+
+        Returns:
+            bool: True if the snapshot was imported, False if it is invalid or not ahead of the chain.
+        """
+        try:
+            headers, height, ledger_state = snapshot['headers'], snapshot['height'], snapshot['ledger']
+            if snapshot['version'] != SNAPSHOT_VERSION or len(headers) != height + 1 or ledger_state['height'] != height:
+                return False
+            if snapshot_commitment(height, headers[-1]['hash'], ledger_state) != snapshot['commitment']:
+                return False
+            if trusted_commitment is not None and snapshot['commitment'] != trusted_commitment:
+                return False
+            if Block.hash_header(headers[0]) != self.chain[0].hash or not self.is_valid_header_chain(0, headers[1:]):
+                return False
+            blocks = [PrunedBlock.from_header(header) for header in headers[1:]]
+            ledger = Ledger.from_dict(ledger_state)
+        except (KeyError, TypeError, ValueError, IndexError, ArithmeticError):
+            return False
+
+        with self.lock:
+            if height <= len(self.chain) - 1:
+                return False
+            genesis = self.chain[0]
+            del self.chain[1:]
+            keeps_heights = self._keeps_heights()
+            self._heights = {genesis.hash: 0} if keeps_heights else {}
+            # The transactions below the snapshot are not known
+            self.confirmed.clear()
+            for block in blocks:
+                self.chain.append(block)
+                if keeps_heights:
+                    self._heights[block.hash] = block.index
+            self.ledger = ledger
+            self.snapshot_height = height
+            if self.block_store is not None:
+                self.block_store.flush()
+                ledger.save(os.path.join(self.block_store.directory, SNAPSHOT_LEDGER_FILE), self.last_block.hash)
+            # The headers were checked, later validations of the chain start after them
+            self.validator.checkpoint = (height, self.last_block.hash)
+            self.block_tree.prune(height)
+            self.mining_engine.set_tip(self.last_block.hash)
+            self.mining_engine.cancel()
+            return True
+
+    def announce_block(self, peers, block_obj, origin=None):
         """
         Announce a mined block to other peers in the network.
 
+        All peers are contacted concurrently, so the announcement takes as long
+        as the slowest peer rather than the sum of all round-trips. When origin
+        is given, only the header and short transaction ids are sent and peers
+        fetch the transactions they miss from origin.
+
         Args:
             peers (list): List of peer URLs.
             block_obj (Block): Mined block to be announced.
+            origin (str): URL of this node, enables compact block announcements.
+
+        Returns:
+            dict: Peer URL -> response status code, None for unreachable peers.
         """
-        for peer in peers:
-            try:
-                response = requests.post(peer + 'add_block', json=block_obj.__dict__)
-                if response.status_code == 201:
-                    print(f"Block successfully announced to {peer}")
-                else:
-                    print(f"Failed to announce block to {peer}")
-            except requests.exceptions.RequestException as e:
-                print(f"Error announcing block to peer {peer}: {e}")
+        if origin is not None:
+            payload = make_compact_block(block_obj)
+            payload['peer'] = origin
+            results = self.broadcaster.broadcast([peer for peer in peers if peer != origin], 'add_compact_block', payload)
+        else:
+            results = self.broadcaster.broadcast(peers, 'add_block', block_obj.to_dict())
+        for peer, status_code in results.items():
+            if status_code == 201:
+                log.debug("Block successfully announced to %s", peer)
+            elif status_code is None:
+                log.warning("Error announcing block to peer %s: %s", peer, self.broadcaster.peer_stats[peer].last_error)
+            else:
+                log.info("Failed to announce block to %s", peer)
+        return results
 
     def generate_signature(self, readable_sk, msg):
         """
@@ -267,9 +1363,9 @@ class Blockchain:
         Returns:
             str: Hexadecimal representation of the signature.
         """
-        sk = SigningKey.from_string(bytes.fromhex(readable_sk), curve=SECP256k1)
-        msg = json.dumps(msg).encode()
-        return sk.sign(msg)
+        with SIGN_SECONDS.time():
+            msg = json.dumps(msg).encode()
+            return load_signing_key(readable_sk).sign(msg)
 
     def announce_transaction(self, peers, transaction_dict):
         """
@@ -278,7 +1374,8 @@ class Blockchain:
         Args:
             peers (list): List of peer URLs.
             transaction_dict (dict): Transaction dictionary to be announced.
-        """
-        for peer in peers:
-            response = requests.post(peer + 'add_transaction', json=transaction_dict)
 
+        Returns:
+            dict: Peer URL -> response status code, None for unreachable peers.
+        """
+        return self.broadcaster.broadcast(peers, 'add_transaction', transaction_dict)
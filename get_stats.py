@@ -1,51 +1,341 @@
-import json
+import argparse
 import csv
+import json
+import os
+import re
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from config_peers import starting_port, num_miners
+
+READ_CHUNK_SIZE = 1 << 20  # Characters read from a JSON export at a time
+WHITESPACE = re.compile(r'[\s,]*')
+_decoder = json.JSONDecoder()
+
+
+def iter_json_blocks(file_path):
+    """
+    Parse the blocks of a /chain JSON export one at a time.
+
+    Only the block being decoded and one read chunk are held in memory,
+    whatever the size of the export.
+
+    Args:
+        file_path (str): Path of a {"blockchain": [...]} document.
+
+    Yields:
+        dict: Block dictionaries in file order.
+    """
+    with open(file_path, 'r', encoding='utf-8') as file:
+        buffer = ''
+        while True:
+            match = re.search(r'"blockchain"\s*:\s*\[', buffer)
+            if match:
+                pos = match.end()
+                break
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            # Keep a tail in case the key is split across chunks
+            buffer = buffer[-32:] + chunk
+        while True:
+            pos = WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+            try:
+                block, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                chunk = file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    raise
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield block
+            pos = end
+
+
+def iter_ndjson_blocks(file_path, start=0, end=None):
+    """
+    Parse the blocks of an NDJSON export, one block per line, within a byte range.
+
+    A line belongs to the range its first byte falls in, so consecutive ranges
+    split a file between workers without losing or repeating blocks.
+
+    Args:
+        file_path (str): Path of an NDJSON export, e.g. from /chain?format=ndjson.
+        start (int): First byte of the range.
+        end (int): Byte after the range, the end of the file if None.
+
+    Yields:
+        dict: Block dictionaries in file order.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        offset = start
+        if start > 0:
+            # Skip the line started in the previous range
+            file.seek(start - 1)
+            offset = start - 1 + len(file.readline())
+        for line in file:
+            if end is not None and offset >= end:
+                break
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_timestamp(value):
+    """
+    Convert a block or transaction timestamp to seconds since the epoch.
+
+    Returns:
+        float: Timestamp, NaN for the genesis block or malformed values.
+    """
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return float('nan')
+
+
+def to_float(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
 
-# Function to calculate rewards and count blocks for each miner
 def calculate_rewards_and_blocks(blockchain_data):
+    """
+    Collect per-block columns and per-miner rewards, fees and block counts.
+
+    Rewards are the coinbase amounts actually paid and fees the sum of the
+    fees of the transactions a miner included.
+
+    Args:
+        blockchain_data (iterable or dict): Block dictionaries, or a /chain document.
+
+    Returns:
+        dict: NumPy columns ('index', 'timestamp', 'nonce', 'transactions',
+        'miner') plus the 'miners' table the miner codes refer to and the
+        per-miner 'rewards', 'fees' and 'blocks_added' arrays.
+    """
+    if isinstance(blockchain_data, dict):
+        blockchain_data = blockchain_data['blockchain']
+    miner_codes = {}
+    columns = defaultdict(list)
     rewards = defaultdict(float)
+    fees = defaultdict(float)
     blocks_added = defaultdict(int)
-    
-    # Initialize rewards and blocks added for all miners in the range 5000-5049
-    for miner_id in range(5000, 5050):
-        rewards[str(miner_id)] = 0.0
-        blocks_added[str(miner_id)] = 0
-    
-    for block in blockchain_data["blockchain"]:
-        miner = str(block["miner"])  # Ensure miner ID is treated as string for consistency
-        
-        # Calculate block reward (assuming fixed 3.125 for each block)
-        reward = 3.125
-        
-        # Accumulate rewards and count blocks for the miner
-        rewards[miner] += reward
-        blocks_added[miner] += 1
-    
-    return rewards, blocks_added
-
-# Read JSON data from file
-file_path = 'sample_chain.json'  # Adjust path as necessary
-with open(file_path, 'r') as file:
-    blockchain_data = json.load(file)
-
-# Calculate rewards and count blocks for each miner
-miner_rewards, miner_blocks_added = calculate_rewards_and_blocks(blockchain_data)
-
-# Write to CSV file
-csv_file = 'miner_rewards_blocks.csv'
-fieldnames = ["Miner ID", "Reward", "Blocks Added"]
-
-with open(csv_file, 'w', newline='') as csvfile:
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-    writer.writeheader()
-    
-    for miner_id in range(5000, 5050):
-        miner_str = str(miner_id)
-        writer.writerow({
-            "Miner ID": miner_str,
-            "Reward": miner_rewards[miner_str],
-            "Blocks Added": miner_blocks_added[miner_str]
-        })
-
-print(f"CSV file '{csv_file}' has been successfully created with miner rewards and blocks added.")
+
+    for block in blockchain_data:
+        miner = str(block['miner'])  # Ensure miner ID is treated as string for consistency
+        code = miner_codes.setdefault(miner, len(miner_codes))
+        transactions = block['transactions']
+        for transaction in transactions:
+            if 'message' in transaction:
+                fees[code] += to_float(transaction['message'].get('fee'))
+            else:
+                rewards[code] += to_float(transaction.get('amount'))
+        if block['index'] > 0:
+            blocks_added[code] += 1
+        columns['index'].append(block['index'])
+        columns['timestamp'].append(parse_timestamp(block['block_timestamp']))
+        columns['nonce'].append(block['nonce'])
+        columns['transactions'].append(len(transactions))
+        columns['miner'].append(code)
+
+    miners = list(miner_codes)
+    return {
+        'index': np.array(columns['index'], dtype=np.int64),
+        'timestamp': np.array(columns['timestamp'], dtype=np.float64),
+        'nonce': np.array(columns['nonce'], dtype=np.int64),
+        'transactions': np.array(columns['transactions'], dtype=np.int32),
+        'miner': np.array(columns['miner'], dtype=np.int32),
+        'miners': miners,
+        'rewards': np.array([rewards[code] for code in range(len(miners))], dtype=np.float64),
+        'fees': np.array([fees[code] for code in range(len(miners))], dtype=np.float64),
+        'blocks_added': np.array([blocks_added[code] for code in range(len(miners))], dtype=np.int64),
+    }
+
+
+def analyze_shard(file_path, start=0, end=None):
+    """
+    Analyze one export, or one byte range of an NDJSON export, in a worker process.
+    """
+    if is_ndjson(file_path):
+        blocks = iter_ndjson_blocks(file_path, start, end)
+    else:
+        blocks = iter_json_blocks(file_path)
+    return calculate_rewards_and_blocks(blocks)
+
+
+def is_ndjson(file_path):
+    return file_path.endswith(('.ndjson', '.jsonl'))
+
+
+def plan_shards(file_paths, workers, min_shard_size=64 << 20):
+    """
+    Split the exports into tasks: NDJSON files in byte ranges, JSON documents whole.
+
+    Returns:
+        list: (file path, start, end) tuples.
+    """
+    shards = []
+    for file_path in file_paths:
+        size = os.path.getsize(file_path)
+        if not is_ndjson(file_path) or size < 2 * min_shard_size:
+            shards.append((file_path, 0, None))
+            continue
+        parts = max(1, min(workers, size // min_shard_size))
+        bounds = [size * part // parts for part in range(parts + 1)]
+        shards.extend((file_path, bounds[part], bounds[part + 1]) for part in range(parts))
+    return shards
+
+
+def merge_results(results):
+    """
+    Concatenate the columns of several shards, remapping their miner codes to one table.
+
+    Returns:
+        dict: Same layout as calculate_rewards_and_blocks.
+    """
+    miner_codes = {}
+    for result in results:
+        for miner in result['miners']:
+            miner_codes.setdefault(miner, len(miner_codes))
+    miners = list(miner_codes)
+    merged = {name: [] for name in ('index', 'timestamp', 'nonce', 'transactions', 'miner')}
+    rewards = np.zeros(len(miners))
+    fees = np.zeros(len(miners))
+    blocks_added = np.zeros(len(miners), dtype=np.int64)
+    for result in results:
+        remap = np.array([miner_codes[miner] for miner in result['miners']], dtype=np.int32)
+        for name in ('index', 'timestamp', 'nonce', 'transactions'):
+            merged[name].append(result[name])
+        merged['miner'].append(remap[result['miner']] if len(remap) else result['miner'])
+        np.add.at(rewards, remap, result['rewards'])
+        np.add.at(fees, remap, result['fees'])
+        np.add.at(blocks_added, remap, result['blocks_added'])
+    merged = {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in merged.items()}
+    # Shards may arrive in any order, analyses expect chain order
+    order = np.argsort(merged['index'], kind='stable')
+    merged = {name: array[order] for name, array in merged.items()}
+    merged.update(miners=miners, rewards=rewards, fees=fees, blocks_added=blocks_added)
+    return merged
+
+
+def distribution(values):
+    """
+    Summarize an array with its mean and percentiles.
+
+    Returns:
+        dict: count, mean, min, p50, p90, p99 and max, None if values is empty.
+    """
+    values = values[~np.isnan(values)] if values.dtype.kind == 'f' else values
+    if not len(values):
+        return None
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {'count': int(len(values)), 'mean': float(values.mean()), 'min': float(values.min()),
+            'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(values.max())}
+
+
+def summarize(stats, bucket_seconds=60):
+    """
+    Compute chain-wide statistics from merged columns.
+
+    Returns:
+        dict: Block interval and hash attempt distributions and transaction throughput over time.
+    """
+    mined = stats['index'] > 0  # Skip the genesis block
+    timestamps = stats['timestamp'][mined]
+    transactions = stats['transactions'][mined]
+    summary = {
+        'blocks': int(mined.sum()),
+        'transactions': int(transactions.sum()),
+        'block_interval_seconds': distribution(np.diff(timestamps)),
+        # Mining starts at nonce 0, so a block took nonce + 1 hash attempts
+        'hash_attempts': distribution(stats['nonce'][mined] + 1),
+        'transactions_per_block': distribution(transactions),
+        'throughput': [],
+    }
+    valid = ~np.isnan(timestamps)
+    if valid.any():
+        first = timestamps[valid].min()
+        buckets = ((timestamps[valid] - first) // bucket_seconds).astype(np.int64)
+        counts = np.bincount(buckets, weights=transactions[valid])
+        summary['throughput'] = [
+            {'bucket_start': datetime.fromtimestamp(first + bucket * bucket_seconds).isoformat(),
+             'transactions': int(count), 'transactions_per_second': float(count / bucket_seconds)}
+            for bucket, count in enumerate(counts)
+        ]
+    return summary
+
+
+def analyze(file_paths, workers=None):
+    """
+    Analyze chain exports, spreading the shards across worker processes.
+
+    Args:
+        file_paths (list): JSON or NDJSON exports.
+        workers (int): Number of worker processes, one per CPU if None.
+
+    Returns:
+        dict: Merged columns and per-miner totals.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(file_paths, workers)
+    if workers == 1 or len(shards) == 1:
+        results = [analyze_shard(*shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(analyze_shard, *zip(*shards)))
+    return merge_results(results)
+
+
+def write_miner_csv(stats, csv_file):
+    """
+    Write the rewards, fees and blocks added of every miner to a CSV file.
+
+    Miners of the configured peer range are listed even if they mined nothing.
+    """
+    totals = {miner: (stats['rewards'][code], stats['fees'][code], stats['blocks_added'][code])
+              for code, miner in enumerate(stats['miners'])}
+    miners = [str(port) for port in range(starting_port, starting_port + num_miners)]
+    miners += sorted(miner for miner in totals if miner not in miners and totals[miner][2])
+    fieldnames = ["Miner ID", "Reward", "Fees", "Blocks Added"]
+
+    with open(csv_file, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer.writeheader()
+        for miner in miners:
+            reward, fee, blocks = totals.get(miner, (0.0, 0.0, 0))
+            writer.writerow({"Miner ID": miner, "Reward": float(reward), "Fees": float(fee), "Blocks Added": int(blocks)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute miner rewards and chain statistics from chain exports")
+    parser.add_argument('exports', nargs='*', default=['sample_chain.json'],
+                        help="/chain JSON documents or NDJSON (.ndjson/.jsonl) exports")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, one per CPU by default")
+    parser.add_argument('--csv', default='miner_rewards_blocks.csv', help="per-miner CSV output")
+    parser.add_argument('--summary', help="write the chain statistics to this JSON file instead of stdout")
+    parser.add_argument('--bucket-seconds', type=int, default=60, help="width of the throughput buckets")
+    args = parser.parse_args()
+
+    stats = analyze(args.exports, args.workers)
+    write_miner_csv(stats, args.csv)
+    summary = summarize(stats, args.bucket_seconds)
+    if args.summary:
+        with open(args.summary, 'w') as file:
+            json.dump(summary, file, indent=4)
+    else:
+        print(json.dumps(summary, indent=4))
+    print(f"CSV file '{args.csv}' has been successfully created with miner rewards and blocks added.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import random
+import threading
+
+import requests
+
+from compact_block import make_compact_block
+from mempool import transaction_key
+
+REQUEST_TIMEOUT = 10  # Seconds to wait for a peer's response
+
+log = logging.getLogger(__name__)
+
+
+class SeenCache:
+    def __init__(self, max_size=100000):
+        """
+        Initialize a bounded set of recently seen message ids, evicting the least recently seen.
+
+        Args:
+            max_size (int): Number of ids remembered.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key):
+        """
+        Mark an id as seen.
+
+        Args:
+            key (tuple): Message kind and id, e.g. ('block', block hash).
+
+        Returns:
+            bool: True if the id was not seen before, False otherwise.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return False
+            self._entries[key] = None
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        """
+        Forget an id, e.g. when fetching the message it names failed.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def load_peer_file(path):
+    """
+    Read peer URLs from a JSON list or a file with one URL per line.
+
+    Args:
+        path (str): Path of the peer file.
+
+    Returns:
+        list: Peer URLs.
+    """
+    with open(path) as file:
+        content = file.read()
+    try:
+        return list(json.loads(content))
+    except ValueError:
+        return [line.strip() for line in content.splitlines() if line.strip() and not line.startswith('#')]
+
+
+def normalize_peer_url(peer):
+    """
+    Give a peer URL the trailing slash endpoint paths are appended to.
+
+    Returns:
+        str or None: Normalized URL, None if it is not an HTTP URL.
+    """
+    if not isinstance(peer, str) or not peer.startswith(('http://', 'https://')):
+        return None
+    return peer if peer.endswith('/') else peer + '/'
+
+
+class PeerManager:
+    def __init__(self, self_url, peers=(), max_peers=128):
+        """
+        Initialize the set of peers this node knows, never including itself.
+
+        Args:
+            self_url (str): URL other nodes use to reach this node.
+            peers (iterable): Initial peer URLs.
+            max_peers (int): Maximum number of peers remembered.
+        """
+        self.self_url = self_url
+        self.max_peers = max_peers
+        self._peers = OrderedDict()  # URL -> None, in discovery order
+        self._lock = threading.Lock()
+        self.add_many(peers)
+
+    def add(self, peer):
+        """
+        Add a peer unless it is this node, already known, or the peer list is full.
+
+        Returns:
+            bool: True if the peer was added, False otherwise.
+        """
+        peer = normalize_peer_url(peer)
+        if peer is None:
+            return False
+        with self._lock:
+            if peer == self.self_url or peer in self._peers or len(self._peers) >= self.max_peers:
+                return False
+            self._peers[peer] = None
+            return True
+
+    def add_many(self, peers):
+        return sum(self.add(peer) for peer in peers)
+
+    def remove(self, peer):
+        with self._lock:
+            self._peers.pop(peer, None)
+
+    def peers(self):
+        """
+        Get the known peers.
+
+        Returns:
+            list: Peer URLs.
+        """
+        with self._lock:
+            return list(self._peers)
+
+    def __len__(self):
+        return len(self._peers)
+
+    def sample(self, count, exclude=()):
+        """
+        Pick random peers to relay a message to.
+
+        Args:
+            count (int): Maximum number of peers.
+            exclude (iterable): Peers to leave out, e.g. the one the message came from.
+
+        Returns:
+            list: Peer URLs.
+        """
+        candidates = [peer for peer in self.peers() if peer not in exclude]
+        return random.sample(candidates, min(count, len(candidates)))
+
+    def handshake(self, peer, timeout=REQUEST_TIMEOUT):
+        """
+        Introduce this node to a peer and learn the peers it knows.
+
+        Args:
+            peer (str): Peer URL.
+            timeout (float): Seconds to wait for the response.
+
+        Returns:
+            int: Number of new peers learned, including the contacted one.
+        """
+        response = requests.post(peer + 'handshake', json={'url': self.self_url, 'peers': self.sample(32)},
+                                 timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+        return self.add(data.get('url', peer)) + self.add_many(data.get('peers', []))
+
+
+class Gossip:
+    def __init__(self, blockchain, peer_manager, fanout=8, seen_size=100000, max_workers=8):
+        """
+        Initialize inv/getdata gossip between a chain and a random subset of its peers.
+
+        A new block or transaction is announced by id to `fanout` random peers.
+        A peer that has not seen an id asks the announcer for the message, and
+        relays the announcement once the message is validated, so every node
+        sends each message to a bounded number of peers however large the
+        network grows.
+
+        Args:
+            blockchain (Blockchain): Chain receiving the blocks and transactions.
+            peer_manager (PeerManager): Known peers.
+            fanout (int): Number of peers each announcement is sent to.
+            seen_size (int): Number of block hashes and transaction ids remembered to drop duplicates.
+            max_workers (int): Threads fetching announced messages and sending announcements.
+        """
+        self.blockchain = blockchain
+        self.peer_manager = peer_manager
+        self.fanout = fanout
+        self.seen = SeenCache(seen_size)
+        self.max_workers = max_workers
+        self.stats = {'inv_received': 0, 'inv_duplicates': 0, 'fetched': 0, 'relayed': 0}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _submit(self, function, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='gossip')
+            return self._executor.submit(function, *args)
+
+    def announce(self, kind, ids, exclude=()):
+        """
+        Send an inv message naming new blocks or transactions to random peers, without waiting.
+
+        Args:
+            kind (str): 'block' or 'transaction'.
+            ids (list): Block hashes or transaction ids.
+            exclude (iterable): Peers that already have the messages.
+
+        Returns:
+            Future: Resolves to the response status code of each contacted peer.
+        """
+        for item_id in ids:
+            self.seen.add((kind, item_id))
+        peers = self.peer_manager.sample(self.fanout, exclude)
+        payload = {'type': kind, 'ids': list(ids), 'peer': self.peer_manager.self_url}
+        return self._submit(self.blockchain.broadcaster.broadcast, peers, 'inv', payload)
+
+    def handle_inv(self, inv):
+        """
+        Filter the ids of an inv message through the seen set and fetch the new ones in the background.
+
+        Args:
+            inv (dict): 'type', 'ids' and the announcing 'peer'.
+
+        Returns:
+            list: Ids that will be fetched.
+        """
+        kind = inv['type']
+        self.stats['inv_received'] += 1
+        wanted = [item_id for item_id in inv['ids'] if self.seen.add((kind, item_id)) and not self.is_known(kind, item_id)]
+        self.stats['inv_duplicates'] += len(inv['ids']) - len(wanted)
+        if wanted:
+            self._submit(self._fetch, kind, wanted, inv['peer'])
+        return wanted
+
+    def is_known(self, kind, item_id):
+        """
+        Check whether a block or transaction already reached the chain or the mempool by another path.
+        """
+        if kind == 'block':
+            return self.blockchain.get_block(item_id) is not None or item_id in self.blockchain.block_tree
+        return item_id in self.blockchain.mempool
+
+    def _fetch(self, kind, ids, peer):
+        """
+        Ask the announcing peer for the messages, validate them and relay the valid ones.
+        """
+        try:
+            response = requests.post(peer + 'getdata', json={'type': kind, 'ids': ids}, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            items = response.json()['items']
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            log.warning("Error fetching %ss from peer %s: %s", kind, peer, e)
+            for item_id in ids:
+                self.seen.discard((kind, item_id))
+            return
+        self.stats['fetched'] += len(items)
+        accepted = []
+        if kind == 'block':
+            parents = []
+            for item in items:
+                status = self.blockchain.add_compact_block(item, peer)
+                if status in ('extended', 'reorganized', 'side_branch'):
+                    accepted.append(item['header']['hash'])
+                elif status == 'incomplete':
+                    self.seen.discard((kind, item['header']['hash']))
+                elif status == 'orphan':
+                    # Ask the same peer for the missing parent, the orphan is connected once it arrives
+                    parent = item['header']['prev_hash']
+                    if isinstance(parent, str) and self.seen.add((kind, parent)) and not self.is_known(kind, parent):
+                        parents.append(parent)
+            if parents:
+                self._submit(self._fetch, kind, parents, peer)
+        else:
+            added, _ = self.blockchain.add_transactions(items)
+            accepted = [transaction_key(transaction) for transaction in added]
+        if accepted:
+            self.stats['relayed'] += len(accepted)
+            self.announce(kind, accepted, exclude=(peer,))
+
+    def get_data(self, kind, ids):
+        """
+        Get the messages a peer asked for after an inv.
+
+        Blocks are returned as compact blocks, see compact_block.make_compact_block.
+
+        Args:
+            kind (str): 'block' or 'transaction'.
+            ids (list): Block hashes or transaction ids.
+
+        Returns:
+            list: Compact blocks or transaction dictionaries that are still known.
+        """
+        items = []
+        for item_id in ids:
+            if kind == 'block':
+                block = self.blockchain.get_block(item_id)
+                if block is not None:
+                    items.append(make_compact_block(block))
+            else:
+                transaction = self.blockchain.mempool.get(item_id)
+                if transaction is not None:
+                    items.append(transaction)
+        return items
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
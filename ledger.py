@@ -0,0 +1,199 @@
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+import json
+import os
+
+ZERO = Decimal(0)
+
+
+def _to_decimal(value):
+    """
+    Parse an amount exactly, so undoing a block restores the previous balances bit for bit.
+    """
+    try:
+        amount = Decimal(str(value or 0))
+    except (InvalidOperation, ValueError):
+        return ZERO
+    return amount if amount.is_finite() else ZERO
+
+
+class Ledger:
+    def __init__(self):
+        """
+        Initialize an empty index of balances and miner statistics derived from the chain.
+        """
+        self.balances = defaultdict(Decimal)  # address -> balance
+        self.transaction_counts = defaultdict(int)  # address -> transactions sent or received
+        self.blocks_mined = defaultdict(int)  # miner -> number of blocks
+        self.rewards = defaultdict(Decimal)  # miner -> coinbase rewards
+        self.fees_earned = defaultdict(Decimal)  # miner -> fees of the transactions it included
+        self.height = -1  # Index of the last applied block
+
+    def _apply(self, block, sign):
+        """
+        Add (sign=1) or remove (sign=-1) the effects of a block.
+        """
+        miner = str(block.miner)
+        fees = ZERO
+        for transaction in block.transactions:
+            if 'message' in transaction:
+                message = transaction['message']
+                amount = _to_decimal(message.get('amount'))
+                fee = _to_decimal(message.get('fee'))
+                sender = str(message.get('from_addr'))
+                receiver = str(message.get('to_addr'))
+                self.balances[sender] -= sign * (amount + fee)
+                self.balances[receiver] += sign * amount
+                self.transaction_counts[sender] += sign
+                self.transaction_counts[receiver] += sign
+                fees += fee
+            else:
+                # Coinbase transaction rewarding the miner
+                amount = _to_decimal(transaction.get('amount'))
+                receiver = str(transaction.get('to_addr'))
+                self.balances[receiver] += sign * amount
+                self.rewards[receiver] += sign * amount
+                self.transaction_counts[receiver] += sign
+        if block.index > 0:
+            self.blocks_mined[miner] += sign
+            self.fees_earned[miner] += sign * fees
+            self.balances[miner] += sign * fees
+
+    def apply_block(self, block):
+        """
+        Update the index with a block appended to the chain.
+
+        Args:
+            block (Block): Block extending the last applied block.
+        """
+        self._apply(block, 1)
+        self.height = block.index
+
+    def undo_block(self, block):
+        """
+        Revert a block removed from the tip of the chain.
+
+        Args:
+            block (Block): Last applied block.
+        """
+        self._apply(block, -1)
+        self.height = block.index - 1
+
+    def rebuild(self, chain):
+        """
+        Recompute the index from a whole chain.
+
+        Args:
+            chain (list): Blocks from genesis to tip.
+        """
+        self.__init__()
+        for block in chain:
+            self.apply_block(block)
+
+    def balance(self, address):
+        """
+        Get the balance and transaction count of an address.
+
+        Args:
+            address (str): Public key or miner identifier.
+
+        Returns:
+            dict: Balance, transaction count and, for miners, mining statistics.
+        """
+        address = str(address)
+        return {
+            'address': address,
+            'balance': float(self.balances.get(address, ZERO)),
+            'transaction_count': self.transaction_counts.get(address, 0),
+            'blocks_mined': self.blocks_mined.get(address, 0),
+            'rewards': float(self.rewards.get(address, ZERO)),
+            'fees_earned': float(self.fees_earned.get(address, ZERO)),
+        }
+
+    def miner_stats(self):
+        """
+        Get the blocks mined, rewards and fees earned by every miner.
+
+        Returns:
+            dict: Miner identifier -> mining statistics.
+        """
+        return {
+            miner: {
+                'blocks_mined': blocks,
+                'rewards': float(self.rewards.get(miner, ZERO)),
+                'fees_earned': float(self.fees_earned.get(miner, ZERO)),
+                'total_earned': float(self.rewards.get(miner, ZERO) + self.fees_earned.get(miner, ZERO)),
+            }
+            for miner, blocks in self.blocks_mined.items() if blocks
+        }
+
+    def to_dict(self):
+        """
+        Get the full index state, with amounts as strings to keep them exact.
+
+        Returns:
+            dict: Index tables and the height they were computed at.
+        """
+        return {
+            'height': self.height,
+            'balances': {address: str(value) for address, value in self.balances.items() if value},
+            'transaction_counts': {address: count for address, count in self.transaction_counts.items() if count},
+            'blocks_mined': {miner: count for miner, count in self.blocks_mined.items() if count},
+            'rewards': {miner: str(value) for miner, value in self.rewards.items() if value},
+            'fees_earned': {miner: str(value) for miner, value in self.fees_earned.items() if value},
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """
+        Create an index from the state returned by to_dict.
+
+        Args:
+            state (dict): Index state.
+
+        Returns:
+            Ledger: Restored index.
+        """
+        ledger = cls()
+        ledger.height = state['height']
+        ledger.balances.update((address, Decimal(value)) for address, value in state['balances'].items())
+        ledger.transaction_counts.update(state['transaction_counts'])
+        ledger.blocks_mined.update(state['blocks_mined'])
+        ledger.rewards.update((miner, Decimal(value)) for miner, value in state['rewards'].items())
+        ledger.fees_earned.update((miner, Decimal(value)) for miner, value in state['fees_earned'].items())
+        return ledger
+
+    def save(self, path, tip_hash):
+        """
+        Write the index next to a block store so a restart can skip the rescan.
+
+        Args:
+            path (str): File to write.
+            tip_hash (str): Hash of the block the index was computed at.
+        """
+        state = self.to_dict()
+        state['tip_hash'] = tip_hash
+        with open(path + '.tmp', 'w') as file:
+            json.dump(state, file)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path, tip_hash):
+        """
+        Read an index written by save if it matches the chain tip.
+
+        Args:
+            path (str): File to read.
+            tip_hash (str): Hash of the current chain tip.
+
+        Returns:
+            Ledger or None: Restored index, None if the file is missing or stale.
+        """
+        try:
+            with open(path) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if state.get('tip_hash') != tip_hash:
+            return None
+        return cls.from_dict(state)
@@ -0,0 +1,57 @@
+import logging
+import threading
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every=1, below=logging.WARNING):
+        """
+        Initialize a filter keeping one in `every` records of each call site below a level.
+
+        The first record of a call site is always kept, so rare messages are
+        never lost while hot-path messages, e.g. one per received block, are
+        thinned out. Records at or above `below` are always kept.
+
+        Args:
+            every (int): Keep one record out of this many per call site.
+            below (int): Level from which records are never sampled.
+        """
+        super().__init__()
+        self.every = max(1, int(every))
+        self.below = below
+        self._counts = {}  # (path, line) -> records seen
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every == 1 or record.levelno >= self.below:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            seen = self._counts.get(site, 0)
+            self._counts[site] = seen + 1
+        if seen % self.every:
+            return False
+        if seen:
+            record.msg = f"{record.msg} [sampled 1/{self.every}]"
+        return True
+
+
+def configure(level='INFO', sample_every=1):
+    """
+    Send the node's log records to stderr with a level and per-call-site sampling.
+
+    Args:
+        level (str): Minimum level logged, e.g. 'DEBUG' or 'WARNING'.
+        sample_every (int): Keep one in this many records below WARNING per call site.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(SamplingFilter(sample_every))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Keep the per-request lines of the development server out of the sampled output
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -1,26 +1,105 @@
-from flask import Flask, request, jsonify, url_for, render_template
+from flask import Flask, Response, request, jsonify, url_for, render_template
 from core_blockchain import Block, Blockchain
+from mempool import transaction_key
+from mining import MiningEngine
+from verification import SignatureVerifier
+from validation import ChainValidator
+from block_store import BlockStore
+from mining_service import MiningService
+from gossip import Gossip, PeerManager, load_peer_file, normalize_peer_url
+from snapshot import fast_sync
 from config_peers import peers
+from metrics import Gauge
+import metrics
+import logs
 from datetime import datetime
-import sys
+import argparse
+import atexit
+import logging
+import os
+import json
 import threading, requests
 
 import random
 import uuid, time
 from ecdsa import SigningKey, SECP256k1
+from hashlib import sha256
+
+try:
+    import msgpack
+except ImportError:  # The binary /chain format is only served when msgpack is installed
+    msgpack = None
 
 
 app = Flask(__name__)
-app.config['JSONIFY_PRETTYPRINT_REGULAR'] = True
+app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 app.config['JSON_SORT_KEYS'] = False
+if hasattr(app, 'json'):
+    # Newer Flask ignores JSON_SORT_KEYS, and signed messages must keep their key order
+    app.json.sort_keys = False
+
+log = logging.getLogger('node')
+
+INGEST_BATCH_SIZE = 1000  # Transactions verified and added to the mempool at a time by /add_transactions
 
 blockchain = Blockchain()
+peer_manager = PeerManager(None)  # Filled in at startup, once the node URL is known
+gossip = Gossip(blockchain, peer_manager)
+# Mined blocks are announced from the worker thread, /mine only queues a job
+mining_service = MiningService(blockchain, on_block=lambda block: gossip.announce('block', [block.hash]))
+
+# Read at scrape time, so they follow the chain even when it is replaced at startup
+Gauge('chain_height', 'Index of the tip of the main chain', function=lambda: blockchain.last_block.index)
+Gauge('chain_side_blocks', 'Blocks kept on side branches', function=lambda: len(blockchain.block_tree.side_blocks))
+Gauge('chain_orphans', 'Blocks waiting for their parent', function=lambda: len(blockchain.block_tree.orphans))
+Gauge('mempool_transactions', 'Unconfirmed transactions held', function=lambda: len(blockchain.mempool))
+Gauge('mempool_bytes', 'Approximate size of the unconfirmed transactions held', function=lambda: blockchain.mempool.size_bytes)
+Gauge('mining_hash_rate', 'Hashes per second of the last proof of work search', function=lambda: blockchain.mining_engine.hash_rate)
+Gauge('gossip_seen_ids', 'Block hashes and transaction ids in the seen set', function=lambda: len(gossip.seen))
+Gauge('peers', 'Known peers', function=lambda: len(peer_manager))
 
 # Dummy private and public keys for demonstration purposes
 private_key = 'fc67e176ef44abc9f2539e4bdbf4fa314f0682bbc7260228fac32f78e4beecfe'
 public_key = '0d29d6ef8347672c57f75438a3fefda5dfbd9e9becd6233b7d9a015d2a1827e6607707f4f7dfebf59c20f460f33543110001155140c2d9606a582d5cdda57a12'
 
 
+def node_url():
+    """
+    Get the URL peers use to reach this node.
+    """
+    return f'http://127.0.0.1:{port}/'
+
+
+def iter_ndjson(stream):
+    """
+    Parse a stream of newline-delimited JSON documents as it is read.
+
+    Args:
+        stream: Binary file-like object, e.g. request.stream.
+
+    Yields:
+        Each decoded document, blank lines are skipped.
+    """
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_batches(items, size):
+    """
+    Group an iterable into lists of at most `size` items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 def generate_key_pair():
     private_key = SigningKey.generate(curve=SECP256k1)
     public_key = private_key.get_verifying_key()
@@ -43,12 +122,91 @@ def index():
 
 @app.route('/chain', methods=['GET'])
 def display_chain():
-    blocks = [block.__dict__ for block in blockchain.chain]
-    return jsonify({'blockchain': blocks, 'chain_length': len(blockchain.chain)})
+    # Range of blocks to return, the whole chain by default
+    chain_length = len(blockchain.chain)
+    start = min(max(0, request.args.get('start', 0, type=int)), chain_length)
+    count = max(0, request.args.get('count', chain_length - start, type=int))
+    stop = min(chain_length, start + count)
+
+    chain_format = request.args.get('format')
+    if chain_format is None:
+        best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson', 'application/x-msgpack'])
+        chain_format = {'application/x-ndjson': 'ndjson', 'application/x-msgpack': 'msgpack'}.get(best, 'json')
+    if chain_format not in ('json', 'ndjson', 'msgpack'):
+        return f"Unknown chain format: {chain_format}", 400
+    if chain_format == 'msgpack' and msgpack is None:
+        return "The msgpack format is not available on this node", 406
+
+    # The content only changes when the tip does, so peers polling an unchanged chain get a 304
+    tip_hash = blockchain.last_block.hash
+    etag = sha256(f'{tip_hash}:{start}:{stop}:{chain_format}'.encode()).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif chain_format == 'ndjson':
+        blocks = blockchain.iter_block_json(start, stop)
+        response = Response((block_json + b'\n' for block_json in blocks), mimetype='application/x-ndjson')
+    elif chain_format == 'msgpack':
+        blocks = blockchain.iter_block_json(start, stop)
+        response = Response((msgpack.packb(json.loads(block_json)) for block_json in blocks), mimetype='application/x-msgpack')
+    else:
+        response = Response(stream_chain_json(start, stop, chain_length), mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['X-Chain-Length'] = str(chain_length)
+    response.headers['X-Chain-Tip'] = tip_hash
+    return response
+
+def stream_chain_json(start, stop, chain_length):
+    """
+    Generate the JSON /chain document block by block instead of building it in memory.
+    """
+    yield b'{"blockchain":['
+    for position, block_json in enumerate(blockchain.iter_block_json(start, stop)):
+        yield block_json if position == 0 else b',' + block_json
+    yield f'],"chain_length":{chain_length},"start":{start}}}'.encode()
+
+@app.route('/snapshot', methods=['GET'])
+def export_snapshot():
+    snapshot = blockchain.export_snapshot(request.args.get('height', type=int))
+    if snapshot is None:
+        return jsonify({'message': 'No snapshot available at this height'}), 404
+    return jsonify(snapshot)
+
+@app.route('/snapshot/commitment', methods=['GET'])
+def snapshot_commitment():
+    commitment = blockchain.snapshot_commitment(request.args.get('height', type=int))
+    if commitment is None:
+        return jsonify({'message': 'No snapshot available at this height'}), 404
+    return jsonify(commitment)
+
+@app.route('/chain/tip', methods=['GET'])
+def chain_tip():
+    last_block = blockchain.last_block
+    return jsonify({'chain_length': len(blockchain.chain), 'height': last_block.index, 'tip_hash': last_block.hash})
+
+@app.route('/chain/locate', methods=['POST'])
+def locate_fork():
+    locator = request.get_json()['locator']
+    fork_index = blockchain.find_fork_point(locator)
+    fork_hash = blockchain.chain[fork_index].hash if fork_index >= 0 else None
+    return jsonify({'fork_index': fork_index, 'fork_hash': fork_hash})
+
+@app.route('/headers', methods=['GET'])
+def display_headers():
+    start = max(0, request.args.get('start', 0, type=int))
+    count = max(0, request.args.get('count', 500, type=int))
+    headers = [block.header() for block in blockchain.chain[start:start + count]]
+    return jsonify({'headers': headers, 'chain_length': len(blockchain.chain)})
+
+@app.route('/blocks', methods=['GET'])
+def display_blocks():
+    start = max(0, request.args.get('start', 0, type=int))
+    count = max(0, request.args.get('count', 500, type=int))
+    blocks = [block.to_dict() for block in blockchain.chain[start:start + count]]
+    return jsonify({'blocks': blocks, 'chain_length': len(blockchain.chain)})
 
 @app.route('/consensus', methods=['GET'])
 def chain_conflict():
-    if blockchain.consensus(peers):
+    if blockchain.consensus(peer_manager.peers()):
         return "Conflict detected, Switched to longest valid chain on the network!"
     else:
         return "We are good, no conflict in blockchain!"
@@ -56,43 +214,156 @@ def chain_conflict():
 @app.route('/add_block', methods=['POST'])
 def add_block():
     block_data = request.get_json()
-    blockchain.unconfirmed_transactions = []
-    block = Block(block_data['index'], block_data['block_timestamp'], block_data['transactions'], block_data['prev_hash'], block_data['miner'], block_data['nonce'])
-    added = blockchain.add_block(block)
-    if not added:
-        print(f"Block discarded: {block.__dict__}")
+    block = Block.from_dict(block_data)
+    status = blockchain.process_block(block)
+    if status == 'invalid':
+        log.info("Block discarded: %s", block.hash)
+        return "The block was discarded by the node", 400
+    if status == 'duplicate':
+        return "The block is already known", 200
+    if status in ('side_branch', 'orphan'):
+        log.info("Block kept as %s: %s", status, block.hash)
+        return f"The block was kept as {status.replace('_', ' ')}", 202
+    log.info("Block %d added to chain: %s", block.index, block.hash)
+    return "Block added to the chain", 201
+
+@app.route('/chain/tree', methods=['GET'])
+def chain_tree():
+    return jsonify(dict(blockchain.block_tree.stats(), chain_length=len(blockchain.chain),
+                        chain_work=blockchain.chain_work))
+
+@app.route('/add_compact_block', methods=['POST'])
+def add_compact_block():
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('peer'), str):
         return "The block was discarded by the node", 400
-    print(f"Block added to chain: {block.__dict__}")
+    status = blockchain.add_compact_block(data, data['peer'])
+    if status == 'invalid':
+        log.info("Compact block from %s discarded", data['peer'])
+        return "The block was discarded by the node", 400
+    if status == 'incomplete':
+        return "The block could not be rebuilt", 503
+    if status == 'duplicate':
+        return "The block is already known", 200
+    if status in ('side_branch', 'orphan'):
+        log.info("Block kept as %s: %s", status, data['header']['hash'])
+        return f"The block was kept as {status.replace('_', ' ')}", 202
+    log.info("Block %d added to chain: %s", data['header']['index'], data['header']['hash'])
     return "Block added to the chain", 201
 
+@app.route('/block/<block_hash>', methods=['GET'])
+def get_block(block_hash):
+    block = blockchain.get_block(block_hash)
+    if block is None:
+        return jsonify({'message': 'Unknown block'}), 404
+    return jsonify(block.to_dict())
+
+@app.route('/block_transactions', methods=['POST'])
+def block_transactions():
+    data = request.get_json()
+    block = blockchain.get_block(data['hash'])
+    if block is None:
+        return jsonify({'message': 'Unknown block'}), 404
+    try:
+        transactions = [block.transactions[position] for position in data['indexes']]
+    except (IndexError, TypeError):
+        return jsonify({'message': 'Invalid transaction index'}), 400
+    return jsonify({'transactions': transactions})
+
 @app.route('/process_transaction', methods=['POST'])
 def process_transaction():
     readable_pk = request.form.get('pk')
     to_addr = request.form.get('to_addr')
     amount = request.form.get('amount')
+    fee = request.form.get('fee', '0')
     readable_sk = request.form.get('sk')
     timestamp = str(datetime.now())
-    msg = {'transaction_timestamp': timestamp, 'from_addr': readable_pk, 'to_addr': to_addr, 'amount': amount}
+    msg = {'transaction_id': str(uuid.uuid4()), 'transaction_timestamp': timestamp, 'from_addr': readable_pk, 'to_addr': to_addr, 'amount': amount, 'fee': fee}
     signature = blockchain.generate_signature(readable_sk, msg)
     signature = signature.hex()
-    blockchain.unconfirmed_transactions.append({'message': msg, 'signature': signature})
-    print(f"Transaction added: {msg}")
+    blockchain.mempool.add({'message': msg, 'signature': signature})
+    log.info("Transaction added: %s", msg['transaction_id'])
     return "Transaction has been made!"
 
 @app.route('/add_transaction', methods=['POST'])
 def add_transaction():
-    transaction_dict = request.get_json()
-    blockchain.unconfirmed_transactions.append(transaction_dict)
-    print(f"Transaction received and added: {transaction_dict}")
+    transaction_dict = request.get_json(silent=True)
+    if not isinstance(transaction_dict, dict):
+        return "Expected a transaction object", 400
+    added, invalid = blockchain.add_transactions([transaction_dict], is_known=lambda transaction_id: ('transaction', transaction_id) in gossip.seen)
+    if invalid:
+        return "The transaction is malformed or its signature is invalid", 400
+    if not added:
+        return "Transaction already known or its fee is too low for the mempool"
+    transaction_id = transaction_key(transaction_dict)
+    log.debug("Transaction received and added: %s", transaction_id)
+    gossip.announce('transaction', [transaction_id])
     return "Transaction added to unconfirmed_transactions and is ready to be mined!"
 
+@app.route('/add_transactions', methods=['POST'])
+def add_transactions():
+    # A JSON array, or NDJSON processed batch by batch while the body is still being received
+    if request.mimetype == 'application/x-ndjson':
+        transactions = iter_ndjson(request.stream)
+    else:
+        transactions = request.get_json(silent=True)
+        if not isinstance(transactions, list):
+            return jsonify({'message': 'Expected a JSON array or NDJSON of transactions'}), 400
+    counts = {'received': 0, 'added': 0, 'invalid': 0}
+    try:
+        for batch in iter_batches(transactions, INGEST_BATCH_SIZE):
+            added, invalid = blockchain.add_transactions(batch, is_known=lambda transaction_id: ('transaction', transaction_id) in gossip.seen)
+            counts['received'] += len(batch)
+            counts['added'] += len(added)
+            counts['invalid'] += invalid
+            if added:
+                gossip.announce('transaction', [transaction_key(transaction) for transaction in added])
+    except ValueError as e:
+        return jsonify({'message': f'Invalid NDJSON: {e}', **counts}), 400
+    # Known transactions and ones whose fee is too low for the mempool are neither added nor invalid
+    counts['skipped'] = counts['received'] - counts['added'] - counts['invalid']
+    log.debug("Bulk ingest: %s", counts)
+    return jsonify(counts)
+
 @app.route('/peers', methods=["GET"])
 def display_peers():
-    return jsonify({'peers': str(peers), 'count': len(peers)})
+    known_peers = peer_manager.peers()
+    return jsonify({'peers': known_peers, 'count': len(known_peers)})
+
+@app.route('/handshake', methods=['POST'])
+def handshake():
+    data = request.get_json()
+    peer = normalize_peer_url(data.get('url'))
+    peer_manager.add(peer)
+    peer_manager.add_many(data.get('peers', []))
+    return jsonify({'url': peer_manager.self_url, 'peers': peer_manager.sample(32, exclude=(peer,))})
+
+@app.route('/inv', methods=['POST'])
+def inv():
+    wanted = gossip.handle_inv(request.get_json())
+    return jsonify({'requested': len(wanted)}), 202
+
+@app.route('/getdata', methods=['POST'])
+def getdata():
+    data = request.get_json()
+    return jsonify({'items': gossip.get_data(data['type'], data['ids'])})
+
+@app.route('/balance/<addr>', methods=['GET'])
+def balance(addr):
+    return jsonify(blockchain.ledger.balance(addr))
+
+@app.route('/miner_stats', methods=['GET'])
+def miner_stats():
+    return jsonify({'miner_stats': blockchain.ledger.miner_stats(), 'height': blockchain.ledger.height})
+
+@app.route('/peer_stats', methods=["GET"])
+def display_peer_stats():
+    return jsonify({'peer_stats': blockchain.broadcaster.stats(), 'relay_stats': blockchain.relay_stats,
+                    'gossip_stats': dict(gossip.stats, seen=len(gossip.seen), peers=len(peer_manager))})
 
 @app.route('/unconfirmed_transactions', methods=["GET"])
 def display_unconfirmed_transactions():
-    return jsonify({'unconfirmed_transactions': blockchain.unconfirmed_transactions})
+    return jsonify({'unconfirmed_transactions': blockchain.mempool.transactions(), 'count': len(blockchain.mempool)})
 
 @app.route('/start_mining', methods=['GET'])
 def start_mining():
@@ -101,15 +372,16 @@ def start_mining():
     def mine_on_peer(peer_url):
         try:
             response = requests.get(peer_url + 'mine', params={'miner': miner_identifier})
-            if response.status_code == 200:
-                print(f"Mining started on node: {peer_url}")
+            if response.status_code in (200, 202):
+                log.debug("Mining started on node: %s", peer_url)
             else:
-                print(f"Failed to start mining on node: {peer_url}")
+                log.warning("Failed to start mining on node: %s", peer_url)
         except requests.exceptions.RequestException as e:
-            print(f"Error starting mining on peer {peer_url}: {e}")
+            log.warning("Error starting mining on peer %s: %s", peer_url, e)
 
     # Create a thread for each peer to start mining simultaneously
-    mining_threads = [threading.Thread(target=mine_on_peer, args=(peer_url,)) for peer_url in peers]
+    mining_threads = [threading.Thread(target=mine_on_peer, args=(peer_url,))
+                      for peer_url in [node_url()] + peer_manager.peers()]
     
     # Start all mining threads
     for mining_thread in mining_threads:
@@ -120,43 +392,47 @@ def start_mining():
 @app.route('/mine', methods=['GET'])
 def mine():
     # miner_identifier = request.args.get('miner', 'unknown_miner')
-    mined_block = blockchain.mine(port)
-    if mined_block:
-        print(f"Block mined successfully: {mined_block.__dict__}")
-        blockchain.announce_block(peers, mined_block)  # Announce the mined block to peers
-        # winner = {'winner': request.host_url, 'block': mined_block.__dict__}
-        # for peer in peers:
-        #     try:
-        #         response = requests.post(peer + 'announce_winner', json=winner)  # Announce the winner to other peers
-        #         if response.status_code == 201:
-        #             print(f"Block successfully announced to {peer}")
-        #         else:
-        #             print(f"Failed to announce block to {peer}")
-        #     except requests.exceptions.RequestException as e:
-        #         print(f"Error announcing block to peer {peer}: {e}")
-        return jsonify({'mined_block': mined_block.__dict__}), 200
-    else:
-        print("Mining failed or nothing to mine")
-        return "Mining failed or nothing to mine", 400
+    job = mining_service.submit(port)
+    return jsonify({'job_id': job.job_id, 'status': job.status,
+                    'status_url': url_for('mining_status', job_id=job.job_id)}), 202
+
+@app.route('/mining/status', methods=['GET'])
+def mining_status():
+    job_id = request.args.get('job_id')
+    if job_id is None:
+        return jsonify(mining_service.status())
+    job = mining_service.get_job(job_id)
+    if job is None:
+        return jsonify({'message': 'Unknown mining job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/mining_stats', methods=['GET'])
+def mining_stats():
+    return jsonify(blockchain.mining_engine.stats())
 
 @app.route('/announce_winner', methods=['POST'])
 def announce_winner():
     data = request.get_json()
     winner_block = data['block']
-    winner_block = Block(winner_block['index'], winner_block['block_timestamp'], winner_block['transactions'], winner_block['prev_hash'], winner_block['miner'], winner_block['nonce'])
+    winner_block = Block.from_dict(winner_block)
     added = blockchain.add_block(winner_block)
     if added:
-        print(f"Winner announced: {data['winner']}, Block: {winner_block.__dict__}")
+        log.info("Winner announced: %s, block: %s", data['winner'], winner_block.hash)
         return jsonify({'message': 'Block added', 'winner': data['winner']}), 201
-    print(f"Winner block discarded: {winner_block.__dict__}")
+    log.info("Winner block discarded: %s", winner_block.hash)
     return jsonify({'message': 'Block discarded'}), 400
 
 
 @app.route('/simulate_transactions', methods=['GET'])
 def simulate_transactions():
     transactions = []
-    
-    for _ in range(3):
+    count = max(0, request.args.get('count', 3, type=int))
+
+    for _ in range(count):
         to_addr = "random_address_" + str(random.randint(1, 1000))
         amount = str(random.uniform(1, 100))  # Random amount between 1 and 100
         fee = str(random.uniform(0.01, 1))  # Random fee between 0.01 and 1
@@ -174,18 +450,16 @@ def simulate_transactions():
         
         signature = blockchain.generate_signature(private_key, msg).hex()
         transaction = {'message': msg, 'signature': signature}
-        
-        blockchain.unconfirmed_transactions.append(transaction)
-        blockchain.announce_transaction(peers, transaction)
-        
         transactions.append(transaction)
-    
-    print(f"Simulated transactions added: {transactions}")
-    return jsonify({'transactions': transactions, 'status': '100 transactions simulated and added to unconfirmed transactions'})
+
+    blockchain.mempool.add_many(transactions)
+    gossip.announce('transaction', [transaction['message']['transaction_id'] for transaction in transactions])
+    log.info("Simulated %d transactions", len(transactions))
+    return jsonify({'transactions': transactions, 'status': f'{len(transactions)} transactions simulated and added to unconfirmed transactions'})
 
 def automate_mining_cycle():
     while True:
-        print('-------------------------- Starting New Cycle --------------------')
+        log.info('Starting new simulation cycle')
         simulate_transactions()
         time.sleep(4)
         start_mining()
@@ -209,9 +483,56 @@ def start_simulation():
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        port = int(sys.argv[1])
-    else:
-        port = 5000
-    print(f"Starting node on port {port}")
+    parser = argparse.ArgumentParser(description="Run a blockchain node")
+    parser.add_argument('port', nargs='?', type=int, default=5000)
+    parser.add_argument('--mining-workers', type=int, default=1, help="processes used to search for a proof of work")
+    parser.add_argument('--mining-batch-size', type=int, default=100000, help="nonces handed to a mining process at a time")
+    parser.add_argument('--verify-workers', type=int, default=1, help="processes used to verify transaction signatures")
+    parser.add_argument('--validate-workers', type=int, default=1, help="processes used to hash blocks when validating chains")
+    parser.add_argument('--data-dir', help="directory of the persistent block store, the chain is kept in memory if omitted")
+    parser.add_argument('--sync-interval', type=int, default=16, help="blocks appended to the store between fsync calls")
+    parser.add_argument('--peers-file', help="JSON list or one-per-line file of peer URLs, config_peers.py is used if neither this nor --seed is given")
+    parser.add_argument('--seed', action='append', default=[], help="peer URL to handshake with at startup, may be repeated")
+    parser.add_argument('--fanout', type=int, default=8, help="peers each block or transaction is announced to")
+    parser.add_argument('--max-peers', type=int, default=128, help="maximum number of peers remembered")
+    parser.add_argument('--snapshot', help="snapshot file exported from /snapshot to start from instead of genesis")
+    parser.add_argument('--fast-sync', action='store_true', help="start from a peer's snapshot when the chain holds only genesis")
+    parser.add_argument('--snapshot-commitment', help="commitment a snapshot must match, otherwise peers must agree on it")
+    parser.add_argument('--snapshot-agreement', type=int, default=2, help="peers that must report a snapshot's commitment when none is given")
+    parser.add_argument('--log-level', default='INFO', help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument('--log-sample', type=int, default=1, help="log one in this many records below WARNING per call site")
+    args = parser.parse_args()
+    logs.configure(args.log_level, args.log_sample)
+    port = args.port
+    peer_manager.self_url = node_url()
+    peer_manager.max_peers = args.max_peers
+    gossip.fanout = args.fanout
+    if args.peers_file:
+        peer_manager.add_many(load_peer_file(args.peers_file))
+    elif not args.seed:
+        peer_manager.add_many(peers)
+    for seed in (seed.rstrip("/") + "/" for seed in args.seed):
+        try:
+            log.info("Learned %d peer(s) from %s", peer_manager.handshake(seed), seed)
+        except requests.exceptions.RequestException as e:
+            log.warning("Error during handshake with seed %s: %s", seed, e)
+    atexit.register(gossip.shutdown)
+    if args.data_dir:
+        block_store = BlockStore(os.path.join(args.data_dir, f'node_{port}'), args.sync_interval)
+        blockchain.attach_block_store(block_store)
+        atexit.register(blockchain.close)
+        log.info("Loaded %d blocks from %s", len(blockchain.chain), block_store.directory)
+    blockchain.mining_engine = MiningEngine(args.mining_workers, args.mining_batch_size)
+    atexit.register(mining_service.stop)
+    blockchain.verifier = SignatureVerifier(args.verify_workers)
+    blockchain.validator = ChainValidator(blockchain.verifier, args.validate_workers)
+    if args.snapshot:
+        with open(args.snapshot) as file:
+            if not blockchain.import_snapshot(json.load(file), args.snapshot_commitment):
+                parser.error(f"{args.snapshot} is invalid, does not match --snapshot-commitment or is behind the chain")
+        log.info("Imported snapshot at height %d from %s", blockchain.snapshot_height, args.snapshot)
+    elif args.fast_sync and len(blockchain.chain) == 1:
+        if not fast_sync(blockchain, peer_manager.peers(), args.snapshot_commitment, args.snapshot_agreement):
+            log.warning("No usable snapshot found, the chain will be synced from genesis")
+    log.info("Starting node on port %d with %d mining worker(s)", port, args.mining_workers)
     app.run(host="127.0.0.1", port=port)
@@ -0,0 +1,247 @@
+import heapq
+import itertools
+import json
+import math
+import threading
+
+
+def transaction_key(transaction):
+    """
+    Get the identifier of a transaction.
+
+    Signed transactions carry their id inside 'message', coinbase transactions
+    carry it at the top level. Transactions without an id are keyed by signature.
+
+    Args:
+        transaction (dict): Transaction dictionary.
+
+    Returns:
+        str: Transaction id.
+    """
+    message = transaction.get('message', transaction)
+    return message.get('transaction_id') or transaction.get('signature')
+
+
+def transaction_fee(transaction):
+    """
+    Get the fee offered by a transaction.
+
+    Args:
+        transaction (dict): Transaction dictionary.
+
+    Returns:
+        float or None: Fee of the transaction, 0 if it is missing, None if it is malformed,
+        not finite or negative.
+    """
+    message = transaction.get('message', transaction)
+    try:
+        fee = float(message.get('fee') or 0)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(fee) or fee < 0:
+        return None
+    return fee
+
+
+class Mempool:
+    def __init__(self, max_count=10000, max_bytes=32 * 1024 * 1024, confirmed=()):
+        """
+        Initialize a pool of unconfirmed transactions indexed by transaction id.
+
+        Args:
+            max_count (int): Maximum number of transactions held.
+            max_bytes (int): Maximum approximate serialized size of the held transactions.
+            confirmed (set): Ids of the transactions already in the chain, which are rejected.
+                Shared with the chain, which keeps it up to date.
+        """
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.confirmed = confirmed
+        self.size_bytes = 0
+        self._entries = {}  # transaction id -> (fee, sequence, transaction, size)
+        self._by_fee = []  # max-heap of (-fee, sequence, transaction id)
+        self._by_low_fee = []  # min-heap of (fee, sequence, transaction id) used for eviction
+        self._sequence = itertools.count()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self._entries
+
+    def _is_live(self, sequence, transaction_id):
+        """
+        Check whether a heap item still refers to a held transaction.
+        """
+        entry = self._entries.get(transaction_id)
+        return entry is not None and entry[1] == sequence
+
+    def add(self, transaction):
+        """
+        Add a transaction unless it is already held or confirmed, or its fee is invalid or too low to fit.
+
+        When the pool is full, the lowest-fee transactions are evicted to make
+        room for a transaction paying a higher fee.
+
+        Args:
+            transaction (dict): Transaction dictionary.
+
+        Returns:
+            bool: True if the transaction was added, False otherwise.
+        """
+        transaction_id = transaction_key(transaction)
+        fee = transaction_fee(transaction)
+        if transaction_id is None or fee is None:
+            return False
+        size = len(json.dumps(transaction))
+        with self._lock:
+            if transaction_id in self._entries or transaction_id in self.confirmed or size > self.max_bytes:
+                return False
+            if not self._make_room(fee, size):
+                return False
+            sequence = next(self._sequence)
+            self._entries[transaction_id] = (fee, sequence, transaction, size)
+            self.size_bytes += size
+            heapq.heappush(self._by_fee, (-fee, sequence, transaction_id))
+            heapq.heappush(self._by_low_fee, (fee, sequence, transaction_id))
+            return True
+
+    def add_many(self, transactions):
+        """
+        Add a batch of transactions under a single lock acquisition.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+
+        Returns:
+            list: One bool per transaction, True if it was added.
+        """
+        with self._lock:
+            return [self.add(transaction) for transaction in transactions]
+
+    def _make_room(self, fee, size):
+        """
+        Evict the cheapest transactions paying less than fee until a transaction of the given size fits.
+
+        Nothing is evicted unless enough of them can be to make it fit.
+
+        Returns:
+            bool: True if the transaction fits, False otherwise.
+        """
+        count, size_bytes = len(self._entries), self.size_bytes
+        evicted = []
+        popped = []
+        while (count >= self.max_count or size_bytes + size > self.max_bytes) and self._by_low_fee:
+            item = heapq.heappop(self._by_low_fee)
+            if not self._is_live(item[1], item[2]):
+                continue
+            popped.append(item)
+            if item[0] >= fee:
+                break
+            evicted.append(item[2])
+            count -= 1
+            size_bytes -= self._entries[item[2]][3]
+        for item in popped:
+            heapq.heappush(self._by_low_fee, item)
+        if count >= self.max_count or size_bytes + size > self.max_bytes:
+            return False
+        for transaction_id in evicted:
+            self.remove(transaction_id)
+        return True
+
+    def get(self, transaction_id):
+        """
+        Get a held transaction by id.
+
+        Args:
+            transaction_id (str): Transaction id.
+
+        Returns:
+            dict or None: The transaction, None if it is not held.
+        """
+        entry = self._entries.get(transaction_id)
+        return entry[2] if entry else None
+
+    def remove(self, transaction_id):
+        """
+        Remove a transaction by id.
+
+        Args:
+            transaction_id (str): Transaction id.
+
+        Returns:
+            bool: True if the transaction was held, False otherwise.
+        """
+        with self._lock:
+            entry = self._entries.pop(transaction_id, None)
+            if entry is None:
+                return False
+            self.size_bytes -= entry[3]
+            self._compact()
+            return True
+
+    def remove_transactions(self, transactions):
+        """
+        Remove the given transactions, e.g. the ones included in an accepted block.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+
+        Returns:
+            int: Number of transactions removed.
+        """
+        with self._lock:
+            return sum(self.remove(transaction_key(transaction)) for transaction in transactions)
+
+    def _compact(self):
+        """
+        Rebuild the heaps once removed transactions make up most of their items.
+        """
+        if len(self._by_fee) > 2 * len(self._entries) + 64:
+            self._by_fee = [(-fee, sequence, tid) for tid, (fee, sequence, _, _) in self._entries.items()]
+            heapq.heapify(self._by_fee)
+            self._by_low_fee = [(fee, sequence, tid) for tid, (fee, sequence, _, _) in self._entries.items()]
+            heapq.heapify(self._by_low_fee)
+
+    def select(self, max_count):
+        """
+        Get the highest-fee transactions without removing them.
+
+        Args:
+            max_count (int): Maximum number of transactions to return.
+
+        Returns:
+            list: Transactions ordered by decreasing fee, ties in arrival order.
+        """
+        with self._lock:
+            selected = []
+            popped = []
+            while self._by_fee and len(selected) < max_count:
+                item = heapq.heappop(self._by_fee)
+                if self._is_live(item[1], item[2]):
+                    popped.append(item)
+                    selected.append(self._entries[item[2]][2])
+            for item in popped:
+                heapq.heappush(self._by_fee, item)
+            return selected
+
+    def transactions(self):
+        """
+        Get all held transactions in arrival order.
+
+        Returns:
+            list: Transaction dictionaries.
+        """
+        with self._lock:
+            return [entry[2] for entry in self._entries.values()]
+
+    def clear(self):
+        """
+        Remove all transactions.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._by_fee = []
+            self._by_low_fee = []
+            self.size_bytes = 0
@@ -0,0 +1,115 @@
+from hashlib import sha256
+import json
+
+EMPTY_ROOT = '0' * 64  # Merkle root of a block without transactions
+
+
+def transaction_hash(transaction):
+    """
+    Hash a transaction from its canonical JSON form, independent of key order.
+
+    Args:
+        transaction (dict): Transaction dictionary.
+
+    Returns:
+        str: Hexadecimal SHA-256 hash of the transaction.
+    """
+    return sha256(json.dumps(transaction, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def _parent(left, right):
+    return sha256(left + right).digest()
+
+
+class MerkleTree:
+    def __init__(self, leaf_hashes=()):
+        """
+        Build a Merkle tree over transaction hashes, keeping every level.
+
+        An odd node at the end of a level is promoted unchanged to the next one.
+
+        Args:
+            leaf_hashes (iterable): Hexadecimal transaction hashes.
+        """
+        self.levels = [[bytes.fromhex(leaf) for leaf in leaf_hashes]]
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            parents = [_parent(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+            if len(level) % 2:
+                parents.append(level[-1])
+            self.levels.append(parents)
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """
+        Build a tree over the hashes of the given transactions.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+
+        Returns:
+            MerkleTree: Tree over the transactions.
+        """
+        return cls(transaction_hash(transaction) for transaction in transactions)
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    @property
+    def root(self):
+        """
+        Get the Merkle root.
+
+        Returns:
+            str: Hexadecimal root hash, EMPTY_ROOT if the tree has no leaves.
+        """
+        if not self.levels[0]:
+            return EMPTY_ROOT
+        return self.levels[-1][0].hex()
+
+    def _update_path(self, position):
+        """
+        Recompute the ancestors of a leaf, growing the tree by a level when needed.
+        """
+        depth = 0
+        while len(self.levels[depth]) > 1:
+            level = self.levels[depth]
+            if depth + 1 == len(self.levels):
+                self.levels.append([])
+            parents = self.levels[depth + 1]
+            parent_position = position // 2
+            sibling = position ^ 1
+            left = position - (position % 2)
+            if sibling < len(level):
+                node = _parent(level[left], level[left + 1])
+            else:
+                node = level[position]
+            if parent_position < len(parents):
+                parents[parent_position] = node
+            else:
+                parents.append(node)
+            position = parent_position
+            depth += 1
+        # Drop levels left over from a smaller tree shape
+        del self.levels[depth + 1:]
+
+    def append(self, leaf_hash):
+        """
+        Add a leaf, rehashing only the path from it to the root.
+
+        Args:
+            leaf_hash (str): Hexadecimal transaction hash.
+        """
+        self.levels[0].append(bytes.fromhex(leaf_hash))
+        self._update_path(len(self.levels[0]) - 1)
+
+    def replace(self, position, leaf_hash):
+        """
+        Replace a leaf, rehashing only the path from it to the root.
+
+        Args:
+            position (int): Index of the leaf.
+            leaf_hash (str): Hexadecimal transaction hash.
+        """
+        self.levels[0][position] = bytes.fromhex(leaf_hash)
+        self._update_path(position)
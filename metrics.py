@@ -0,0 +1,228 @@
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+# Upper bounds in seconds, from sub-millisecond signature checks to minutes-long proof of work searches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REGISTRY = {}  # metric name -> metric, in registration order
+_registry_lock = threading.Lock()
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize a metric and register it for /metrics.
+
+        Args:
+            name (str): Metric name, e.g. 'chain_height'.
+            documentation (str): Help text.
+            labelnames (tuple): Names of the labels distinguishing the series.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> series state
+        if not self.labelnames:
+            self._state(())  # Unlabelled metrics are exported from the start, even at zero
+        with _registry_lock:
+            if name in REGISTRY:
+                raise ValueError(f"metric {name} is already registered")
+            REGISTRY[name] = self
+
+    def labels(self, *values):
+        """
+        Get the series of a combination of label values.
+
+        Returns:
+            _Series: Series with the same update methods as an unlabelled metric.
+        """
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return _Series(self, tuple(str(value) for value in values))
+
+    def _state(self, values):
+        state = self._series.get(values)
+        if state is None:
+            state = self._series[values] = self._new_state()
+        return state
+
+    def samples(self):
+        """
+        List the samples of every series.
+
+        Returns:
+            list: (name suffix, label values, extra labels, value) tuples.
+        """
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, values, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class _Series:
+    __slots__ = ('metric', 'values')
+
+    def __init__(self, metric, values):
+        self.metric = metric
+        self.values = values
+
+    def inc(self, amount=1):
+        self.metric._inc(self.values, amount)
+
+    def set(self, value):
+        self.metric._set(self.values, value)
+
+    def observe(self, value):
+        self.metric._observe(self.values, value)
+
+    def time(self):
+        return self.metric._time(self.values)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_state(self):
+        return [0]
+
+    def _inc(self, values, amount):
+        with self._lock:
+            self._state(values)[0] += amount
+
+    def inc(self, amount=1):
+        """
+        Increase the unlabelled counter.
+        """
+        self._inc((), amount)
+
+    def samples(self):
+        with self._lock:
+            return [('_total', values, (), state[0]) for values, state in self._series.items()]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        Initialize a gauge, optionally read from a function at scrape time.
+
+        Args:
+            function (callable): Returns the current value of the unlabelled gauge.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def _new_state(self):
+        return [0]
+
+    def _set(self, values, value):
+        with self._lock:
+            self._state(values)[0] = value
+
+    def set(self, value):
+        self._set((), value)
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            return [('', (), (), self.function())]
+        with self._lock:
+            return [('', values, (), state[0]) for values, state in self._series.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Initialize a histogram with cumulative buckets.
+
+        Args:
+            buckets (tuple): Increasing upper bounds, +Inf is added.
+        """
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_state(self):
+        return {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+    def _observe(self, values, value):
+        with self._lock:
+            state = self._state(values)
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][position] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def observe(self, value):
+        """
+        Record a value, e.g. a duration in seconds, in the unlabelled histogram.
+        """
+        self._observe((), value)
+
+    @contextmanager
+    def _time(self, values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(values, time.perf_counter() - started)
+
+    def time(self):
+        """
+        Measure the duration of a with block.
+        """
+        return self._time(())
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for values, state in self._series.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    samples.append(('_bucket', values, (('le', _format_value(bound)),), cumulative))
+                samples.append(('_sum', values, (), state['sum']))
+                samples.append(('_count', values, (), state['count']))
+        return samples
+
+
+def render():
+    """
+    Serialize every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        str: Metrics document.
+    """
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
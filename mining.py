@@ -0,0 +1,254 @@
+from hashlib import sha256
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import multiprocessing
+import threading
+import time
+
+from metrics import Counter, Histogram
+
+# Number of hashes a worker computes between checks of the shared stop flag
+STOP_CHECK_INTERVAL = 4096
+
+_worker_stop_event = None
+
+SOLVE_SECONDS = Histogram('mining_solve_seconds', 'Time to find a proof of work, for searches that were not cancelled')
+HASHES = Counter('mining_hashes', 'Block hashes computed while searching for proofs of work')
+SEARCHES = Counter('mining_searches', 'Proof of work searches by outcome', ('outcome',))
+
+
+def _init_worker(stop_event):
+    """
+    Store the shared stop event in a worker process.
+
+    Args:
+        stop_event (multiprocessing.Event): Event set when the current search must stop.
+    """
+    global _worker_stop_event
+    _worker_stop_event = stop_event
+
+
+def search_nonce_range(prefix, target, start, end, stop_event=None):
+    """
+    Search a range of nonces for a block hash starting with the target prefix.
+
+    The block hash is sha256(prefix + str(nonce)), so the hash state of the
+    nonce-independent prefix is computed once and copied for every nonce.
+
+    Args:
+        prefix (bytes): Serialized block without the trailing nonce.
+        target (str): Required leading characters of the hex digest.
+        start (int): First nonce of the range (inclusive).
+        end (int): Last nonce of the range (exclusive).
+        stop_event (Event): Optional event checked periodically to abort the search.
+
+    Returns:
+        tuple: (nonce, hash) of the solution or (None, None), and the number of hashes computed.
+    """
+    if stop_event is None:
+        stop_event = _worker_stop_event
+    midstate = sha256(prefix)
+    nonce = start
+    while nonce < end:
+        chunk_end = min(nonce + STOP_CHECK_INTERVAL, end)
+        if stop_event is not None and stop_event.is_set():
+            return None, None, nonce - start
+        for n in range(nonce, chunk_end):
+            h = midstate.copy()
+            h.update(b'%d' % n)
+            hash_val = h.hexdigest()
+            if hash_val.startswith(target):
+                return n, hash_val, n - start + 1
+        nonce = chunk_end
+    return None, None, end - start
+
+
+class MiningEngine:
+    def __init__(self, workers=1, batch_size=100000):
+        """
+        Initialize a mining engine that partitions the nonce space across processes.
+
+        Args:
+            workers (int): Number of worker processes. 1 mines in the calling thread.
+            batch_size (int): Number of nonces handed to a worker at a time.
+        """
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.mining_height = None  # Height of the block currently being mined
+        self.mining_tip = None  # Hash of the block the current search builds on
+        self.tip = None  # Hash of the chain tip, see set_tip
+        self.last_hashes = 0  # Hashes computed by the last search
+        self.last_duration = 0.0  # Duration of the last search in seconds
+        self.total_hashes = 0
+        self.total_duration = 0.0
+        self._pool = None
+        self._lock = threading.Lock()
+        self._mp_context = multiprocessing.get_context()
+        self._stop_event = self._mp_context.Event() if self.workers > 1 else threading.Event()
+
+    def _get_pool(self):
+        """
+        Start the worker pool on first use so idle nodes don't hold processes.
+
+        Returns:
+            ProcessPoolExecutor: Pool of mining workers.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=self._mp_context,
+                                             initializer=_init_worker, initargs=(self._stop_event,))
+        return self._pool
+
+    def mine(self, prefix, difficulty, height=None, start_nonce=0, tip=None):
+        """
+        Find a nonce so that sha256(prefix + str(nonce)) has `difficulty` leading zeros.
+
+        Args:
+            prefix (str): Serialized block without the trailing nonce.
+            difficulty (int): Number of leading zeros required in the hex digest.
+            height (int): Index of the block being mined, reported by stats.
+            start_nonce (int): First nonce to try.
+            tip (str): Hash of the block the mined one builds on. The search is
+                cancelled, or not started, once set_tip reports another tip.
+
+        Returns:
+            tuple: (nonce, hash) of the solution, or (None, None) if the search was cancelled.
+        """
+        with self._lock:
+            self._stop_event.clear()
+            self.mining_height = height
+            self.mining_tip = tip
+            prefix = prefix.encode()
+            target = '0' * difficulty
+            started = time.perf_counter()
+            try:
+                # Publishing mining_tip first means a set_tip racing with this check stops the search
+                if tip is not None and self.tip is not None and tip != self.tip:
+                    nonce, hash_val, hashes = None, None, 0
+                elif self.workers == 1:
+                    nonce, hash_val, hashes = self._mine_local(prefix, target, start_nonce)
+                else:
+                    nonce, hash_val, hashes = self._mine_parallel(prefix, target, start_nonce)
+            finally:
+                self.mining_height = None
+                self.mining_tip = None
+            self.last_hashes = hashes
+            self.last_duration = time.perf_counter() - started
+            self.total_hashes += hashes
+            self.total_duration += self.last_duration
+            HASHES.inc(hashes)
+            if nonce is None:
+                SEARCHES.labels('cancelled').inc()
+            else:
+                SEARCHES.labels('solved').inc()
+                SOLVE_SECONDS.observe(self.last_duration)
+            return nonce, hash_val
+
+    def _mine_local(self, prefix, target, start_nonce):
+        """
+        Search nonces batch by batch in the calling thread.
+        """
+        hashes = 0
+        nonce = start_nonce
+        while not self._stop_event.is_set():
+            found, hash_val, done = search_nonce_range(prefix, target, nonce, nonce + self.batch_size, self._stop_event)
+            hashes += done
+            if found is not None:
+                return found, hash_val, hashes
+            nonce += self.batch_size
+        return None, None, hashes
+
+    def _mine_parallel(self, prefix, target, start_nonce):
+        """
+        Hand out consecutive nonce batches to the pool until one of them holds a solution.
+        """
+        pool = self._get_pool()
+        in_flight = set()
+        next_nonce = start_nonce
+        hashes = 0
+        result = (None, None)
+
+        # Keep two batches per worker queued so no worker idles between batches
+        while len(in_flight) < self.workers * 2:
+            in_flight.add(pool.submit(search_nonce_range, prefix, target, next_nonce, next_nonce + self.batch_size))
+            next_nonce += self.batch_size
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.cancelled():
+                    continue
+                found, hash_val, done_hashes = future.result()
+                hashes += done_hashes
+                # Prefer the lowest winning nonce among the batches that finished together
+                if found is not None and (result[0] is None or found < result[0]):
+                    result = (found, hash_val)
+            if result[0] is not None or self._stop_event.is_set():
+                self._stop_event.set()
+                for future in in_flight:
+                    future.cancel()
+                continue
+            in_flight.add(pool.submit(search_nonce_range, prefix, target, next_nonce, next_nonce + self.batch_size))
+            next_nonce += self.batch_size
+
+        return result[0], result[1], hashes
+
+    def cancel(self):
+        """
+        Stop the current search, if any.
+        """
+        self._stop_event.set()
+
+    def set_tip(self, tip_hash):
+        """
+        Record a new chain tip and stop the current search if it builds on another block.
+
+        Args:
+            tip_hash (str): Hash of the block now at the tip of the chain.
+
+        Returns:
+            bool: True if a search was cancelled, False otherwise.
+        """
+        self.tip = tip_hash
+        if self.mining_tip is not None and self.mining_tip != tip_hash:
+            self._stop_event.set()
+            return True
+        return False
+
+    @property
+    def hash_rate(self):
+        """
+        Get the hash rate of the last search.
+
+        Returns:
+            float: Hashes per second.
+        """
+        if self.last_duration <= 0:
+            return 0.0
+        return self.last_hashes / self.last_duration
+
+    def stats(self):
+        """
+        Get the engine configuration and hash rate figures.
+
+        Returns:
+            dict: Worker count, batch size and hash rate statistics.
+        """
+        average = self.total_hashes / self.total_duration if self.total_duration > 0 else 0.0
+        return {
+            'workers': self.workers,
+            'batch_size': self.batch_size,
+            'mining_height': self.mining_height,
+            'last_hashes': self.last_hashes,
+            'last_duration': self.last_duration,
+            'hash_rate': self.hash_rate,
+            'average_hash_rate': average,
+            'total_hashes': self.total_hashes,
+        }
+
+    def shutdown(self):
+        """
+        Stop any search and terminate the worker pool.
+        """
+        self._stop_event.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import queue
+import threading
+import uuid
+
+log = logging.getLogger(__name__)
+
+
+class MiningJob:
+    __slots__ = ('job_id', 'miner', 'status', 'created', 'finished', 'restarts', 'block', 'hash_rate', 'error')
+
+    def __init__(self, miner):
+        """
+        Initialize a request to mine one block.
+
+        Args:
+            miner (str): The identifier of the miner credited with the block.
+        """
+        self.job_id = uuid.uuid4().hex
+        self.miner = miner
+        self.status = 'queued'  # queued, running, mined, failed or cancelled
+        self.created = str(datetime.now())
+        self.finished = None
+        self.restarts = 0  # Templates abandoned because the tip changed
+        self.block = None
+        self.hash_rate = None
+        self.error = None
+
+    def to_dict(self):
+        """
+        Get the job state.
+
+        Returns:
+            dict: Job status, timing and, once mined, the block header.
+        """
+        return {
+            'job_id': self.job_id,
+            'miner': self.miner,
+            'status': self.status,
+            'created': self.created,
+            'finished': self.finished,
+            'restarts': self.restarts,
+            'block': self.block.header() if self.block is not None else None,
+            'hash_rate': self.hash_rate,
+            'error': self.error,
+        }
+
+
+class MiningService:
+    def __init__(self, blockchain, on_block=None, max_jobs=1000):
+        """
+        Initialize a background worker that mines queued jobs on the current tip.
+
+        The worker builds a template, searches for a proof of work without
+        holding the chain lock, and starts over on a new template whenever a
+        block from a peer changes the tip.
+
+        Args:
+            blockchain (Blockchain): Chain to extend.
+            on_block (callable): Called with each block mined and added to the chain, e.g. to announce it.
+            max_jobs (int): Number of finished jobs remembered for status queries.
+        """
+        self.blockchain = blockchain
+        self.on_block = on_block
+        self.max_jobs = max_jobs
+        self.current_job = None
+        self._jobs = OrderedDict()  # job id -> MiningJob
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def submit(self, miner):
+        """
+        Queue a job to mine one block.
+
+        Args:
+            miner (str): The identifier of the miner credited with the block.
+
+        Returns:
+            MiningJob: The queued job.
+        """
+        job = MiningJob(miner)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mining-service', daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def get_job(self, job_id):
+        """
+        Get a job by id.
+
+        Args:
+            job_id (str): Id returned by submit.
+
+        Returns:
+            MiningJob or None: The job, None if it is unknown or was forgotten.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self):
+        """
+        Get the state of the worker.
+
+        Returns:
+            dict: Current job, number of queued jobs and mining engine statistics.
+        """
+        current_job = self.current_job
+        return {
+            'current_job': current_job.to_dict() if current_job is not None else None,
+            'queued_jobs': self._queue.qsize(),
+            'engine': self.blockchain.mining_engine.stats(),
+        }
+
+    def _run(self):
+        while not self._stopped:
+            job = self._queue.get()
+            if job is None:
+                break
+            self.current_job = job
+            try:
+                self._mine(job)
+            except Exception as e:
+                log.exception("Mining job %s failed", job.job_id)
+                job.status = 'failed'
+                job.error = str(e)
+            finally:
+                job.finished = str(datetime.now())
+                self.current_job = None
+
+    def _mine(self, job):
+        """
+        Mine one block for a job, restarting on a new template whenever the tip changes.
+        """
+        blockchain = self.blockchain
+        job.status = 'running'
+        while not self._stopped:
+            template = blockchain.create_block_template(job.miner)
+            if not template:
+                job.status = 'failed'
+                job.error = 'nothing to mine'
+                return
+            log.debug("Started mining block %d", template.index)
+            engine = blockchain.mining_engine
+            nonce, hash_val = engine.mine(template.hash_prefix(), blockchain.zeros_difficulty, height=template.index,
+                                          tip=template.prev_hash)
+            if nonce is None:
+                # A peer's block extended the tip, mine on top of it instead
+                log.info("Mining of block %d restarted on the new tip", template.index)
+                job.restarts += 1
+                continue
+            template.nonce = nonce
+            if not blockchain.add_block(template):
+                # The tip changed before the search could be interrupted
+                job.restarts += 1
+                continue
+            log.info("Mined block %d with nonce %d: %s at %.0f H/s", template.index, template.nonce, hash_val, engine.hash_rate)
+            job.block = template
+            job.hash_rate = engine.hash_rate
+            job.status = 'mined'
+            if self.on_block is not None:
+                self.on_block(template)
+            return
+        job.status = 'cancelled'
+
+    def stop(self):
+        """
+        Stop the worker after interrupting the current search.
+        """
+        self._stopped = True
+        self.blockchain.mining_engine.cancel()
+        self._queue.put(None)
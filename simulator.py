@@ -0,0 +1,504 @@
+import argparse
+from collections import defaultdict
+import heapq
+import json
+import math
+import random
+import time
+import uuid
+
+import requests
+
+from broadcast import PeerStats
+from core_blockchain import Block, Blockchain, private_key, public_key
+from gossip import SeenCache
+import logs
+from mempool import transaction_key
+from verification import SignatureVerifier
+
+
+class EventLoop:
+    def __init__(self):
+        """
+        Initialize a discrete-event scheduler running on a virtual clock.
+
+        Events run in time order, ties in scheduling order, so a simulation
+        with the same seed replays the same way however fast the machine is.
+        """
+        self.now = 0.0
+        self._queue = []
+        self._sequence = 0
+
+    def schedule(self, delay, callback, *args):
+        """
+        Run a callback after a virtual delay.
+
+        Args:
+            delay (float): Seconds of virtual time from now.
+            callback (callable): Function to call.
+
+        Returns:
+            list: Event handle for cancel.
+        """
+        event = [self.now + max(0.0, delay), self._sequence, callback, args]
+        self._sequence += 1
+        heapq.heappush(self._queue, event)
+        return event
+
+    @staticmethod
+    def cancel(event):
+        event[2] = None
+
+    def run(self, until):
+        """
+        Process events in time order until the virtual clock reaches `until`.
+
+        Returns:
+            int: Number of events processed.
+        """
+        processed = 0
+        while self._queue and self._queue[0][0] <= until:
+            when, _, callback, args = heapq.heappop(self._queue)
+            self.now = when
+            if callback is not None:
+                callback(*args)
+                processed += 1
+        self.now = until
+        return processed
+
+
+class NetworkModel:
+    def __init__(self, rng, latency=0.05, jitter=0.02, bandwidth=1_000_000, loss=0.0):
+        """
+        Initialize the delivery characteristics shared by every link.
+
+        Args:
+            rng (random.Random): Source of randomness of the simulation.
+            latency (float): One-way delay in seconds.
+            jitter (float): Maximum extra random delay in seconds.
+            bandwidth (float): Link throughput in bytes per second.
+            loss (float): Probability that a message is lost.
+        """
+        self.rng = rng
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.loss = loss
+
+    def transfer_time(self, size):
+        """
+        Get the time a message of `size` bytes takes to reach a peer.
+        """
+        return self.latency + self.rng.uniform(0, self.jitter) + size / self.bandwidth
+
+    def lost(self):
+        return self.loss > 0 and self.rng.random() < self.loss
+
+
+class SimulatedResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+
+class VirtualTransport:
+    def __init__(self, simulator, source):
+        """
+        Initialize a stand-in for the requests module used by a node for request/response calls.
+
+        Requests are answered at once from the peer's current state, through
+        JSON like real ones. Their round-trip time is added to the simulation
+        statistics rather than delaying the caller, and lost requests raise
+        ConnectionError like an unreachable peer.
+
+        Args:
+            simulator (Simulator): Simulation holding the nodes.
+            source (SimulatedNode): Node making the requests.
+        """
+        self.simulator = simulator
+        self.source = source
+
+    def _request(self, method, url, data):
+        simulator = self.simulator
+        split = url.index('/', len('http://')) + 1
+        peer, path = url[:split], url[split:]
+        node = simulator.nodes.get(peer)
+        if node is None or simulator.network.lost():
+            raise requests.exceptions.ConnectionError(f"{peer} is unreachable")
+        request_body = json.dumps(data) if data is not None else ''
+        status_code, response = node.handle(method, path, json.loads(request_body) if data is not None else None)
+        response_body = json.dumps(response)
+        simulator.stats['requests'] += 1
+        simulator.stats['bytes_sent'] += len(request_body) + len(response_body)
+        simulator.stats['request_seconds'] += (simulator.network.transfer_time(len(request_body))
+                                               + simulator.network.transfer_time(len(response_body)))
+        return SimulatedResponse(status_code, json.loads(response_body))
+
+    def get(self, url, params=None, timeout=None):
+        return self._request('GET', url, params or {})
+
+    def post(self, url, json=None, timeout=None):
+        return self._request('POST', url, json or {})
+
+
+class SimulatedBroadcaster:
+    def __init__(self, simulator, source):
+        """
+        Initialize a stand-in for Broadcaster that delivers posts as events after the network delay.
+
+        Args:
+            simulator (Simulator): Simulation holding the nodes.
+            source (SimulatedNode): Node sending the messages.
+        """
+        self.simulator = simulator
+        self.source = source
+        self.peer_stats = defaultdict(PeerStats)
+
+    def broadcast(self, peers, path, payload):
+        """
+        Schedule the delivery of a JSON payload to peers.
+
+        Returns:
+            dict: Peer URL -> 202 if the message was sent, None if it was lost.
+        """
+        simulator = self.simulator
+        body = json.dumps(payload)
+        results = {}
+        for peer in peers:
+            node = simulator.nodes.get(peer)
+            if node is None or node is self.source:
+                continue
+            simulator.stats['messages'] += 1
+            simulator.stats['bytes_sent'] += len(body)
+            if simulator.network.lost():
+                simulator.stats['messages_lost'] += 1
+                self.peer_stats[peer].last_error = 'message lost'
+                results[peer] = None
+                continue
+            simulator.loop.schedule(simulator.network.transfer_time(len(body)), node.deliver, path, body,
+                                    self.source.url)
+            results[peer] = 202
+        return results
+
+    def stats(self):
+        return {peer: stats.to_dict() for peer, stats in self.peer_stats.items()}
+
+    def close(self):
+        pass
+
+
+class SimulatedNode:
+    def __init__(self, simulator, url, hash_rate, verifier):
+        """
+        Initialize a node of the simulation around its own Blockchain.
+
+        Args:
+            simulator (Simulator): Simulation holding the nodes.
+            url (str): Address of the node, used as miner id and peer URL.
+            hash_rate (float): Simulated hashes per second.
+            verifier (SignatureVerifier): Verifier shared by the nodes, so each signature is only checked once.
+        """
+        self.simulator = simulator
+        self.url = url
+        self.hash_rate = hash_rate
+        self.peers = []
+        self.seen = SeenCache()  # Transaction ids already received, relayed at most once
+        self.blockchain = Blockchain(verifier=verifier, broadcaster=SimulatedBroadcaster(simulator, self))
+        self.blockchain.transport = VirtualTransport(simulator, self)
+        self.blockchain.zeros_difficulty = simulator.proof_difficulty
+
+    def handle(self, method, path, data):
+        """
+        Answer a request like the corresponding endpoint of main.py.
+
+        Returns:
+            tuple: Status code and JSON response.
+        """
+        blockchain = self.blockchain
+        chain = blockchain.chain
+        if path == 'chain/tip':
+            last_block = blockchain.last_block
+            return 200, {'chain_length': len(chain), 'height': last_block.index, 'tip_hash': last_block.hash}
+        if path == 'chain/locate':
+            fork_index = blockchain.find_fork_point(data['locator'])
+            return 200, {'fork_index': fork_index, 'fork_hash': chain[fork_index].hash if fork_index >= 0 else None}
+        if path in ('headers', 'blocks'):
+            start, count = int(data.get('start', 0)), int(data.get('count', 500))
+            blocks = chain[start:start + count]
+            items = [block.header() if path == 'headers' else block.to_dict() for block in blocks]
+            return 200, {path: items, 'chain_length': len(chain)}
+        if path.startswith('block/'):
+            block = blockchain.get_block(path[len('block/'):])
+            return (200, block.to_dict()) if block is not None else (404, {'message': 'Unknown block'})
+        if path in ('snapshot', 'snapshot/commitment'):
+            height = int(data['height']) if data.get('height') is not None else None
+            if path == 'snapshot':
+                result = blockchain.export_snapshot(height)
+            else:
+                result = blockchain.snapshot_commitment(height)
+            return (200, result) if result is not None else (404, {'message': 'No snapshot available at this height'})
+        if path == 'block_transactions':
+            block = blockchain.get_block(data['hash'])
+            if block is None:
+                return 404, {'message': 'Unknown block'}
+            return 200, {'transactions': [block.transactions[position] for position in data['indexes']]}
+        return 404, {'message': f'Unknown path {path}'}
+
+    def deliver(self, path, body, sender):
+        """
+        Process a message posted by a peer once it arrives.
+        """
+        payload = json.loads(body)
+        simulator = self.simulator
+        if path == 'add_block':
+            block = Block.from_dict(payload)
+            status = self.blockchain.process_block(block)
+            simulator.stats[f'blocks_{status}'] += 1
+            if status in ('extended', 'reorganized', 'side_branch'):
+                simulator.record_arrival(block.hash, self)
+                if simulator.relay:
+                    self.blockchain.announce_block([peer for peer in self.peers if peer != sender], block)
+        elif path == 'add_transaction':
+            if not self.seen.add(('transaction', transaction_key(payload))):
+                return
+            if self.blockchain.mempool.add(payload) and simulator.relay:
+                self.blockchain.announce_transaction([peer for peer in self.peers if peer != sender], payload)
+
+    def schedule_mining(self):
+        """
+        Draw the time this node finds its next block from its share of the hash power.
+        """
+        rate = self.hash_rate / self.simulator.work_per_block
+        self.simulator.loop.schedule(self.simulator.rng.expovariate(rate), self.find_block)
+
+    def find_block(self):
+        """
+        Build a block on the current tip when the simulated search succeeds, and announce it.
+
+        Only the real, low proof difficulty is searched; the time the search
+        took is the simulated one drawn by schedule_mining.
+        """
+        self.schedule_mining()
+        blockchain = self.blockchain
+        block = blockchain.mine(self.url)
+        if not block or not blockchain.add_block(block):
+            return
+        self.simulator.record_mined(block, self)
+        blockchain.announce_block(self.peers, block)
+
+    def run_consensus(self):
+        self.simulator.loop.schedule(self.simulator.consensus_interval, self.run_consensus)
+        if self.blockchain.consensus(self.peers):
+            self.simulator.stats['consensus_switches'] += 1
+
+
+class Simulator:
+    def __init__(self, nodes=50, hash_rate=750000, hash_rate_spread=0.0, difficulty=7, proof_difficulty=0,
+                 latency=0.05, jitter=0.02, bandwidth=1_000_000, loss=0.0, peers_per_node=0, tx_rate=1.0,
+                 consensus_interval=0, seed=0):
+        """
+        Initialize an in-process network of nodes exchanging blocks and transactions in virtual time.
+
+        Block discovery follows each node's share of the simulated hash power
+        at `difficulty`; blocks only carry a real proof of work at the much
+        lower `proof_difficulty`, so they validate without the search cost.
+        With the default of 0 every nonce is 0, block sizes and therefore
+        transfer times do not depend on the clock, and a seed replays exactly.
+
+        Args:
+            nodes (int): Number of nodes.
+            hash_rate (float): Mean simulated hashes per second of a node.
+            hash_rate_spread (float): Sigma of the log-normal spread of node hash rates, 0 for equal nodes.
+            difficulty (int): Simulated number of leading zeros, sets the block interval.
+            proof_difficulty (int): Leading zeros actually required by the nodes' chains.
+            latency (float): One-way network delay in seconds.
+            jitter (float): Maximum extra random delay in seconds.
+            bandwidth (float): Link throughput in bytes per second.
+            loss (float): Probability that a message or request is lost.
+            peers_per_node (int): Random peers per node with relaying, 0 for a full mesh without relaying.
+            tx_rate (float): Transactions submitted per second of virtual time.
+            consensus_interval (float): Seconds between consensus rounds of each node, 0 to disable them.
+            seed (int): Seed of every random choice.
+        """
+        self.rng = random.Random(seed)
+        self.loop = EventLoop()
+        self.network = NetworkModel(self.rng, latency, jitter, bandwidth, loss)
+        self.work_per_block = 16 ** difficulty
+        self.proof_difficulty = proof_difficulty
+        self.tx_rate = tx_rate
+        self.consensus_interval = consensus_interval
+        self.relay = peers_per_node > 0
+        self.stats = defaultdict(int)
+        self.mined = {}  # block hash -> (virtual time, miner url, height)
+        self.arrivals = defaultdict(list)  # block hash -> virtual arrival times at other nodes
+        self.signer = Blockchain()
+
+        verifier = SignatureVerifier()
+        self.nodes = {}
+        for position in range(nodes):
+            url = f'http://sim-{position}/'
+            node_hash_rate = hash_rate * (self.rng.lognormvariate(0, hash_rate_spread) if hash_rate_spread else 1)
+            self.nodes[url] = SimulatedNode(self, url, node_hash_rate, verifier)
+        urls = list(self.nodes)
+        for url, node in self.nodes.items():
+            others = [peer for peer in urls if peer != url]
+            node.peers = self.rng.sample(others, min(peers_per_node, len(others))) if self.relay else others
+        if self.relay:
+            # Make links symmetric so every node can be reached
+            for url, node in self.nodes.items():
+                for peer in node.peers:
+                    if url not in self.nodes[peer].peers:
+                        self.nodes[peer].peers.append(url)
+
+    def record_mined(self, block, node):
+        self.mined[block.hash] = (self.loop.now, node.url, block.index)
+        self.stats['blocks_mined'] += 1
+
+    def record_arrival(self, block_hash, node):
+        if block_hash in self.mined:
+            self.arrivals[block_hash].append(self.loop.now)
+
+    def submit_transaction(self):
+        """
+        Sign a transaction, hand it to a random node and schedule the next one.
+        """
+        self.loop.schedule(self.rng.expovariate(self.tx_rate), self.submit_transaction)
+        msg = {
+            'transaction_id': str(uuid.UUID(int=self.rng.getrandbits(128), version=4)),
+            'transaction_timestamp': f'{self.loop.now:.6f}',
+            'from_addr': public_key,
+            'to_addr': f'address_{self.rng.randrange(1000)}',
+            'amount': f'{self.rng.uniform(1, 100):.8f}',
+            'fee': f'{self.rng.uniform(0.01, 1):.8f}',
+        }
+        transaction = {'message': msg, 'signature': self.signer.generate_signature(private_key, msg).hex()}
+        node = self.nodes[self.rng.choice(list(self.nodes))]
+        node.seen.add(('transaction', msg['transaction_id']))
+        node.blockchain.mempool.add(transaction)
+        node.blockchain.announce_transaction(node.peers, transaction)
+        self.stats['transactions_submitted'] += 1
+
+    def run(self, duration):
+        """
+        Simulate the network for `duration` seconds of virtual time.
+
+        Returns:
+            dict: Propagation, fork and throughput statistics, see report.
+        """
+        started = time.perf_counter()
+        if self.tx_rate > 0:
+            self.loop.schedule(0, self.submit_transaction)
+        for node in self.nodes.values():
+            node.schedule_mining()
+            if self.consensus_interval > 0:
+                self.loop.schedule(self.rng.uniform(0, self.consensus_interval), node.run_consensus)
+        events = self.loop.run(duration)
+        return self.report(duration, events, time.perf_counter() - started)
+
+    def report(self, duration, events, wall_seconds):
+        """
+        Summarize the simulation.
+
+        Returns:
+            dict: Settings, block interval, fork (stale block) rate, propagation delays,
+            throughput of distinct confirmed transactions and message counts.
+        """
+        best = max(self.nodes.values(), key=lambda node: node.blockchain.chain_work).blockchain
+        best_chain = best.chain
+        in_best_chain = {block.hash for block in best_chain}
+        agreeing = sum(node.blockchain.last_block.hash == best.last_block.hash for node in self.nodes.values())
+        peers = len(self.nodes) - 1
+
+        delays = []
+        coverage_delays = []  # Time for a block of the best chain to reach 90% of the other nodes
+        for block_hash, arrivals in self.arrivals.items():
+            mined_at = self.mined[block_hash][0]
+            block_delays = sorted(arrival - mined_at for arrival in arrivals)
+            delays.extend(block_delays)
+            needed = math.ceil(0.9 * peers)
+            if block_hash in in_best_chain and needed and len(block_delays) >= needed:
+                coverage_delays.append(block_delays[needed - 1])
+
+        confirmed_transactions = sum(len(block.transactions) - 1 for block in best_chain[1:])
+        mined = len(self.mined)
+        stale = sum(block_hash not in in_best_chain for block_hash in self.mined)
+        return {
+            'settings': {'nodes': len(self.nodes), 'duration': duration, 'work_per_block': self.work_per_block,
+                         'latency': self.network.latency, 'jitter': self.network.jitter,
+                         'bandwidth': self.network.bandwidth, 'loss': self.network.loss, 'relay': self.relay,
+                         'tx_rate': self.tx_rate},
+            'wall_seconds': wall_seconds,
+            'speedup': duration / wall_seconds if wall_seconds else None,
+            'events': events,
+            'height': best.last_block.index,
+            'nodes_on_best_tip': agreeing,
+            'blocks_mined': mined,
+            'stale_blocks': stale,
+            'fork_rate': stale / mined if mined else 0.0,
+            'mean_block_interval': duration / best.last_block.index if best.last_block.index else None,
+            'propagation_seconds': percentiles(delays),
+            'time_to_90_percent_seconds': percentiles(coverage_delays),
+            'transactions_confirmed': confirmed_transactions,
+            'transactions_per_second': confirmed_transactions / duration,
+            'counters': dict(self.stats),
+        }
+
+
+def percentiles(values):
+    """
+    Summarize delays with their mean and percentiles.
+
+    Returns:
+        dict or None: count, mean, p50, p90, p99 and max, None if there are no values.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    return {'count': len(values), 'mean': sum(values) / len(values), 'p50': at(0.5), 'p90': at(0.9),
+            'p99': at(0.99), 'max': values[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a network of nodes in one process, in virtual time")
+    parser.add_argument('--nodes', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=600, help="seconds of virtual time")
+    parser.add_argument('--hash-rate', type=float, default=750000, help="mean simulated hashes per second of a node")
+    parser.add_argument('--hash-rate-spread', type=float, default=0.0, help="log-normal sigma of node hash rates")
+    parser.add_argument('--difficulty', type=int, default=7, help="simulated leading zeros, sets the block interval")
+    parser.add_argument('--latency', type=float, default=0.05, help="one-way delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="maximum extra delay in seconds")
+    parser.add_argument('--bandwidth', type=float, default=1_000_000, help="bytes per second per link")
+    parser.add_argument('--loss', type=float, default=0.0, help="probability a message is lost")
+    parser.add_argument('--peers', type=int, default=0, help="random peers per node with relaying, 0 for a full mesh")
+    parser.add_argument('--tx-rate', type=float, default=1.0, help="transactions submitted per second")
+    parser.add_argument('--consensus-interval', type=float, default=0, help="seconds between consensus rounds, 0 disables them")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write the report to this JSON file instead of stdout")
+    parser.add_argument('--log-level', default='ERROR', help="node log level, lost messages are logged as warnings")
+    args = parser.parse_args()
+
+    logs.configure(args.log_level)
+    simulator = Simulator(args.nodes, args.hash_rate, args.hash_rate_spread, args.difficulty, latency=args.latency,
+                          jitter=args.jitter, bandwidth=args.bandwidth, loss=args.loss, peers_per_node=args.peers,
+                          tx_rate=args.tx_rate, consensus_interval=args.consensus_interval, seed=args.seed)
+    report = simulator.run(args.duration)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+from decimal import Decimal
+from hashlib import sha256
+import json
+import logging
+
+import requests
+
+from sync import fetch_tip
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CONFIRMATIONS = 6  # Blocks below the tip snapshots are taken at, so they are unlikely to be reorganized away
+REQUEST_TIMEOUT = 60  # Seconds to wait for a snapshot, which holds every header
+
+log = logging.getLogger(__name__)
+
+
+def canonical_ledger_state(state):
+    """
+    Normalize a ledger state so nodes holding the same balances serialize it identically.
+
+    Decimal amounts keep the exponent of the operations that produced them,
+    e.g. '3.00' after a block was undone where another node has '3'.
+
+    Args:
+        state (dict): Ledger state, see Ledger.to_dict.
+
+    Returns:
+        dict: State with normalized amounts.
+    """
+    canonical = dict(state)
+    for table in ('balances', 'rewards', 'fees_earned'):
+        canonical[table] = {key: str(Decimal(value).normalize()) for key, value in state[table].items()}
+    return canonical
+
+
+def snapshot_commitment(height, tip_hash, ledger_state):
+    """
+    Hash the state a snapshot vouches for.
+
+    The headers are covered through the tip hash, which commits to every
+    block below it.
+
+    Args:
+        height (int): Index of the snapshot tip.
+        tip_hash (str): Hash of the snapshot tip.
+        ledger_state (dict): Ledger state at the tip, see Ledger.to_dict.
+
+    Returns:
+        str: Hexadecimal commitment.
+    """
+    document = {'version': SNAPSHOT_VERSION, 'height': height, 'tip_hash': tip_hash,
+                'ledger': canonical_ledger_state(ledger_state)}
+    return sha256(json.dumps(document, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def make_snapshot(headers, ledger_state):
+    """
+    Build a snapshot from the headers of a chain prefix and the ledger state at its tip.
+
+    Args:
+        headers (list): Header dictionaries from genesis to the snapshot tip.
+        ledger_state (dict): Ledger state at the tip, see Ledger.to_dict.
+
+    Returns:
+        dict: 'version', 'height', 'tip_hash', 'headers', 'ledger' and 'commitment'.
+    """
+    height = len(headers) - 1
+    tip_hash = headers[-1]['hash']
+    return {
+        'version': SNAPSHOT_VERSION,
+        'height': height,
+        'tip_hash': tip_hash,
+        'headers': headers,
+        'ledger': ledger_state,
+        'commitment': snapshot_commitment(height, tip_hash, ledger_state),
+    }
+
+
+def fetch_snapshot(peer, height=None, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Download a snapshot from a peer.
+
+    Args:
+        peer (str): Peer URL.
+        height (int): Index of the snapshot tip, the peer's default depth if omitted.
+        timeout (float): Seconds to wait for the response.
+        transport: Object with the get/post interface of requests.
+
+    Returns:
+        dict: Snapshot, see make_snapshot.
+    """
+    params = {'height': height} if height is not None else {}
+    response = transport.get(peer + 'snapshot', params=params, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_commitment(peer, height, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Ask a peer for its snapshot commitment at a height, without the headers.
+
+    Returns:
+        dict: 'height', 'tip_hash' and 'commitment'.
+    """
+    response = transport.get(peer + 'snapshot/commitment', params={'height': height}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def count_agreeing_peers(peers, height, commitment, needed, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Count peers reporting the same commitment at a height, stopping once `needed` agree.
+
+    Returns:
+        int: Number of agreeing peers.
+    """
+    agreeing = 0
+    for peer in peers:
+        if agreeing >= needed:
+            break
+        try:
+            if fetch_commitment(peer, height, timeout, transport).get('commitment') == commitment:
+                agreeing += 1
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log.warning("Error fetching snapshot commitment from peer %s: %s", peer, e)
+    return agreeing
+
+
+def fast_sync(blockchain, peers, trusted_commitment=None, min_agreement=2, timeout=REQUEST_TIMEOUT):
+    """
+    Join the network from a peer's snapshot instead of replaying every block, then sync the blocks after it.
+
+    Only the headers and the commitment of a snapshot are verified. Its
+    ledger is trusted if the commitment matches `trusted_commitment`, or
+    else if at least `min_agreement` peers, the source included, report it.
+
+    Args:
+        blockchain (Blockchain): Chain to fill, usually holding only the genesis block.
+        peers (list): Peer URLs.
+        trusted_commitment (str): Commitment obtained out of band.
+        min_agreement (int): Peers that must report the same commitment when none is trusted.
+        timeout (float): Seconds to wait for each response.
+
+    Returns:
+        bool: True if a snapshot was imported, False otherwise.
+    """
+    transport = blockchain.transport
+    tips = []
+    for peer in peers:
+        try:
+            tips.append((fetch_tip(peer, timeout, transport)['chain_length'], peer))
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            log.warning("Error fetching chain tip from peer %s: %s", peer, e)
+
+    for chain_length, peer in sorted(tips, reverse=True):
+        if chain_length <= len(blockchain.chain):
+            break
+        try:
+            snapshot = fetch_snapshot(peer, timeout=timeout, transport=transport)
+            height, commitment = snapshot['height'], snapshot['commitment']
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            log.warning("Error fetching snapshot from peer %s: %s", peer, e)
+            continue
+        if trusted_commitment is None:
+            others = [other for other in peers if other != peer]
+            agreeing = 1 + count_agreeing_peers(others, height, commitment, min_agreement - 1, timeout, transport)
+            if agreeing < min_agreement:
+                log.warning("Snapshot of peer %s at height %s is confirmed by %d peer(s) only", peer, height, agreeing)
+                continue
+        if blockchain.import_snapshot(snapshot, trusted_commitment):
+            log.info("Imported snapshot at height %d from %s", height, peer)
+            blockchain.consensus(peers)
+            return True
+        log.warning("Rejected invalid snapshot from peer %s", peer)
+    return False
@@ -3,6 +3,6 @@
 for i in {5000..5049}
 do
    echo "Starting miner on port $i"
-   python3 main.py $i &
+   python3 main.py $i --mining-workers ${MINING_WORKERS:-1} ${DATA_DIR:+--data-dir $DATA_DIR} --log-level ${LOG_LEVEL:-INFO} --log-sample ${LOG_SAMPLE:-1} &
    sleep 1  # Sleep for a second to avoid race conditions
 done
@@ -0,0 +1,113 @@
+import logging
+
+import requests
+
+SYNC_BATCH_SIZE = 500  # Number of headers or blocks requested per page
+REQUEST_TIMEOUT = 10  # Seconds to wait for a peer's response
+
+log = logging.getLogger(__name__)
+
+
+def fetch_tip(peer, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Get the chain length and tip hash of a peer.
+
+    Args:
+        peer (str): Peer URL.
+        timeout (float): Seconds to wait for the response.
+        transport: Object with the get/post interface of requests, e.g. a simulated network.
+
+    Returns:
+        dict: Peer's 'chain_length', 'height' and 'tip_hash'.
+    """
+    response = transport.get(peer + 'chain/tip', timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def locate_fork(peer, locator, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Ask a peer for the highest block of its chain that appears in our block locator.
+
+    Args:
+        peer (str): Peer URL.
+        locator (list): Block hashes from our tip back to genesis, see Blockchain.block_locator.
+        timeout (float): Seconds to wait for the response.
+        transport: Object with the get/post interface of requests.
+
+    Returns:
+        int: Index of the common ancestor, -1 if the chains share no block.
+    """
+    response = transport.post(peer + 'chain/locate', json={'locator': locator}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['fork_index']
+
+
+def fetch_range(peer, path, start, end, timeout=REQUEST_TIMEOUT, transport=requests):
+    """
+    Download headers or blocks with indices in [start, end) page by page.
+
+    Args:
+        peer (str): Peer URL.
+        path (str): 'headers' or 'blocks'.
+        start (int): First index to download.
+        end (int): Index after the last one to download.
+        timeout (float): Seconds to wait for each page.
+        transport: Object with the get/post interface of requests.
+
+    Returns:
+        list: Header or block dictionaries in chain order.
+    """
+    items = []
+    while start < end:
+        count = min(SYNC_BATCH_SIZE, end - start)
+        response = transport.get(peer + path, params={'start': start, 'count': count}, timeout=timeout)
+        response.raise_for_status()
+        page = response.json()[path]
+        if not page:
+            break
+        items.extend(page)
+        start += len(page)
+    return items
+
+
+def sync_with_peer(blockchain, peer, timeout=REQUEST_TIMEOUT):
+    """
+    Switch to a peer's chain by downloading and validating only the blocks after the common ancestor.
+
+    Headers of the divergent suffix are fetched and checked first, the block
+    bodies are only downloaded when the headers describe a longer chain.
+
+    Args:
+        blockchain (Blockchain): Local chain to update.
+        peer (str): Peer URL.
+        timeout (float): Seconds to wait for each response.
+
+    Returns:
+        bool: True if the local chain was replaced by the peer's, False otherwise.
+    """
+    transport = blockchain.transport
+    try:
+        tip = fetch_tip(peer, timeout, transport)
+        if tip['chain_length'] <= len(blockchain.chain):
+            return False
+        fork_index = locate_fork(peer, blockchain.block_locator(), timeout, transport)
+        if fork_index < 0:
+            return False
+        fork_hash = blockchain.chain[fork_index].hash
+        headers = fetch_range(peer, 'headers', fork_index + 1, tip['chain_length'], timeout, transport)
+        if fork_index + 1 + len(headers) <= len(blockchain.chain):
+            return False
+        if not blockchain.is_valid_header_chain(fork_index, headers):
+            log.warning("Invalid headers received from %s", peer)
+            return False
+        blocks = fetch_range(peer, 'blocks', fork_index + 1, fork_index + 1 + len(headers), timeout, transport)
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+        log.warning("Error syncing with peer %s: %s", peer, e)
+        return False
+
+    new_blocks = blockchain.validate_suffix(fork_index, blocks)
+    if new_blocks is None:
+        log.warning("Invalid blocks received from %s", peer)
+        return False
+    return blockchain.replace_suffix(fork_index, fork_hash, new_blocks)
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from mempool import Mempool, transaction_fee
+
+
+def make_transaction(transaction_id, fee):
+    return {'message': {'transaction_id': transaction_id, 'fee': fee}, 'signature': 'signature'}
+
+
+@pytest.mark.parametrize('fee', ['nan', 'NaN', 'inf', '-inf', '-1', float('nan'), 'abc', [1]])
+def test_invalid_fees_are_rejected(fee):
+    mempool = Mempool()
+    assert transaction_fee(make_transaction('a', fee)) is None
+    assert not mempool.add(make_transaction('a', fee))
+    assert len(mempool) == 0
+
+
+def test_missing_fee_counts_as_zero():
+    assert transaction_fee({'message': {'transaction_id': 'a'}}) == 0
+    assert transaction_fee(make_transaction('a', '0.5')) == 0.5
+
+
+def test_nan_fee_does_not_evict_the_pool():
+    size = len(json.dumps(make_transaction('t0', '1')))
+    mempool = Mempool(max_count=3, max_bytes=10 * size)
+    for position in range(3):
+        assert mempool.add(make_transaction(f't{position}', '1'))
+    assert not mempool.add(make_transaction('nan', 'nan'))
+    assert sorted(transaction['message']['transaction_id'] for transaction in mempool.transactions()) == ['t0', 't1', 't2']
+
+
+def test_eviction_keeps_the_pool_when_the_transaction_cannot_fit():
+    size = len(json.dumps(make_transaction('t0', '1')))
+    mempool = Mempool(max_bytes=3 * size + 5)
+    for transaction_id, fee in (('t1', '1'), ('t2', '5'), ('t3', '1')):
+        assert mempool.add(make_transaction(transaction_id, fee))
+    large = make_transaction('large', '3')
+    large['padding'] = 'x' * (2 * size + 10)
+    assert not mempool.add(large)
+    assert len(mempool) == 3
+
+
+def test_higher_fee_evicts_the_cheapest():
+    mempool = Mempool(max_count=2)
+    assert mempool.add(make_transaction('t1', '1'))
+    assert mempool.add(make_transaction('t2', '2'))
+    assert mempool.add(make_transaction('t3', '3'))
+    assert 't1' not in mempool and 't2' in mempool and 't3' in mempool
@@ -0,0 +1,163 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+def is_valid_nonce(nonce):
+    """
+    Check that a nonce is an integer, so its decimal digits are the only way to write it.
+
+    Args:
+        nonce: Nonce of a block or header.
+
+    Returns:
+        bool: True if the nonce is a non-negative integer, False otherwise.
+    """
+    return type(nonce) is int and nonce >= 0
+
+
+def _hash_blocks(block_dicts):
+    """
+    Compute the hashes of a chunk of blocks in a worker process.
+    """
+    from core_blockchain import Block
+    # Header-only blocks of a snapshot carry their Merkle root instead of the transactions
+    return [Block.hash_header(block_dict) if 'merkle_root' in block_dict else Block.from_dict(block_dict).hash
+            for block_dict in block_dicts]
+
+
+class ChainValidator:
+    def __init__(self, verifier, workers=1, chunk_size=256):
+        """
+        Initialize a validator that checks proof of work, linkage and signatures of chains.
+
+        It remembers the tip of the last fully validated chain as a checkpoint,
+        so validating a chain that contains that block only rehashes the blocks
+        up to it, and checks the signatures of the blocks after it.
+
+        Args:
+            verifier (SignatureVerifier): Verifier used for the transaction signatures.
+            workers (int): Number of processes hashing blocks. 1 hashes in the calling thread.
+            chunk_size (int): Number of blocks hashed per task.
+        """
+        self.verifier = verifier
+        self.workers = max(1, int(workers))
+        self.chunk_size = max(1, chunk_size)
+        self.checkpoint = None  # (height, hash) of the last validated tip
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def compute_hashes(self, blocks):
+        """
+        Recompute the hash of every block from its fields, in parallel chunks when there are enough of them.
+
+        Memoized hashes are not trusted. The results replace them, so later
+        accesses to block.hash are free.
+
+        Args:
+            blocks (list): Blocks to hash.
+
+        Returns:
+            list: Hexadecimal hash of each block.
+        """
+        if self.workers == 1 or len(blocks) < 2 * self.chunk_size:
+            hashes = [block.compute_hash() for block in blocks]
+            for block, block_hash in zip(blocks, hashes):
+                block.remember_hash(block_hash)
+            return hashes
+        chunks = [[block.to_dict() for block in blocks[i:i + self.chunk_size]]
+                  for i in range(0, len(blocks), self.chunk_size)]
+        hashes = [block_hash for chunk in self._get_pool().map(_hash_blocks, chunks) for block_hash in chunk]
+        for block, block_hash in zip(blocks, hashes):
+            block.remember_hash(block_hash)
+        return hashes
+
+    def validate_extension(self, prev_hash, blocks, difficulty):
+        """
+        Count how many of the given blocks validly extend the block with hash prev_hash.
+
+        Args:
+            prev_hash (str): Hash of the block the first one must point to.
+            blocks (list): Blocks in chain order.
+            difficulty (int): Number of leading zeros required in block hashes.
+
+        Returns:
+            int: Number of leading blocks that are valid.
+        """
+        target = '0' * difficulty
+        hashes = self.compute_hashes(blocks)
+        valid = 0
+        for block, block_hash in zip(blocks, hashes):
+            if block.prev_hash != prev_hash or not is_valid_nonce(block.nonce) or not block_hash.startswith(target):
+                break
+            prev_hash = block_hash
+            valid += 1
+
+        # Verify the signatures of the linked blocks in one batch
+        signed = [(position, transaction) for position, block in enumerate(blocks[:valid])
+                  for transaction in block.transactions if 'message' in transaction]
+        results = self.verifier.verify_many([transaction for _, transaction in signed])
+        for (position, _), ok in zip(signed, results):
+            if not ok:
+                return position
+        return valid
+
+    def is_linked(self, genesis_hash, blocks, tip_hash):
+        """
+        Check that blocks form a chain from genesis whose last block hashes to tip_hash.
+
+        Each hash commits to the previous one and to the transactions, so
+        blocks passing this check are exactly the ones that ended at tip_hash
+        when it was validated, and their proof of work and signatures need
+        not be checked again.
+
+        Args:
+            genesis_hash (str): Hash of the genesis block.
+            blocks (list): Blocks following the genesis block, in chain order.
+            tip_hash (str): Expected hash of the last block.
+
+        Returns:
+            bool: True if the blocks are linked and end with tip_hash, False otherwise.
+        """
+        prev_hash = genesis_hash
+        for block, block_hash in zip(blocks, self.compute_hashes(blocks)):
+            if block.prev_hash != prev_hash:
+                return False
+            prev_hash = block_hash
+        return prev_hash == tip_hash
+
+    def validate_chain(self, genesis_hash, blocks, difficulty):
+        """
+        Count how many blocks after genesis are valid.
+
+        Only the linkage of the prefix ending with the checkpoint is checked,
+        see is_linked.
+
+        Args:
+            genesis_hash (str): Hash of the genesis block.
+            blocks (list): Blocks following the genesis block, in chain order.
+            difficulty (int): Number of leading zeros required in block hashes.
+
+        Returns:
+            int: Number of leading blocks that are valid.
+        """
+        trusted = 0
+        if self.checkpoint is not None:
+            height, checkpoint_hash = self.checkpoint
+            if 0 < height <= len(blocks) and self.is_linked(genesis_hash, blocks[:height], checkpoint_hash):
+                trusted = height
+        prev_hash = blocks[trusted - 1].hash if trusted else genesis_hash
+        valid = trusted + self.validate_extension(prev_hash, blocks[trusted:], difficulty)
+        if blocks and valid == len(blocks):
+            self.checkpoint = (valid, blocks[-1].hash)
+        return valid
+
+    def shutdown(self):
+        """
+        Terminate the worker pool.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
@@ -0,0 +1,228 @@
+from hashlib import sha256
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from ecdsa import SECP256k1, SigningKey, VerifyingKey, BadSignatureError, MalformedPointError
+import json
+import threading
+import time
+
+from metrics import Counter, Histogram
+
+VERIFY_SECONDS = Histogram('signature_verify_seconds', 'Duration of SignatureVerifier calls', ('mode',))
+SIGNATURES = Counter('signatures_verified', 'Transaction signatures checked, by result', ('result',))
+
+
+@lru_cache(maxsize=4096)
+def load_verifying_key(readable_pk):
+    """
+    Parse a hex encoded public key, reusing the parsed key for repeated senders.
+
+    Args:
+        readable_pk (str): Hexadecimal representation of the public key.
+
+    Returns:
+        VerifyingKey: Parsed public key.
+    """
+    return VerifyingKey.from_string(bytes.fromhex(readable_pk), curve=SECP256k1)
+
+
+@lru_cache(maxsize=1024)
+def load_signing_key(readable_sk):
+    """
+    Parse a hex encoded private key, reusing the parsed key for repeated signers.
+
+    Args:
+        readable_sk (str): Hexadecimal representation of the private key.
+
+    Returns:
+        SigningKey: Parsed private key.
+    """
+    return SigningKey.from_string(bytes.fromhex(readable_sk), curve=SECP256k1)
+
+
+def verify_signature(readable_pk, signature, msg):
+    """
+    Verify a signature, treating malformed keys and signatures as invalid.
+
+    Args:
+        readable_pk (str): Hexadecimal representation of the public key.
+        signature (bytes): Signature to check.
+        msg (bytes): Signed message.
+
+    Returns:
+        bool: True if the signature is valid, False otherwise.
+    """
+    try:
+        return load_verifying_key(readable_pk).verify(signature, msg)
+    except (BadSignatureError, MalformedPointError, ValueError, TypeError):
+        return False
+
+
+def _verify_chunk(items):
+    """
+    Verify a chunk of (public key, signature, message) items in a worker process.
+    """
+    return [verify_signature(readable_pk, signature, msg) for readable_pk, signature, msg in items]
+
+
+class SignatureVerifier:
+    def __init__(self, workers=1, cache_size=100000, min_parallel_batch=32):
+        """
+        Initialize a transaction signature verifier.
+
+        Args:
+            workers (int): Number of processes used for batch verification. 1 verifies in the calling thread.
+            cache_size (int): Number of verified transactions remembered.
+            min_parallel_batch (int): Smallest batch of uncached transactions sent to the worker pool.
+        """
+        self.workers = max(1, int(workers))
+        self.cache_size = cache_size
+        self.min_parallel_batch = min_parallel_batch
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._verified = OrderedDict()  # (transaction id, signature, message digest) -> None
+        self._lock = threading.Lock()
+        self._pool = None
+
+    @staticmethod
+    def _prepare(transaction_dict):
+        """
+        Extract the cache key and the verification inputs of a signed transaction.
+
+        The message digest is part of the key so a known signature attached to
+        an altered message is verified again instead of hitting the cache.
+
+        Returns:
+            tuple: Cache key and (public key, signature, message) item, or None if malformed.
+        """
+        try:
+            message = transaction_dict['message']
+            signature = transaction_dict['signature']
+            msg = json.dumps(message).encode()  # Convert message back to bytes
+            key = (message.get('transaction_id'), signature, sha256(msg).digest())
+            return key, (message['from_addr'], bytes.fromhex(signature), msg)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+
+    def _is_cached(self, key):
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                self.cache_hits += 1
+                return True
+            self.cache_misses += 1
+            return False
+
+    def _remember(self, key):
+        with self._lock:
+            self._verified[key] = None
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def verify(self, transaction_dict):
+        """
+        Verify the signature of a single transaction.
+
+        Args:
+            transaction_dict (dict): Dictionary representing the transaction.
+
+        Returns:
+            bool: True if the transaction is valid, False otherwise.
+        """
+        with VERIFY_SECONDS.labels('single').time():
+            prepared = self._prepare(transaction_dict)
+            if prepared is None:
+                SIGNATURES.labels('malformed').inc()
+                return False
+            key, item = prepared
+            if self._is_cached(key):
+                SIGNATURES.labels('cached').inc()
+                return True
+            if verify_signature(*item):
+                self._remember(key)
+                SIGNATURES.labels('valid').inc()
+                return True
+            SIGNATURES.labels('invalid').inc()
+            return False
+
+    def verify_many(self, transactions):
+        """
+        Verify the signatures of many transactions, spreading uncached ones across the worker pool.
+
+        Args:
+            transactions (list): Transaction dictionaries.
+
+        Returns:
+            list: One bool per transaction, True if its signature is valid.
+        """
+        started = time.perf_counter()
+        results = [False] * len(transactions)
+        pending_keys = []
+        pending_items = []
+        pending_positions = []
+        for position, transaction_dict in enumerate(transactions):
+            prepared = self._prepare(transaction_dict)
+            if prepared is None:
+                continue
+            key, item = prepared
+            if self._is_cached(key):
+                results[position] = True
+            else:
+                pending_keys.append(key)
+                pending_items.append(item)
+                pending_positions.append(position)
+
+        if self.workers == 1 or len(pending_items) < self.min_parallel_batch:
+            verified = _verify_chunk(pending_items)
+        else:
+            chunk_size = -(-len(pending_items) // (self.workers * 4))
+            chunks = [pending_items[i:i + chunk_size] for i in range(0, len(pending_items), chunk_size)]
+            verified = [ok for chunk in self._get_pool().map(_verify_chunk, chunks) for ok in chunk]
+
+        valid = 0
+        for key, position, ok in zip(pending_keys, pending_positions, verified):
+            if ok:
+                self._remember(key)
+                results[position] = True
+                valid += 1
+        SIGNATURES.labels('cached').inc(sum(results) - valid)
+        SIGNATURES.labels('valid').inc(valid)
+        SIGNATURES.labels('invalid').inc(len(pending_items) - valid)
+        SIGNATURES.labels('malformed').inc(len(transactions) - len(pending_items) - (sum(results) - valid))
+        VERIFY_SECONDS.labels('batch').observe(time.perf_counter() - started)
+        return results
+
+    def _get_pool(self):
+        """
+        Start the worker pool on first use.
+
+        Returns:
+            ProcessPoolExecutor: Pool of verification workers.
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def stats(self):
+        """
+        Get cache statistics.
+
+        Returns:
+            dict: Worker count, cache size, hits and misses.
+        """
+        return {
+            'workers': self.workers,
+            'cached': len(self._verified),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def shutdown(self):
+        """
+        Terminate the worker pool.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None